@@ -0,0 +1,105 @@
+"""Batched, in-graph training augmentation.
+
+Replaces ImageDataGenerator.random_transform, which builds one affine matrix
+per image in NumPy and resamples it with scipy, one image at a time. Here
+the same random rotation, shifts, shear and zoom are composed into one
+affine matrix per image (or one per batch), and the whole batch is
+resampled in a single ImageProjectiveTransformV3 op inside the tf.data
+graph, followed by the random horizontal flip.
+
+Parameter names and meanings follow ImageDataGenerator, so
+BatchAugmentation(**TRAIN_AUGMENTATION) is a drop-in replacement:
+
+    rotation_range      degrees, uniform in [-r, r]
+    width_shift_range   fraction of the width, uniform in [-r, r]
+    height_shift_range  fraction of the height
+    shear_range         shear angle in degrees (as ImageDataGenerator does)
+    zoom_range          independent x/y zoom in [1 - r, 1 + r]
+    horizontal_flip     flip half of the images left-right
+    fill_mode           'nearest', 'reflect', 'wrap' or 'constant'
+
+All randomness comes from stateless ops keyed by a per-batch seed, so a run
+is reproducible for a given --seed however many threads tf.data uses.
+"""
+import math
+
+import tensorflow as tf
+
+
+class BatchAugmentation:
+    """Random affine + flip for (N, H, W, C) float batches; call with (images, labels, seed)"""
+
+    def __init__(self, rotation_range=0, width_shift_range=0.0, height_shift_range=0.0, shear_range=0.0,
+                 zoom_range=0.0, horizontal_flip=False, fill_mode='nearest', per_batch=False):
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.zoom_range = zoom_range
+        self.horizontal_flip = horizontal_flip
+        self.fill_mode = fill_mode.upper()
+        # One transform shared by the whole batch instead of one per image
+        self.per_batch = per_batch
+
+    def _uniform(self, n, limit, seed, offset=0.0):
+        return tf.random.stateless_uniform([n], seed, minval=offset - limit, maxval=offset + limit)
+
+    def transform_matrices(self, n, height, width, seed):
+        """(n, 3, 3) matrices mapping output (x, y) pixels to input (x, y), composed as ImageDataGenerator does"""
+        seeds = tf.random.experimental.stateless_split(seed, 6)
+        theta = self._uniform(n, self.rotation_range, seeds[0]) * (math.pi / 180)
+        tx = self._uniform(n, self.width_shift_range, seeds[1]) * width
+        ty = self._uniform(n, self.height_shift_range, seeds[2]) * height
+        shear = self._uniform(n, self.shear_range, seeds[3]) * (math.pi / 180)
+        zx = self._uniform(n, self.zoom_range, seeds[4], offset=1.0)
+        zy = self._uniform(n, self.zoom_range, seeds[5], offset=1.0)
+
+        zeros, ones = tf.zeros([n]), tf.ones([n])
+        matrix = lambda rows: tf.reshape(tf.stack(rows, axis=1), [n, 3, 3])
+        rotation = matrix([tf.cos(theta), -tf.sin(theta), zeros,
+                           tf.sin(theta), tf.cos(theta), zeros,
+                           zeros, zeros, ones])
+        shift = matrix([ones, zeros, tx,
+                        zeros, ones, ty,
+                        zeros, zeros, ones])
+        shear_m = matrix([ones, -tf.sin(shear), zeros,
+                          zeros, tf.cos(shear), zeros,
+                          zeros, zeros, ones])
+        zoom = matrix([zx, zeros, zeros,
+                       zeros, zy, zeros,
+                       zeros, zeros, ones])
+        transform = rotation @ shift @ shear_m @ zoom
+
+        # Rotate/shear/zoom about the image centre
+        o_x, o_y = (width - 1) / 2, (height - 1) / 2
+        offset = tf.constant([[1, 0, o_x], [0, 1, o_y], [0, 0, 1]], tf.float32)
+        reset = tf.constant([[1, 0, -o_x], [0, 1, -o_y], [0, 0, 1]], tf.float32)
+        return offset @ transform @ reset
+
+    def __call__(self, images, labels, seed):
+        shape = tf.shape(images)
+        batch = shape[0]
+        height, width = images.shape[1], images.shape[2]
+        affine_seed, flip_seed = tf.unstack(tf.random.experimental.stateless_split(seed, 2))
+
+        m = self.transform_matrices(1 if self.per_batch else batch, height, width, affine_seed)
+        # Top two rows, plus the zero projective terms, are the op's 8-vector
+        transforms = tf.concat([tf.reshape(m[:, :2, :], [-1, 6]), tf.zeros_like(m[:, 2, :2])], axis=1)
+        if self.per_batch:
+            transforms = tf.tile(transforms, [batch, 1])
+
+        images = tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=shape[1:3],
+            fill_value=0.0,
+            interpolation='BILINEAR',
+            fill_mode=self.fill_mode
+        )
+
+        if self.horizontal_flip:
+            n = 1 if self.per_batch else batch
+            flip = tf.random.stateless_uniform([n], flip_seed) < 0.5
+            flip = tf.broadcast_to(flip, [batch])
+            images = tf.where(flip[:, None, None, None], tf.reverse(images, axis=[2]), images)
+        return images, labels
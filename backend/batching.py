@@ -0,0 +1,208 @@
+"""Dynamic micro-batching for model inference.
+
+Requests handed to a MicroBatcher are queued and a single scheduler thread
+collects them for up to `window_ms` (or until `max_batch_size` rows are
+waiting), runs one batched forward pass and hands each caller back its rows.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class QueueFullError(Exception):
+    """Raised when the batching queue is already holding max_queue_depth requests"""
+
+
+class _PendingRequest:
+    """One caller's inputs plus the slot its result is written into"""
+
+    __slots__ = ('inputs', 'enqueued_at', 'done', 'result', 'error',
+                 'queue_wait', 'batch_size')
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.queue_wait = 0.0
+        self.batch_size = 0
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for one predict function.
+
+    `predict_fn` takes an array of shape (N, H, W, C) and returns an array of
+    shape (N, num_classes). Only the scheduler thread ever calls it, so the
+    model is never driven from several Flask threads at once.
+    """
+
+    def __init__(self, predict_fn, window_ms=10.0, max_batch_size=16, max_queue_depth=256):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._carry = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'rejected': 0,
+            'batches': 0,
+            'rows': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0,
+            'batch_size_max': 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, inputs):
+        """Queue `inputs` (N, H, W, C) and block until its predictions are ready.
+
+        Returns (predictions, info) where info holds the queue wait in
+        milliseconds and the size of the batch the request was run in.
+        """
+        pending = _PendingRequest(inputs)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise QueueFullError(
+                f'Inference queue is full ({self.max_queue_depth} requests waiting)'
+            )
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+
+        return pending.result, {
+            'queue_wait_ms': round(pending.queue_wait * 1000, 2),
+            'batch_size': pending.batch_size,
+        }
+
+    def stats(self):
+        """Return a snapshot of batching counters for /health"""
+        with self._stats_lock:
+            s = dict(self._stats)
+
+        batches = s['batches']
+        requests = s['requests']
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch_size': self.max_batch_size,
+            'max_queue_depth': self.max_queue_depth,
+            'queue_depth': self._queue.qsize(),
+            'requests': requests,
+            'rejected': s['rejected'],
+            'batches': batches,
+            'avg_batch_size': round(s['rows'] / batches, 2) if batches else 0.0,
+            'max_batch_size_seen': s['batch_size_max'],
+            'avg_queue_wait_ms': round(s['queue_wait_total'] / requests * 1000, 2) if requests else 0.0,
+            'max_queue_wait_ms': round(s['queue_wait_max'] * 1000, 2),
+        }
+
+    def _next_request(self, timeout=None):
+        if self._carry is not None:
+            pending, self._carry = self._carry, None
+            return pending
+        if timeout is None:
+            return self._queue.get()
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full"""
+        first = self._next_request()
+        batch = [first]
+        rows = len(first.inputs)
+        deadline = first.enqueued_at + self.window
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._next_request(timeout=remaining)
+            except queue.Empty:
+                break
+
+            if rows + len(pending.inputs) > self.max_batch_size:
+                # Doesn't fit; it opens the next batch instead
+                self._carry = pending
+                break
+
+            batch.append(pending)
+            rows += len(pending.inputs)
+
+        return batch, rows
+
+    def _run(self):
+        while True:
+            batch, rows = self._collect()
+            started = time.perf_counter()
+
+            try:
+                if len(batch) == 1:
+                    inputs = batch[0].inputs
+                else:
+                    inputs = np.concatenate([p.inputs for p in batch], axis=0)
+                predictions = self.predict_fn(inputs)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+
+            offset = 0
+            waits = []
+            for pending in batch:
+                n = len(pending.inputs)
+                pending.result = predictions[offset:offset + n]
+                pending.queue_wait = started - pending.enqueued_at
+                pending.batch_size = rows
+                waits.append(pending.queue_wait)
+                offset += n
+
+            with self._stats_lock:
+                self._stats['requests'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['rows'] += rows
+                self._stats['queue_wait_total'] += sum(waits)
+                self._stats['queue_wait_max'] = max(self._stats['queue_wait_max'], max(waits))
+                self._stats['batch_size_max'] = max(self._stats['batch_size_max'], rows)
+
+            for pending in batch:
+                pending.done.set()
+
+
+class PassThroughBatcher:
+    """MicroBatcher-compatible wrapper that calls `predict_fn` on the caller's thread.
+
+    Used for backends that already batch across callers and are safe to call
+    from many threads (the shared-memory inference broker), where a second,
+    per-worker batching window would only add latency.
+    """
+
+    def __init__(self, predict_fn, stats_fn=None):
+        self.predict_fn = predict_fn
+        self.stats_fn = stats_fn
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+
+    def submit(self, inputs):
+        predictions = self.predict_fn(inputs)
+        with self._stats_lock:
+            self._requests += 1
+        return predictions, {'queue_wait_ms': 0.0, 'batch_size': len(inputs)}
+
+    def stats(self):
+        with self._stats_lock:
+            s = {'mode': 'passthrough', 'requests': self._requests}
+        if self.stats_fn is not None:
+            s.update(self.stats_fn())
+        return s
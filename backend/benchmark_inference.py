@@ -0,0 +1,82 @@
+"""Compare model.predict() against the compiled TensorFlowBackend.
+
+Reports first-request latency (what the first farmer after a restart sees)
+and steady-state latency per batch size for both paths.
+
+Usage:
+    python backend/benchmark_inference.py [--runs 50] [--batch-sizes 1,4,16]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from tensorflow.keras.models import load_model
+
+from inference import TensorFlowBackend
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(BASE_DIR, 'models', 'crop_disease_model.h5')
+
+
+def time_call(fn, batch):
+    start = time.perf_counter()
+    fn(batch)
+    return time.perf_counter() - start
+
+
+def steady_state(fn, batch, runs):
+    """Median and p95 latency in ms over `runs` calls, after one untimed call"""
+    fn(batch)
+    timings = np.array([time_call(fn, batch) for _ in range(runs)]) * 1000
+    return np.median(timings), np.percentile(timings, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--batch-sizes', default='1,4,16')
+    args = parser.parse_args()
+
+    batch_sizes = [int(n) for n in args.batch_sizes.split(',')]
+    batches = {n: np.random.rand(n, 224, 224, 3).astype(np.float32) for n in batch_sizes}
+
+    print("=" * 60)
+    print("Inference Benchmark: model.predict vs TensorFlowBackend")
+    print("=" * 60)
+
+    # Separate model instances so neither path benefits from the other's tracing
+    print("\nLoading model (predict path)...")
+    predict_model = load_model(args.model)
+    predict_fn = lambda b: predict_model.predict(b, verbose=0)
+    predict_first = time_call(predict_fn, batches[batch_sizes[0]]) * 1000
+
+    print("Loading model (engine path)...")
+    engine = TensorFlowBackend(load_model(args.model))
+    start = time.perf_counter()
+    engine.warmup(batch_sizes)
+    warmup_time = (time.perf_counter() - start) * 1000
+    engine_first = time_call(engine.infer, batches[batch_sizes[0]]) * 1000
+
+    print("\n=== First Request (batch of %d) ===" % batch_sizes[0])
+    print(f"model.predict:            {predict_first:8.1f} ms")
+    print(f"TensorFlowBackend:        {engine_first:8.1f} ms  (after {warmup_time:.0f} ms warm-up at startup)")
+
+    print(f"\n=== Steady State ({args.runs} runs) ===")
+    print(f"{'Batch':<8}{'predict p50':>14}{'predict p95':>14}{'engine p50':>14}{'engine p95':>14}{'speedup':>10}")
+    print("-" * 74)
+    for n in batch_sizes:
+        p50, p95 = steady_state(predict_fn, batches[n], args.runs)
+        e50, e95 = steady_state(engine.infer, batches[n], args.runs)
+        print(f"{n:<8}{p50:>12.1f}ms{p95:>12.1f}ms{e50:>12.1f}ms{e95:>12.1f}ms{p50 / e50:>9.2f}x")
+
+    # Sanity check: both paths must agree
+    check = batches[batch_sizes[-1]]
+    max_diff = np.abs(predict_fn(check) - engine.infer(check)).max()
+    print(f"\nMax probability difference between paths: {max_diff:.2e}")
+    print("\n✓ Benchmark Complete!")
+
+
+if __name__ == '__main__':
+    main()
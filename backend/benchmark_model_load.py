@@ -0,0 +1,131 @@
+"""Compare load time and memory of the exported model formats.
+
+For each format, N worker processes load the model at the same time (as
+N API workers on one node would) and run one inference. The script then
+reads /proc/<pid>/smaps_rollup for every worker and reports:
+
+    RSS      resident memory of one worker
+    PSS sum  proportional set size summed over all workers; shared pages
+             are split between the processes mapping them, so this is what
+             the node actually pays
+    Private  anonymous/private memory of one worker, which can never be shared
+
+Linux only. Export the formats first with export_model.py.
+
+Usage:
+    python backend/benchmark_model_load.py [--workers 4] [--formats h5,weights,tflite]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+
+
+def run_child(fmt, path):
+    """Worker side: load, infer once, report timings, then hold the memory until told to exit"""
+    start = time.perf_counter()
+    import numpy as np
+    from inference import MODEL_FORMATS, load_backend
+    backend_name = MODEL_FORMATS[fmt][0]
+    if backend_name == 'tensorflow':
+        import tensorflow  # noqa: F401  (import cost reported separately)
+    elif backend_name == 'onnx':
+        import onnxruntime  # noqa: F401
+    imported = time.perf_counter()
+
+    backend = load_backend(backend_name, path)
+    loaded = time.perf_counter()
+
+    backend.infer(np.zeros((1, 224, 224, 3), dtype=np.float32))
+    inferred = time.perf_counter()
+
+    print(json.dumps({
+        'import_s': imported - start,
+        'load_s': loaded - imported,
+        'first_infer_s': inferred - loaded,
+    }), flush=True)
+    sys.stdin.readline()
+
+
+def read_smaps(pid):
+    """Rss, Pss and private memory of a process in MB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def measure(fmt, path, workers):
+    children = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--child', fmt, path],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    try:
+        timings = [json.loads(child.stdout.readline()) for child in children]
+        memory = [read_smaps(child.pid) for child in children]
+    finally:
+        for child in children:
+            child.stdin.write('\n')
+            child.stdin.flush()
+            child.wait()
+
+    avg = lambda key, rows: sum(r[key] for r in rows) / len(rows)
+    return {
+        'import_s': avg('import_s', timings),
+        'load_s': avg('load_s', timings),
+        'first_infer_s': avg('first_infer_s', timings),
+        'rss_mb': avg('rss', memory),
+        'pss_total_mb': sum(m['pss'] for m in memory),
+        'private_mb': avg('private', memory),
+    }
+
+
+def main():
+    from inference import MODEL_FORMATS, model_path
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--formats', default=','.join(MODEL_FORMATS),
+                        help='formats to compare (missing ones are skipped)')
+    parser.add_argument('--child', nargs=2, metavar=('FORMAT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    print("=" * 60)
+    print(f"Model Load Benchmark ({args.workers} workers per format)")
+    print("=" * 60)
+    print(f"{'Format':<12}{'Import':>9}{'Load':>9}{'1st infer':>11}{'RSS/worker':>13}{'PSS total':>12}{'Private/worker':>16}")
+    print("-" * 82)
+
+    for fmt in [f.strip() for f in args.formats.split(',') if f.strip()]:
+        path = model_path(MODELS_DIR, fmt)
+        if not os.path.exists(path):
+            print(f"{fmt:<12}  (not exported: {os.path.relpath(path, BASE_DIR)})")
+            continue
+        r = measure(fmt, path, args.workers)
+        print(f"{fmt:<12}{r['import_s']:>8.2f}s{r['load_s']:>8.2f}s{r['first_infer_s']:>10.2f}s"
+              f"{r['rss_mb']:>10.0f} MB{r['pss_total_mb']:>9.0f} MB{r['private_mb']:>13.0f} MB")
+
+    print("\n✓ Benchmark Complete!")
+
+
+if __name__ == '__main__':
+    main()
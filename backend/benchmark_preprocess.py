@@ -0,0 +1,150 @@
+"""Microbenchmark for image preprocessing.
+
+Runs every image through the original preprocessing (full decode, default
+resize, / 255.0 to float64, expand_dims) and through preprocessing.py with
+and without JPEG draft mode, and reports per stage:
+
+    decode     open + decode to RGB pixels
+    resize     resize to 224x224 (plus EXIF orientation for the new path)
+    normalize  uint8 -> float in [0, 1] with the batch dimension added
+    decoded    size of the decoded RGB pixels, which dominates memory use
+    peak       tracemalloc peak of the whole call; this sees NumPy
+               allocations but not PIL's internal image buffers
+
+Without --images a set of phone-sized JPEGs (4032x3024, some with an EXIF
+rotation) is generated.
+
+Usage:
+    python backend/benchmark_preprocess.py [--images path/to/photos] [--count 20] [--repeat 3]
+"""
+import argparse
+import io
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import RESAMPLE_FILTERS, decode_image, normalize_image, resize_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+SIZE = 224
+
+
+def synthetic_images(count, width=4032, height=3024):
+    """Smooth, photo-like JPEGs at phone resolution; every third one is tagged as rotated"""
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        base = rng.integers(0, 256, size=(height // 64, width // 64, 3), dtype=np.uint8)
+        img = Image.fromarray(base).resize((width, height), Image.Resampling.BICUBIC)
+        exif = Image.Exif()
+        if i % 3 == 0:
+            exif[0x0112] = 6
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=90, exif=exif)
+        images.append(buf.getvalue())
+    return images
+
+
+def load_images(path, count):
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(IMAGE_EXTENSIONS))
+    files = sorted(files)[:count]
+    return [open(f, 'rb').read() for f in files]
+
+
+def legacy_stages(image_bytes, resample):
+    """The original cnn_app.preprocess_image, stage by stage"""
+    t0 = time.perf_counter()
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.load()
+    t1 = time.perf_counter()
+    decoded = img.width * img.height * 3
+    img = img.resize((SIZE, SIZE), RESAMPLE_FILTERS[resample])
+    t2 = time.perf_counter()
+    img_array = np.array(img) / 255.0
+    img_array = np.expand_dims(img_array, axis=0)
+    t3 = time.perf_counter()
+    return (t1 - t0, t2 - t1, t3 - t2), decoded
+
+
+def new_stages(image_bytes, resample, draft, out):
+    t0 = time.perf_counter()
+    img, orientation = decode_image(image_bytes, SIZE, draft)
+    t1 = time.perf_counter()
+    decoded = img.width * img.height * 3
+    img = resize_image(img, SIZE, resample, orientation)
+    t2 = time.perf_counter()
+    normalize_image(img, out)
+    t3 = time.perf_counter()
+    return (t1 - t0, t2 - t1, t3 - t2), decoded
+
+
+def measure(fn, images, repeat):
+    timings = []
+    decoded = []
+    for _ in range(repeat):
+        for image_bytes in images:
+            t, d = fn(image_bytes)
+            timings.append(t)
+            decoded.append(d)
+
+    peaks = []
+    for image_bytes in images:
+        tracemalloc.start()
+        fn(image_bytes)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    timings = np.array(timings) * 1000
+    return {
+        'decode': np.median(timings[:, 0]),
+        'resize': np.median(timings[:, 1]),
+        'normalize': np.median(timings[:, 2]),
+        'total': np.median(timings.sum(axis=1)),
+        'decoded_mb': np.mean(decoded) / (1024 * 1024),
+        'peak_mb': max(peaks) / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=None, help='directory of real photos (searched recursively)')
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--resample', default='bicubic', choices=list(RESAMPLE_FILTERS))
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.count) if args.images else synthetic_images(args.count)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        return
+    avg_mb = sum(len(b) for b in images) / len(images) / (1024 * 1024)
+
+    out = np.empty((1, SIZE, SIZE, 3), dtype=np.float32)
+    variants = [
+        ('original', lambda b: legacy_stages(b, args.resample)),
+        ('no draft', lambda b: new_stages(b, args.resample, False, out)),
+        ('draft', lambda b: new_stages(b, args.resample, True, out)),
+    ]
+
+    print("=" * 60)
+    print(f"Preprocessing Benchmark ({len(images)} images, avg {avg_mb:.1f} MB, {args.resample})")
+    print("=" * 60)
+    print(f"{'Variant':<12}{'Decode':>10}{'Resize':>10}{'Normalize':>11}{'Total':>10}{'Decoded':>11}{'Peak':>10}")
+    print("-" * 74)
+    for name, fn in variants:
+        r = measure(fn, images, args.repeat)
+        print(f"{name:<12}{r['decode']:>8.1f}ms{r['resize']:>8.1f}ms{r['normalize']:>9.2f}ms{r['total']:>8.1f}ms"
+              f"{r['decoded_mb']:>8.1f} MB{r['peak_mb']:>7.2f} MB")
+
+    print("\n✓ Benchmark Complete!")
+
+
+if __name__ == '__main__':
+    main()
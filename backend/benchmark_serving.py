@@ -0,0 +1,131 @@
+"""Measure /predict throughput of serve.py from 1 to N workers.
+
+For each worker count the pre-fork server is started on a spare port and
+hammered with concurrent uploads of the same image. The prediction cache is
+disabled so every request runs inference. With --brokers K the workers
+forward inference to K shared-memory broker processes instead of loading
+the model themselves.
+
+Usage:
+    python backend/benchmark_serving.py [--max-workers 4] [--requests 400] [--concurrency 32] [--image leaf.jpg] [--brokers 1]
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SERVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+
+
+def sample_image():
+    """A phone-sized random JPEG, used when no --image is given"""
+    from PIL import Image
+    buf = io.BytesIO()
+    pixels = (np.random.rand(1200, 1600, 3) * 255).astype(np.uint8)
+    Image.fromarray(pixels).save(buf, format='JPEG', quality=90)
+    return buf.getvalue()
+
+
+def multipart_body(image_bytes):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="image"; filename="leaf.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def wait_ready(base, timeout):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(base + '/readyz', timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def post(url, body, content_type):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        json.loads(response.read())
+    return time.perf_counter() - start
+
+
+def run_load(base, body, content_type, requests, concurrency):
+    url = base + '/predict'
+    # Warm every worker's connection path first
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: post(url, body, content_type), range(concurrency)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda _: post(url, body, content_type), range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return requests / elapsed, np.median(latencies), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--image', default=None)
+    parser.add_argument('--brokers', type=int, default=0, help='inference broker processes (default 0)')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    image_bytes = open(args.image, 'rb').read() if args.image else sample_image()
+    body, content_type = multipart_body(image_bytes)
+    base = f'http://127.0.0.1:{args.port}'
+    env = dict(os.environ, PREDICTION_CACHE_SIZE='0')
+
+    print("=" * 60)
+    print(f"Serving Throughput Benchmark ({args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.brokers or 'no'} brokers)")
+    print("=" * 60)
+    print(f"{'Workers':<10}{'Req/s':>10}{'p50':>10}{'p95':>10}{'Scaling':>10}")
+    print("-" * 50)
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        server = subprocess.Popen(
+            [sys.executable, SERVE_PATH, '--workers', str(workers), '--port', str(args.port),
+             '--brokers', str(args.brokers)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not wait_ready(base, args.timeout):
+                print(f"{workers:<10}  server did not become ready")
+                continue
+            # Give the remaining workers a moment to finish warming up
+            time.sleep(2)
+            throughput, p50, p95 = run_load(base, body, content_type, args.requests, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+
+        baseline = baseline or throughput
+        print(f"{workers:<10}{throughput:>10.1f}{p50:>8.0f}ms{p95:>8.0f}ms{throughput / baseline:>9.2f}x")
+
+    print("\n✓ Benchmark Complete!")
+
+
+if __name__ == '__main__':
+    main()
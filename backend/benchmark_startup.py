@@ -0,0 +1,92 @@
+"""Measure cold-start time of the API end to end.
+
+Starts backend/cnn_app.py as a fresh process, then polls /livez (time until
+the server accepts connections) and /readyz (time until /predict can be
+served). The server's own per-stage timings from /readyz are printed too.
+
+Usage:
+    python backend/benchmark_startup.py [--runs 3] [--port 5055]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cnn_app.py')
+
+
+def get_status(url):
+    """Return (status_code, json_body), or (None, None) if nothing is listening yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None, None
+
+
+def measure_once(port, timeout):
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='0')
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, APP_PATH], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}'
+    bind_time = ready_time = None
+    report = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if bind_time is None:
+                code, _ = get_status(base + '/livez')
+                if code is not None:
+                    bind_time = time.perf_counter() - start
+            else:
+                code, report = get_status(base + '/readyz')
+                if code == 200:
+                    ready_time = time.perf_counter() - start
+                    break
+                if report and report.get('status') == 'failed':
+                    raise RuntimeError(f"Server failed to load: {report.get('error')}")
+            time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+    return bind_time, ready_time, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Cold Start Benchmark")
+    print("=" * 60)
+    print(f"{'Run':<6}{'Accepting connections':>24}{'Ready to predict':>20}")
+    print("-" * 50)
+
+    for run in range(1, args.runs + 1):
+        bind_time, ready_time, report = measure_once(args.port, args.timeout)
+        bind = f'{bind_time:.2f}s' if bind_time is not None else 'timeout'
+        ready = f'{ready_time:.2f}s' if ready_time is not None else 'timeout'
+        print(f"{run:<6}{bind:>24}{ready:>20}")
+
+    if report:
+        print("\nServer-side stage timings (last run):")
+        print(f"  imports: {report.get('imports_s', 0):.2f}s")
+        for stage, seconds in report.get('stages', {}).items():
+            print(f"  {stage}: {seconds:.2f}s")
+
+    print("\n✓ Benchmark Complete!")
+
+
+if __name__ == '__main__':
+    main()
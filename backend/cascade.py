@@ -0,0 +1,103 @@
+"""Two-stage inference cascade.
+
+A small (distilled) model answers every image first. Images where its top-1
+confidence is below `min_confidence`, or where the gap between its top two
+classes is below `min_margin`, are escalated to the full model. Clear-cut
+uploads (healthy leaves, obvious rust) never pay for the full network.
+
+Thresholds come from models/cascade_config.json, written by
+calibrate_cascade.py, and can be overridden with CASCADE_MIN_CONFIDENCE /
+CASCADE_MIN_MARGIN.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_CONFIG = {
+    'min_confidence': 0.9,
+    'min_margin': 0.0,
+    # Cost of one small-model image in full-model units; None until calibrated
+    'relative_cost': None,
+}
+
+
+def confidence_and_margin(probs):
+    """Top-1 probability and top-1 minus top-2 gap for each row of (N, C) probabilities"""
+    top2 = np.partition(probs, -2, axis=1)[:, -2:]
+    return top2[:, 1], top2[:, 1] - top2[:, 0]
+
+
+def escalation_mask(probs, min_confidence, min_margin):
+    """True for the rows the small model is not sure enough about"""
+    confidence, margin = confidence_and_margin(probs)
+    return (confidence < min_confidence) | (margin < min_margin)
+
+
+def load_cascade_config(path):
+    """Thresholds from a calibrate_cascade.py config, falling back to DEFAULT_CONFIG"""
+    config = dict(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            config.update(json.load(f))
+    return config
+
+
+class Cascade:
+    """Runs the small model's batcher first and the full model's only for unsure rows"""
+
+    def __init__(self, small_batcher, full_batcher, min_confidence, min_margin, relative_cost=None):
+        self.small_batcher = small_batcher
+        self.full_batcher = full_batcher
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.relative_cost = relative_cost
+
+        self._stats_lock = threading.Lock()
+        self._images = 0
+        self._escalated = 0
+
+    def submit(self, inputs):
+        """Predict (N, H, W, C) inputs.
+
+        Returns (predictions, stages, info) where stages[i] is 'small' or
+        'full' depending on which model answered row i.
+        """
+        small_probs, info = self.small_batcher.submit(inputs)
+        mask = escalation_mask(small_probs, self.min_confidence, self.min_margin)
+        escalated = int(mask.sum())
+
+        predictions = small_probs
+        if escalated:
+            full_probs, _ = self.full_batcher.submit(inputs[mask] if escalated < len(inputs) else inputs)
+            predictions = np.array(small_probs, copy=True)
+            predictions[mask] = full_probs
+
+        with self._stats_lock:
+            self._images += len(inputs)
+            self._escalated += escalated
+
+        stages = ['full' if m else 'small' for m in mask]
+        return predictions, stages, dict(info, escalated=escalated)
+
+    def stats(self):
+        """Escalation counters and estimated compute saved, for /health"""
+        with self._stats_lock:
+            images, escalated = self._images, self._escalated
+
+        rate = escalated / images if images else 0.0
+        s = {
+            'min_confidence': self.min_confidence,
+            'min_margin': self.min_margin,
+            'images': images,
+            'answered_small': images - escalated,
+            'escalated': escalated,
+            'escalation_rate': round(rate, 4),
+            'small_batching': self.small_batcher.stats(),
+        }
+        if self.relative_cost is not None and images:
+            # Full-model-only costs 1 per image; the cascade costs relative_cost + rate
+            s['relative_cost'] = self.relative_cost
+            s['estimated_compute_saved'] = round(1.0 - self.relative_cost - rate, 4)
+        return s
@@ -1,11 +1,29 @@
-from flask import Flask, request, jsonify
+import time
+
+# Recorded before the heavy imports so cold-start timings cover them
+PROCESS_START = time.time()
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from tensorflow.keras.models import load_model
 import numpy as np
-from PIL import Image
-import io
 import json
 import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from batching import MicroBatcher, PassThroughBatcher, QueueFullError
+from cascade import Cascade, load_cascade_config
+from inference import (BACKENDS, TensorFlowBackend, configure_tensorflow_threads, default_model_path,
+                       is_mmap_model, load_backend, load_mmap_model, map_weights, model_input_size)
+from prediction_cache import CACHE_MODES, PredictionCache
+from preprocessing import RESAMPLE_FILTERS, preprocess_image as preprocess_pixels, thread_buffer
+from response_table import ResponseTable, etag_for, to_json
+from tiling import TILE_AGGREGATIONS, aggregate, cut_tiles, load_working_image, tile_grid, tile_map
 
 app = Flask(__name__)
 CORS(app)
@@ -17,96 +35,614 @@ print("="*60)
 # Get absolute path to project root
 # Since this file is in backend/, go up one level
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_PATH = os.path.join(BASE_DIR, 'models', 'crop_disease_model.h5')
+
+# Inference backend: 'tensorflow' (Keras .h5), 'tflite' or 'onnx'.
+# The TFLite and ONNX files are produced by export_model.py
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'tensorflow')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '0')) or None
+INTER_OP_THREADS = int(os.getenv('INTER_OP_THREADS', '0')) or None
+# An unknown backend leaves the path unset; check_files() reports it via /readyz
+MODEL_PATH = os.getenv('MODEL_PATH') or (default_model_path(
+    os.path.join(BASE_DIR, 'models'), INFERENCE_BACKEND
+) if INFERENCE_BACKEND in BACKENDS else None)
 CLASS_INDICES_PATH = os.path.join(BASE_DIR, 'models', 'class_indices.json')
 
+# Two-stage cascade: with CASCADE=1 a small distilled model answers first and
+# only unsure images go to MODEL_PATH. Thresholds come from CASCADE_CONFIG
+# (written by calibrate_cascade.py) unless overridden here
+CASCADE_ENABLED = os.getenv('CASCADE', '0') == '1'
+CASCADE_BACKEND = os.getenv('CASCADE_BACKEND', INFERENCE_BACKEND)
+CASCADE_MODEL_PATH = os.getenv('CASCADE_MODEL_PATH') or (default_model_path(
+    os.path.join(BASE_DIR, 'models'), CASCADE_BACKEND, stem='crop_disease_model_small'
+) if CASCADE_BACKEND in BACKENDS else None)
+CASCADE_CONFIG_PATH = os.getenv('CASCADE_CONFIG', os.path.join(BASE_DIR, 'models', 'cascade_config.json'))
+DISEASE_INFO_PATH = os.path.join(BASE_DIR, 'backend', 'disease_info.json')
+
+# Micro-batching: concurrent /predict calls are grouped for up to
+# BATCH_WINDOW_MS (or until BATCH_MAX_SIZE images) and run as one batch
+BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', '10'))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '16'))
+BATCH_QUEUE_DEPTH = int(os.getenv('BATCH_QUEUE_DEPTH', '256'))
+
+# Batch sizes traced and run once at startup so no request pays for warm-up
+WARMUP_BATCH_SIZES = [int(n) for n in os.getenv('WARMUP_BATCH_SIZES', '1,2,4,8,16').split(',') if n.strip()]
+
+# Bulk /predict/batch: images are decoded on DECODE_WORKERS threads; above
+# BULK_STREAM_THRESHOLD images the results are streamed back as NDJSON
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', str(min(8, os.cpu_count() or 1))))
+BULK_STREAM_THRESHOLD = int(os.getenv('BULK_STREAM_THRESHOLD', '32'))
+BULK_MAX_IMAGES = int(os.getenv('BULK_MAX_IMAGES', '1000'))
+# Uploaded archives are spooled in memory up to this many bytes, then on disk
+BULK_SPOOL_MEMORY = int(os.getenv('BULK_SPOOL_MEMORY', str(16 * 1024 * 1024)))
+
+# Prediction cache: PREDICTION_CACHE_SIZE entries (0 disables it), keyed by
+# 'exact' upload bytes or a 'perceptual' hash that also catches re-encodes
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '4096'))
+PREDICTION_CACHE_MODE = os.getenv('PREDICTION_CACHE_MODE', 'exact')
+
+# Preprocessing: resize filter (see preprocessing.RESAMPLE_FILTERS) and
+# whether JPEGs are decoded at reduced size in draft mode
+RESAMPLE_FILTER = os.getenv('RESAMPLE_FILTER', 'bicubic')
+JPEG_DRAFT = os.getenv('JPEG_DRAFT', '1') == '1'
+
+# Tiled mode (/predict with mode=tiled): working resolution, default tile
+# stride and aggregation, and an upper bound on tiles per image
+TILE_MAX_SIDE = int(os.getenv('TILE_MAX_SIDE', '1120'))
+TILE_STRIDE = int(os.getenv('TILE_STRIDE', '168'))
+TILE_AGGREGATION = os.getenv('TILE_AGGREGATION', 'max')
+TILE_MAX_TILES = int(os.getenv('TILE_MAX_TILES', '256'))
+
+SUPPORTED_LANGUAGES = ['en', 'hi', 'kn', 'te', 'ta', 'ml', 'mr', 'bn', 'gu']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
 print(f"\nProject root: {BASE_DIR}")
+print(f"Inference backend: {INFERENCE_BACKEND}")
 print(f"Model path: {MODEL_PATH}")
+if CASCADE_ENABLED:
+    print(f"Cascade small model: {CASCADE_MODEL_PATH} ({CASCADE_BACKEND})")
 print(f"Class indices path: {CLASS_INDICES_PATH}")
 
-# Check if files exist
-if not os.path.exists(MODEL_PATH):
-    print(f"\n❌ ERROR: Model file not found at {MODEL_PATH}")
-    print("\nPlease check:")
-    print("1. The model file exists in the models/ directory")
-    print("2. The file is named exactly 'crop_disease_model.h5'")
-    print("3. You're running this script from the correct directory")
-    exit(1)
-
-if not os.path.exists(CLASS_INDICES_PATH):
-    print(f"\n❌ ERROR: Class indices file not found at {CLASS_INDICES_PATH}")
-    exit(1)
-
-print("\n✓ All required files found")
-
-# Load model
-print("\nLoading model...")
-try:
-    model = load_model(MODEL_PATH)
-    print("✓ Model loaded successfully!")
-except Exception as e:
-    print(f"❌ Error loading model: {str(e)}")
-    exit(1)
-
-# Load class indices
-print("Loading class indices...")
-try:
+# Everything below is filled in by load_resources(), which runs in a
+# background thread so the server accepts connections (and answers
+# /livez and /readyz) while the model is still loading
+engine = None
+# Square input size of MODEL_PATH: from its .meta.json (see inference.read_metadata)
+# if it has one, otherwise from the loaded model
+MODEL_INPUT_SIZE = None
+class_indices = {}
+idx_to_class = {}
+disease_info = {}
+response_table = None
+batcher = None
+cascade = None
+prediction_cache = None
+MODEL_VERSION = None
+preloaded_weights = None
+# Set by serve.py --brokers: the model lives in a separate broker process and
+# this worker only talks to it through shared memory
+broker_client = None
+HOME_BODY = HOME_ETAG = None
+CLASSES_BODY = CLASSES_ETAG = None
+
+startup = {
+    'status': 'loading',    # loading -> ready | failed
+    'stage': 'starting',
+    'error': None,
+    'stages': {},           # stage name -> seconds
+    'load_started_at': None,
+    'preloaded': False,
+    'ready_at': None,
+}
+startup_lock = threading.Lock()
+
+# Thread pool for parallel image decoding in /predict/batch
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
+class StartupError(Exception):
+    """A required file is missing or invalid; the server stays live but never becomes ready"""
+
+def run_stage(name, fn):
+    """Run one loading stage, recording its duration for /readyz"""
+    with startup_lock:
+        startup['stage'] = name
+    start = time.perf_counter()
+    result = fn()
+    with startup_lock:
+        startup['stages'][name] = round(time.perf_counter() - start, 3)
+    return result
+
+def check_files():
+    if INFERENCE_BACKEND not in BACKENDS:
+        print(f"\n❌ ERROR: Unknown inference backend '{INFERENCE_BACKEND}'")
+        print(f"Choose one of: {', '.join(BACKENDS)}")
+        raise StartupError(f"Unknown inference backend '{INFERENCE_BACKEND}'")
+    
+    if CASCADE_ENABLED and CASCADE_BACKEND not in BACKENDS:
+        print(f"\n❌ ERROR: Unknown cascade backend '{CASCADE_BACKEND}'")
+        print(f"Choose one of: {', '.join(BACKENDS)}")
+        raise StartupError(f"Unknown cascade backend '{CASCADE_BACKEND}'")
+    
+    if RESAMPLE_FILTER not in RESAMPLE_FILTERS:
+        print(f"\n❌ ERROR: Unknown RESAMPLE_FILTER '{RESAMPLE_FILTER}'")
+        print(f"Choose one of: {', '.join(RESAMPLE_FILTERS)}")
+        raise StartupError(f"Unknown RESAMPLE_FILTER '{RESAMPLE_FILTER}'")
+    
+    if not os.path.exists(MODEL_PATH):
+        print(f"\n❌ ERROR: Model file not found at {MODEL_PATH}")
+        print("\nPlease check:")
+        print("1. The model file exists in the models/ directory")
+        print(f"2. The file is named exactly '{os.path.basename(MODEL_PATH)}'")
+        print("3. You're running this script from the correct directory")
+        raise StartupError(f"Model file not found at {MODEL_PATH}")
+    
+    if CASCADE_ENABLED and not os.path.exists(CASCADE_MODEL_PATH):
+        print(f"\n❌ ERROR: Cascade model not found at {CASCADE_MODEL_PATH}")
+        print("Train one with distill_model.py or set CASCADE_MODEL_PATH")
+        raise StartupError(f"Cascade model not found at {CASCADE_MODEL_PATH}")
+    
+    if not os.path.exists(CLASS_INDICES_PATH):
+        print(f"\n❌ ERROR: Class indices file not found at {CLASS_INDICES_PATH}")
+        raise StartupError(f"Class indices file not found at {CLASS_INDICES_PATH}")
+    
+    print("\n✓ All required files found")
+
+def preload_weights():
+    """Memory-map the flat weights blob so forked workers inherit the mapping"""
+    global preloaded_weights
+    if INFERENCE_BACKEND == 'tensorflow' and is_mmap_model(MODEL_PATH):
+        preloaded_weights = map_weights(MODEL_PATH)
+        print(f"✓ Mapped {len(preloaded_weights)} weight arrays from {MODEL_PATH}")
+
+def load_model_backend():
+    global MODEL_INPUT_SIZE
+    if broker_client is not None:
+        print("✓ Using the shared-memory inference broker (no local model)")
+        MODEL_INPUT_SIZE = broker_client.input_size
+        return broker_client
+    
+    # Load model
+    print("\nLoading model...")
+    if preloaded_weights is not None:
+        # Thread counts must be set before the model creates the TF runtime
+        configure_tensorflow_threads(INFERENCE_THREADS, INTER_OP_THREADS)
+        loaded = TensorFlowBackend(load_mmap_model(MODEL_PATH, weights=preloaded_weights),
+                                   input_size=MODEL_INPUT_SIZE)
+    else:
+        loaded = load_backend(INFERENCE_BACKEND, MODEL_PATH, input_size=MODEL_INPUT_SIZE,
+                              num_threads=INFERENCE_THREADS, inter_op_threads=INTER_OP_THREADS)
+    MODEL_INPUT_SIZE = loaded.input_size
+    print(f"✓ Model loaded successfully! ({loaded.name} backend, {MODEL_INPUT_SIZE}x{MODEL_INPUT_SIZE} input)")
+    return loaded
+
+def load_cascade_backend():
+    """Load the small first-stage model; it always runs in this process"""
+    print("\nLoading cascade model...")
+    small = load_backend(CASCADE_BACKEND, CASCADE_MODEL_PATH, input_size=model_input_size(CASCADE_MODEL_PATH),
+                         num_threads=INFERENCE_THREADS, inter_op_threads=INTER_OP_THREADS)
+    if small.input_size != MODEL_INPUT_SIZE:
+        # Both stages are fed the same preprocessed images
+        raise StartupError(f"Cascade model takes {small.input_size}px inputs, the full model {MODEL_INPUT_SIZE}px")
+    print(f"✓ Cascade model loaded ({small.name} backend)")
+    return small
+
+def warm_up(loaded):
+    # Compile and warm up the inference graph
+    print("Warming up inference engine...")
+    warmup_timings = loaded.warmup(
+        [n for n in WARMUP_BATCH_SIZES if n <= max(BATCH_MAX_SIZE, 1)]
+    )
+    for n, seconds in warmup_timings.items():
+        print(f"  batch {n:>3}: {seconds * 1000:.1f} ms")
+    print("✓ Inference engine ready")
+
+def load_metadata():
+    """Load the model's input size, class indices and disease information, then compile the response table"""
+    global class_indices, idx_to_class, disease_info, response_table, MODEL_INPUT_SIZE
+    global CLASSES_BODY, CLASSES_ETAG
+
+    MODEL_INPUT_SIZE = model_input_size(MODEL_PATH)
+    if MODEL_INPUT_SIZE is not None:
+        print(f"✓ Model input size: {MODEL_INPUT_SIZE}x{MODEL_INPUT_SIZE}")
+    else:
+        print("⚠️  No model metadata; the input size comes from the model once it is loaded")
+    
+    # Load class indices
+    print("Loading class indices...")
     with open(CLASS_INDICES_PATH, 'r') as f:
         class_indices = json.load(f)
     
     # Reverse mapping: index -> class name
     idx_to_class = {v: k for k, v in class_indices.items()}
     print(f"✓ Loaded {len(class_indices)} classes")
-except Exception as e:
-    print(f"❌ Error loading class indices: {str(e)}")
-    exit(1)
+    
+    # Load disease information
+    if os.path.exists(DISEASE_INFO_PATH):
+        print("Loading disease information...")
+        with open(DISEASE_INFO_PATH, 'r',encoding='utf-8') as f:
+            disease_info = json.load(f)
+        print(f"✓ Loaded information for {len(disease_info)} diseases")
+    else:
+        print("⚠️  Warning: disease_info.json not found. Using default responses.")
+        disease_info = {}
+    
+    # Compile disease info into ready-to-emit response fragments per (class, language)
+    print("Compiling response table...")
+    response_table = ResponseTable(class_indices, disease_info, SUPPORTED_LANGUAGES)
+    print(f"✓ Compiled {response_table.num_classes} classes x {len(SUPPORTED_LANGUAGES)} languages")
+    
+    # Static payload for /classes, served with an ETag (/ needs the loaded model's input size)
+    CLASSES_BODY = to_json({
+        'classes': sorted(response_table.display_names),
+        'count': len(response_table.display_names)
+    })
+    CLASSES_ETAG = etag_for(CLASSES_BODY)
 
-# Load disease information
-DISEASE_INFO_PATH = os.path.join(BASE_DIR, 'backend', 'disease_info.json')
+def start_serving(loaded, small=None):
+    """Create the prediction cache and the batching scheduler(s) around the loaded backend(s)"""
+    global engine, batcher, cascade, prediction_cache, MODEL_VERSION, PREDICTION_CACHE_MODE
+    global HOME_BODY, HOME_ETAG
+    
+    # Cascade thresholds: calibrated config, then environment overrides
+    if small is not None:
+        config = load_cascade_config(CASCADE_CONFIG_PATH)
+        min_confidence = float(os.getenv('CASCADE_MIN_CONFIDENCE', config['min_confidence']))
+        min_margin = float(os.getenv('CASCADE_MIN_MARGIN', config['min_margin']))
+    
+    # Cache keys include the model version so a redeploy never serves stale outputs
+    model_stat = os.stat(MODEL_PATH)
+    MODEL_VERSION = os.getenv('MODEL_VERSION') or (
+        f"{INFERENCE_BACKEND}-{os.path.basename(MODEL_PATH)}-{model_stat.st_size}-{int(model_stat.st_mtime)}"
+    )
+    if small is not None and not os.getenv('MODEL_VERSION'):
+        small_stat = os.stat(CASCADE_MODEL_PATH)
+        MODEL_VERSION += (f"+{os.path.basename(CASCADE_MODEL_PATH)}-{small_stat.st_size}-{int(small_stat.st_mtime)}"
+                          f"@{min_confidence:g}/{min_margin:g}")
+    if PREDICTION_CACHE_MODE not in CACHE_MODES:
+        print(f"⚠️  Warning: unknown PREDICTION_CACHE_MODE '{PREDICTION_CACHE_MODE}', using 'exact'")
+        PREDICTION_CACHE_MODE = 'exact'
+    prediction_cache = PredictionCache(
+        max_entries=PREDICTION_CACHE_SIZE,
+        mode=PREDICTION_CACHE_MODE,
+        model_version=MODEL_VERSION
+    )
+    if prediction_cache.enabled:
+        print(f"✓ Prediction cache enabled ({PREDICTION_CACHE_MODE}, {PREDICTION_CACHE_SIZE} entries)")
+    
+    if getattr(loaded, 'thread_safe', False):
+        # The broker batches across all workers; calling it directly avoids a second window
+        batcher = PassThroughBatcher(loaded.infer, stats_fn=getattr(loaded, 'stats', None))
+        print("✓ Requests go straight to the inference broker")
+    else:
+        # Start the batching scheduler; it is the only thread that calls the model
+        batcher = MicroBatcher(
+            loaded.infer,
+            window_ms=BATCH_WINDOW_MS,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_queue_depth=BATCH_QUEUE_DEPTH
+        )
+        print(f"✓ Micro-batching enabled (window {BATCH_WINDOW_MS:g} ms, "
+              f"max batch {BATCH_MAX_SIZE}, queue depth {BATCH_QUEUE_DEPTH})")
+    
+    if small is not None:
+        small_batcher = MicroBatcher(
+            small.infer,
+            window_ms=BATCH_WINDOW_MS,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_queue_depth=BATCH_QUEUE_DEPTH
+        )
+        cascade = Cascade(small_batcher, batcher, min_confidence, min_margin, config.get('relative_cost'))
+        print(f"✓ Cascade enabled (escalate below {min_confidence:g} confidence or {min_margin:g} margin)")
+    
+    HOME_BODY = to_json({
+        'message': 'KrishiMitra Crop Disease Detection API',
+        'version': '1.0',
+        'status': 'running',
+        'model_loaded': True,
+        'num_classes': len(class_indices),
+        'input_size': loaded.input_size
+    })
+    HOME_ETAG = etag_for(HOME_BODY)
+    engine = loaded
+
+def preload():
+    """Fork-safe part of startup: files, metadata, response table and mapped weights.
 
-if os.path.exists(DISEASE_INFO_PATH):
-    print("Loading disease information...")
-    with open(DISEASE_INFO_PATH, 'r',encoding='utf-8') as f:
-        disease_info = json.load(f)
-    print(f"✓ Loaded information for {len(disease_info)} diseases")
-else:
-    print("⚠️  Warning: disease_info.json not found. Using default responses.")
-    disease_info = {}
-
-def preprocess_image(image_bytes):
-    """Preprocess uploaded image for model prediction"""
+    Starts no threads and initialises no inference runtime, so a pre-fork
+    master (serve.py) can run it once and let workers inherit the result.
+    """
+    with startup_lock:
+        startup['load_started_at'] = time.time()
+    run_stage('check_files', check_files)
+    run_stage('load_metadata', load_metadata)
+    run_stage('map_weights', preload_weights)
+    with startup_lock:
+        startup['preloaded'] = True
+
+def load_resources():
+    """Load everything /predict needs, stage by stage, then mark the server ready"""
     try:
-        # Open image
-        img = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize to model input size
-        img = img.resize((224, 224))
-        
-        # Convert to array and normalize
-        img_array = np.array(img) / 255.0
-        
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array
+        if not startup['preloaded']:
+            preload()
+        loaded = run_stage('load_model', load_model_backend)
+        run_stage('warmup', lambda: warm_up(loaded))
+        small = None
+        if CASCADE_ENABLED:
+            small = run_stage('load_cascade_model', load_cascade_backend)
+            run_stage('warmup_cascade', lambda: warm_up(small))
+        run_stage('start_serving', lambda: start_serving(loaded, small))
+    except Exception as e:
+        print(f"❌ Startup failed during '{startup['stage']}': {str(e)}")
+        with startup_lock:
+            startup['status'] = 'failed'
+            startup['error'] = str(e)
+        return False
+    
+    with startup_lock:
+        startup['status'] = 'ready'
+        startup['stage'] = None
+        startup['ready_at'] = time.time()
+    print(f"✓ Ready in {startup['ready_at'] - PROCESS_START:.2f}s since process start")
+    return True
+
+def start_background_loading():
+    thread = threading.Thread(target=load_resources, name='model-loader', daemon=True)
+    thread.start()
+    return thread
+
+def is_ready():
+    return startup['status'] == 'ready'
+
+def startup_report():
+    """Load progress and timings for /livez and /readyz"""
+    with startup_lock:
+        report = {
+            'status': startup['status'],
+            'stage': startup['stage'],
+            'error': startup['error'],
+            'stages': dict(startup['stages']),
+            'uptime_s': round(time.time() - PROCESS_START, 3),
+        }
+        if startup['load_started_at'] is not None:
+            report['imports_s'] = round(startup['load_started_at'] - PROCESS_START, 3)
+        if startup['ready_at'] is not None:
+            report['time_to_ready_s'] = round(startup['ready_at'] - PROCESS_START, 3)
+    return report
+
+def require_ready(view):
+    """Answer 503 with load progress until the model is ready"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_ready():
+            report = startup_report()
+            message = 'Model failed to load' if report['status'] == 'failed' else 'Model is still loading'
+            response = jsonify({'error': message, 'startup': report})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        return view(*args, **kwargs)
+    return wrapper
+
+def preprocess_image(image_bytes, out=None):
+    """Preprocess uploaded image for model prediction.
+
+    Returns a float32 (1, size, size, 3) array, written into `out` if given.
+    """
+    try:
+        return preprocess_pixels(image_bytes, size=engine.input_size, resample=RESAMPLE_FILTER,
+                                 draft=JPEG_DRAFT, out=out)
     except Exception as e:
         raise ValueError(f"Error processing image: {str(e)}")
 
+def run_model(inputs):
+    """Predict (N, H, W, C) inputs through the cascade if enabled, else the full model.
+
+    Returns (predictions, stages, info); stages is None without a cascade.
+    """
+    if cascade is not None:
+        return cascade.submit(inputs)
+    predictions, info = batcher.submit(inputs)
+    return predictions, None, info
+
+def predict_tiled(image_bytes, language):
+    """Classify overlapping tiles of a large image in one batch and aggregate them.
+
+    Returns the serialized /predict response with the tiling details and a
+    per-tile disease map added.
+    """
+    tile_size = engine.input_size
+    method = request.form.get('aggregate', TILE_AGGREGATION)
+    if method not in TILE_AGGREGATIONS:
+        raise ValueError(f"aggregate must be one of: {', '.join(TILE_AGGREGATIONS)}")
+    try:
+        stride = int(request.form.get('stride', TILE_STRIDE))
+    except ValueError:
+        raise ValueError('stride must be an integer')
+    if not tile_size // 8 <= stride <= tile_size:
+        raise ValueError(f'stride must be between {tile_size // 8} and {tile_size}')
+    
+    try:
+        pixels, scale = load_working_image(image_bytes, TILE_MAX_SIDE, tile_size, RESAMPLE_FILTER, JPEG_DRAFT)
+    except Exception as e:
+        raise ValueError(f"Error processing image: {str(e)}")
+    # Counted before any tile is cut: a small stride can ask for hundreds of float32 tiles
+    ys, xs = tile_grid(pixels.shape[0], pixels.shape[1], tile_size, stride)
+    if len(ys) * len(xs) > TILE_MAX_TILES:
+        raise ValueError(f'Image would need {len(ys) * len(xs)} tiles (max {TILE_MAX_TILES}); use a larger stride')
+    tiles, ys, xs = cut_tiles(pixels, tile_size, stride)
+    
+    print(f"Tiled mode: {pixels.shape[1]}x{pixels.shape[0]} working image, "
+          f"{len(ys)}x{len(xs)} tiles, stride {stride}, {method}")
+    probs, batch_info = batcher.submit(tiles)
+    print(f"Queue wait: {batch_info['queue_wait_ms']} ms | Batch size: {batch_info['batch_size']}")
+    
+    prediction = aggregate(probs, method)
+    classes, confidence = tile_map(probs, len(ys), len(xs))
+    return response_table.render_json(prediction, language, extra={
+        'mode': 'tiled',
+        'tiles': {
+            'count': len(tiles),
+            'rows': len(ys),
+            'cols': len(xs),
+            'tile_size': tile_size,
+            'stride': stride,
+            'aggregate': method,
+            'working_size': [int(pixels.shape[1]), int(pixels.shape[0])],
+            'scale': round(scale, 4),
+        },
+        'tile_map': [[response_table.display_names[i] for i in row] for row in classes.tolist()],
+        'tile_confidence': np.round(confidence, 3).tolist(),
+    })
+
+def resolve_language(language):
+    """Fall back to English for unsupported language codes"""
+    if language not in SUPPORTED_LANGUAGES:
+        return 'en'
+    return language
+
+def json_response(body, etag=None):
+    """Wrap an already-serialized JSON body, answering If-None-Match with 304"""
+    response = Response(body, mimetype='application/json')
+    if etag is not None:
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+    return response
+
+def collect_batch_sources():
+    """Return (sources, close) for a /predict/batch request.
+
+    sources is a list of (filename, read_fn) pairs for every image, sent
+    either as repeated multipart 'images' fields or as a single zip/tar
+    'archive'. Nothing refers to the request's own file handles, which are
+    closed once the view returns while NDJSON is still streaming: multipart
+    images are read up front, and an archive is spooled to a temporary file
+    whose members are only read when read_fn is called. close() releases
+    that file and must be called once the sources are done with.
+    """
+    sources = []
+    owned = []
+    
+    def close():
+        for f in reversed(owned):
+            f.close()
+    
+    for image_file in request.files.getlist('images'):
+        if image_file.filename == '':
+            continue
+        image_bytes = image_file.read()
+        sources.append((image_file.filename, lambda b=image_bytes: b))
+    
+    if 'archive' not in request.files:
+        return sources, close
+    
+    archive_file = request.files['archive']
+    name = archive_file.filename.lower()
+    if not name.endswith(('.zip', '.tar', '.tar.gz', '.tgz')):
+        raise ValueError('Archive must be a .zip, .tar, .tar.gz or .tgz file')
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_MEMORY)
+    owned.append(spool)
+    try:
+        shutil.copyfileobj(archive_file.stream, spool)
+        spool.seek(0)
+        if name.endswith('.zip'):
+            archive = zipfile.ZipFile(spool)
+            owned.append(archive)
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                sources.append((member.filename, lambda m=member: archive.read(m)))
+        else:
+            archive = tarfile.open(fileobj=spool, mode='r:*')
+            owned.append(archive)
+            # Tar members share one file position, so reads are serialised
+            tar_lock = threading.Lock()
+            
+            def read_member(member):
+                with tar_lock:
+                    return archive.extractfile(member).read()
+            
+            for member in archive.getmembers():
+                if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                sources.append((member.name, lambda m=member: read_member(m)))
+    except BaseException:
+        close()
+        raise
+    
+    return sources, close
+
+def batch_chunks(sources):
+    """Split batch sources into BATCH_MAX_SIZE chunks, each run as one forward pass"""
+    for start in range(0, len(sources), BATCH_MAX_SIZE):
+        yield sources[start:start + BATCH_MAX_SIZE]
+
+def decode_source(source, out):
+    """Read one batch source, checking the prediction cache before preprocessing into `out`.
+
+    Returns (filename, cache key, cached probabilities, preprocessed array, error).
+    """
+    filename, read_fn = source
+    try:
+        image_bytes = read_fn()
+        key = prediction_cache.key_for(image_bytes) if prediction_cache.enabled else None
+        cached = prediction_cache.get(key) if key else None
+        if cached is not None:
+            return filename, key, cached, None, None
+        return filename, key, None, preprocess_image(image_bytes, out=out), None
+    except Exception as e:
+        return filename, None, None, None, str(e)
+
+def predict_chunk(sources, language):
+    """Decode a chunk of images in parallel and run the cache misses as one forward pass.
+
+    Returns one serialized JSON result per source, in order.
+    """
+    # Every image is decoded straight into its row of one chunk-sized buffer
+    size = engine.input_size
+    inputs = np.empty((len(sources), size, size, 3), dtype=np.float32)
+    decoded = list(decode_pool.map(decode_source, sources, [inputs[i:i + 1] for i in range(len(sources))]))
+    
+    rows = [i for i, d in enumerate(decoded) if d[3] is not None]
+    to_run = [decoded[i] for i in rows]
+    predictions = {}
+    stages = {}
+    if to_run:
+        stacked = inputs if len(rows) == len(decoded) else inputs[rows]
+        batch_predictions, batch_stages, batch_info = run_model(stacked)
+        print(f"Batch chunk: {len(to_run)} images | Queue wait: {batch_info['queue_wait_ms']} ms")
+        for row, d in enumerate(to_run):
+            predictions[id(d)] = batch_predictions[row]
+            if batch_stages is not None:
+                stages[id(d)] = batch_stages[row]
+            if d[1] is not None:
+                prediction_cache.put(d[1], batch_predictions[row])
+    
+    results = []
+    for d in decoded:
+        filename, key, cached, array, error = d
+        if error is not None:
+            results.append(to_json({'filename': filename, 'success': False, 'error': error}))
+            continue
+        prediction = cached if cached is not None else predictions[id(d)]
+        extra = {'filename': filename}
+        if cascade is not None:
+            extra['stage'] = 'cache' if cached is not None else stages[id(d)]
+        results.append(response_table.render_json(prediction, language, extra=extra))
+    return results
+
 @app.route('/')
 def home():
-    return jsonify({
-        'message': 'KrishiMitra Crop Disease Detection API',
-        'version': '1.0',
-        'status': 'running',
-        'model_loaded': True,
-        'num_classes': len(class_indices)
-    })
+    if not is_ready():
+        return jsonify({
+            'message': 'KrishiMitra Crop Disease Detection API',
+            'version': '1.0',
+            'status': startup['status'],
+            'model_loaded': False
+        })
+    return json_response(HOME_BODY, HOME_ETAG)
 
 @app.route('/predict', methods=['POST'])
+@require_ready
 def predict_disease():
     try:
         language = request.form.get('language', 'en')
@@ -119,9 +655,7 @@ def predict_disease():
 
 
         # Validate language
-        supported_languages = ['en', 'hi', 'kn', 'te', 'ta', 'ml', 'mr', 'bn', 'gu']
-        if language not in supported_languages:
-            language = 'en'  # Fallback to English
+        language = resolve_language(language)
         
         # ... rest of your existing code for image processing ...
         # Check if image is in request
@@ -140,110 +674,175 @@ def predict_disease():
         image_bytes = image_file.read()
         print(f"Image size: {len(image_bytes)} bytes")
         
-        # Preprocess image
-        print("Preprocessing image...")
-        processed_image = preprocess_image(image_bytes)
-        
-        # Make prediction
-        print("Making prediction...")
-        predictions = model.predict(processed_image, verbose=0)
-        
-        # Get top prediction
-        class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][class_idx])
-        
-        print(f"Predicted class index: {class_idx}")
-        print(f"Confidence: {confidence * 100:.2f}%")
+        # High-resolution field/drone shots: classify tiles instead of one downscale
+        if request.form.get('mode') == 'tiled':
+            body = predict_tiled(image_bytes, language)
+            print("✓ Tiled prediction successful\n")
+            return json_response(body)
         
-        # Get disease name
-        disease_key = idx_to_class[class_idx]
-        print(f"Disease: {disease_key}")
+        # Re-submitted photos are answered from the cache
+        cache_key = prediction_cache.key_for(image_bytes) if prediction_cache.enabled else None
+        prediction = prediction_cache.get(cache_key) if cache_key else None
         
-        # Get disease information
-        if disease_key in disease_info:
-            disease_translations = disease_info[disease_key]
-            if language in disease_translations:
-                disease_data = disease_translations[language]
-            else:
-        # Fallback to English if translation not available
-                disease_data = disease_translations.get('en', {
-                    'name': disease_key.replace('___', ' - ').replace('_', ' '),
-                    'treatment': 'Translation not available. Consult agricultural expert.',
-                    'prevention': 'Standard practices recommended.',
-                    'severity': 'unknown'
-                })
+        stage = 'cache'
+        if prediction is not None:
+            print("✓ Cache hit, skipping inference")
         else:
-            # Default response if disease info not found
-            disease_data = {
-                'name': disease_key.replace('___', ' - ').replace('_', ' '),
-                'treatment': 'Consult an agricultural expert for specific treatment recommendations.',
-                'prevention': 'Follow standard crop management practices and monitor plants regularly.',
-                'severity': 'unknown'
-            }
-        
-        # Get top 3 predictions for additional info
-        top_3_idx = np.argsort(predictions[0])[-3:][::-1]
-        alternative_predictions = []
-        for idx in top_3_idx[1:]:  # Skip the first (already shown)
-            alt_disease_key = idx_to_class[idx]
-            alternative_predictions.append({
-                'disease': alt_disease_key.replace('___', ' - ').replace('_', ' '),
-                'confidence': f'{float(predictions[0][idx]) * 100:.1f}%'
-            })
+            # Preprocess image
+            print("Preprocessing image...")
+            processed_image = preprocess_image(image_bytes, out=thread_buffer(engine.input_size))
+            
+            # Make prediction (batched with any concurrent requests)
+            print("Making prediction...")
+            predictions, stages, batch_info = run_model(processed_image)
+            print(f"Queue wait: {batch_info['queue_wait_ms']} ms | "
+                  f"Batch size: {batch_info['batch_size']}")
+            prediction = predictions[0]
+            stage = stages[0] if stages is not None else 'full'
+            
+            if cache_key:
+                prediction_cache.put(cache_key, prediction)
         
-        # Prepare response
-        response = {
-            'success': True,
-            'disease': disease_data['name'],
-            'confidence': f'{confidence * 100:.2f}%',
-            'confidence_score': confidence,
-            'severity': disease_data.get('severity', 'unknown'),
-            'treatment': disease_data['treatment'],
-            'prevention': disease_data['prevention'],
-            'organic_treatment': disease_data.get('organic_treatment', 'Not available'),
-            'recommended_insecticide_pesticide': disease_data.get('recommended_insecticide_pesticide', 'Not available'),
-            'alternative_predictions': alternative_predictions
-        }
+        print(f"Disease: {response_table.class_key(prediction)}")
+        print(f"Confidence: {float(np.max(prediction)) * 100:.2f}%")
         
         print("✓ Prediction successful\n")
-        return jsonify(response)
+        extra = {'stage': stage} if cascade is not None else None
+        return json_response(response_table.render_json(prediction, language, extra=extra))
+    
+    except ValueError as ve:
+        print(f"❌ Value Error: {str(ve)}\n")
+        return jsonify({'error': str(ve)}), 400
+    except QueueFullError as qe:
+        print(f"❌ Busy: {str(qe)}\n")
+        return jsonify({'error': 'Server busy, please retry shortly'}), 503
+    except Exception as e:
+        print(f"❌ Error: {str(e)}\n")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+@require_ready
+def predict_disease_batch():
+    """Predict many images in one request (multipart 'images' list or 'archive')"""
+    try:
+        language = resolve_language(request.form.get('language', 'en'))
+        
+        sources, close_sources = collect_batch_sources()
+        streaming = False
+        try:
+            if not sources:
+                return jsonify({'error': 'No images provided'}), 400
+            if len(sources) > BULK_MAX_IMAGES:
+                return jsonify({'error': f'Too many images (max {BULK_MAX_IMAGES})'}), 400
+            
+            print(f"\nReceived batch of {len(sources)} images")
+            
+            stream = request.args.get('stream')
+            if stream is None:
+                stream = len(sources) > BULK_STREAM_THRESHOLD
+            else:
+                stream = stream.lower() in ('1', 'true', 'yes')
+            
+            if not stream:
+                # One JSON document; the images still run BATCH_MAX_SIZE at a time
+                # and only the rendered results are buffered
+                results = []
+                for chunk in batch_chunks(sources):
+                    results.extend(predict_chunk(chunk, language))
+                print(f"✓ Batch prediction successful ({len(results)} images)\n")
+                return json_response(
+                    '{"success": true, "count": %d, "results": [%s]}' % (len(results), ', '.join(results))
+                )
+            
+            # Large batch: NDJSON, one line per image, BATCH_MAX_SIZE images at a time
+            def generate():
+                for chunk in batch_chunks(sources):
+                    try:
+                        results = predict_chunk(chunk, language)
+                    except Exception as e:
+                        # Headers are already sent, so report the failure per image
+                        print(f"❌ Error in batch chunk: {str(e)}")
+                        results = [to_json({'filename': filename, 'success': False, 'error': str(e)})
+                                   for filename, _ in chunk]
+                    for result in results:
+                        yield result + '\n'
+                print(f"✓ Streamed batch prediction ({len(sources)} images)\n")
+            
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            # The spooled archive lives until the last line has been sent
+            response.call_on_close(close_sources)
+            streaming = True
+            return response
+        finally:
+            if not streaming:
+                close_sources()
     
     except ValueError as ve:
         print(f"❌ Value Error: {str(ve)}\n")
         return jsonify({'error': str(ve)}), 400
+    except (zipfile.BadZipFile, tarfile.TarError) as ae:
+        print(f"❌ Archive Error: {str(ae)}\n")
+        return jsonify({'error': f'Could not read archive: {str(ae)}'}), 400
+    except QueueFullError as qe:
+        print(f"❌ Busy: {str(qe)}\n")
+        return jsonify({'error': 'Server busy, please retry shortly'}), 503
     except Exception as e:
         print(f"❌ Error: {str(e)}\n")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/health', methods=['GET'])
 def health_check():
+    if not is_ready():
+        return jsonify({
+            'status': startup['status'],
+            'model_loaded': False,
+            'startup': startup_report()
+        }), 503
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None,
-        'num_classes': len(class_indices)
+        'model_loaded': engine is not None,
+        'backend': engine.name,
+        'num_classes': len(class_indices),
+        'batching': batcher.stats(),
+        'cascade': cascade.stats() if cascade is not None else None,
+        'cache': prediction_cache.stats()
     })
 
+@app.route('/livez', methods=['GET'])
+def liveness():
+    """The process is up and serving HTTP; fails only if loading gave up"""
+    report = startup_report()
+    return jsonify(report), 500 if report['status'] == 'failed' else 200
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    """200 once the model is loaded and warmed up, 503 (with progress) before that"""
+    report = startup_report()
+    return jsonify(report), 200 if report['status'] == 'ready' else 503
+
 @app.route('/classes', methods=['GET'])
+@require_ready
 def get_classes():
     """Return all available disease classes"""
-    classes_list = [key.replace('___', ' - ').replace('_', ' ') for key in class_indices.keys()]
-    return jsonify({
-        'classes': sorted(classes_list),
-        'count': len(classes_list)
-    })
+    return json_response(CLASSES_BODY, CLASSES_ETAG)
+
+# Load the model in the background so the server binds immediately.
+# serve.py sets MODEL_LOAD_MODE=manual and drives preload()/load_resources() itself
+if os.getenv('MODEL_LOAD_MODE', 'background') == 'background':
+    start_background_loading()
 
 if __name__ == '__main__':
     print("\n" + "="*60)
-    print("KrishiMitra Backend API Ready!")
-    print("="*60)
-    print(f"Model classes: {len(class_indices)}")
-    print(f"Diseases in database: {len(disease_info)}")
+    print("KrishiMitra Backend API Starting (model loads in background)")
     print("="*60)
     print("\nAPI Endpoints:")
     print("  GET  /          - API info")
     print("  POST /predict   - Predict disease from image")
+    print("  POST /predict/batch - Predict many images (multipart list or zip/tar)")
     print("  GET  /health    - Health check")
+    print("  GET  /livez     - Liveness (process up)")
+    print("  GET  /readyz    - Readiness (model loaded, with load progress)")
     print("  GET  /classes   - List all classes")
     print("="*60 + "\n")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
\ No newline at end of file
@@ -0,0 +1,2 @@
+# test_api.py is a manual script that posts to a running server on import
+collect_ignore = ['test_api.py']
@@ -0,0 +1,356 @@
+"""Inference backends for the crop disease model.
+
+Every backend exposes the same plain infer(batch) -> probs call on a
+(N, H, W, 3) float32 batch, so the API can serve the Keras model, a TFLite
+flatbuffer or an ONNX graph depending on config. Runtimes are imported
+lazily: a pod serving TFLite or ONNX never imports TensorFlow unless
+tflite_runtime is missing.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+# Exported model artifacts: format -> (backend that serves it, suffix after
+# models/crop_disease_model). export_model.py writes all but 'h5'.
+MODEL_FORMATS = {
+    'h5': ('tensorflow', '.h5'),
+    'keras': ('tensorflow', '.keras'),
+    'savedmodel': ('tensorflow', '_savedmodel'),
+    'weights': ('tensorflow', '.weights'),
+    'tflite': ('tflite', '.tflite'),
+    'onnx': ('onnx', '.onnx'),
+}
+
+# Formats each backend looks for by default, fastest-loading first
+BACKEND_FORMATS = {
+    'tensorflow': ['weights', 'keras', 'savedmodel', 'h5'],
+    'tflite': ['tflite'],
+    'onnx': ['onnx'],
+}
+
+# Every model has a <stem>.meta.json next to it, shared by all of its exported
+# formats, recording at least its square input size. Models without one take
+# the input size of their own input layer, or DEFAULT_INPUT_SIZE if that isn't static
+METADATA_SUFFIX = '.meta.json'
+DEFAULT_INPUT_SIZE = 224
+
+# Flat weights format: architecture JSON + one raw blob of all weights, each
+# array 64-byte aligned so it can be viewed straight out of a memory map
+WEIGHTS_ALIGNMENT = 64
+WEIGHTS_ARCHITECTURE = 'architecture.json'
+WEIGHTS_MANIFEST = 'manifest.json'
+WEIGHTS_BLOB = 'weights.bin'
+
+
+def save_mmap_model(model, output_dir):
+    """Write `model` in the flat weights format (see load_mmap_model)"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    offset = 0
+    blob_path = os.path.join(output_dir, WEIGHTS_BLOB)
+
+    with open(blob_path + '.tmp', 'wb') as f:
+        for weight in model.weights:
+            array = np.ascontiguousarray(weight.numpy())
+            padding = (-offset) % WEIGHTS_ALIGNMENT
+            f.write(b'\0' * padding)
+            offset += padding
+            f.write(array.tobytes())
+            manifest.append({
+                'name': weight.name,
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': offset,
+            })
+            offset += array.nbytes
+    os.replace(blob_path + '.tmp', blob_path)
+
+    with open(os.path.join(output_dir, WEIGHTS_ARCHITECTURE), 'w') as f:
+        f.write(model.to_json())
+    with open(os.path.join(output_dir, WEIGHTS_MANIFEST), 'w') as f:
+        json.dump({'weights': manifest, 'size': offset}, f)
+
+
+def map_weights(model_dir):
+    """Memory-map the weights blob and return read-only array views in model.weights order.
+
+    The views are backed by the OS page cache, so several processes mapping
+    the same file share one copy of the bytes.
+    """
+    with open(os.path.join(model_dir, WEIGHTS_MANIFEST)) as f:
+        manifest = json.load(f)
+    blob = np.memmap(os.path.join(model_dir, WEIGHTS_BLOB), dtype=np.uint8, mode='r')
+    views = []
+    for entry in manifest['weights']:
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        views.append(np.frombuffer(blob, dtype=dtype, count=count, offset=entry['offset']).reshape(entry['shape']))
+    return views
+
+
+def load_mmap_model(model_dir, weights=None):
+    """Rebuild a Keras model from the flat weights format without touching HDF5.
+
+    `weights` may be views already returned by map_weights().
+    """
+    import tensorflow as tf
+
+    with open(os.path.join(model_dir, WEIGHTS_ARCHITECTURE)) as f:
+        model = tf.keras.models.model_from_json(f.read())
+    model.set_weights(weights if weights is not None else map_weights(model_dir))
+    return model
+
+
+def metadata_path(path):
+    """<stem>.meta.json for a model artifact of any format"""
+    path = path.rstrip(os.sep)
+    for _, suffix in MODEL_FORMATS.values():
+        if path.endswith(suffix):
+            return path[:-len(suffix)] + METADATA_SUFFIX
+    return os.path.splitext(path)[0] + METADATA_SUFFIX
+
+
+def read_metadata(path):
+    """Metadata of the model at `path`, or {} if it has none"""
+    try:
+        with open(metadata_path(path), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_metadata(path, metadata):
+    """Record `metadata` (at least 'input_size') for the model at `path` and its exports"""
+    target = metadata_path(path)
+    with open(target + '.tmp', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(target + '.tmp', target)
+
+
+def model_input_size(path):
+    """Square input size recorded in the metadata of the model at `path`, or None if it has none.
+
+    With None, load_backend() takes the size from the loaded model itself.
+    """
+    input_size = read_metadata(path).get('input_size')
+    return int(input_size) if input_size is not None else None
+
+
+def check_input_size(input_size, model_size):
+    """`input_size`, or the model's own when None; a static model size must agree with it"""
+    model_size = model_size if isinstance(model_size, int) and model_size > 0 else None
+    if input_size is None:
+        return model_size or DEFAULT_INPUT_SIZE
+    if model_size is not None and model_size != input_size:
+        raise ValueError(f"model takes {model_size}x{model_size} inputs, not {input_size}x{input_size}; "
+                         f"check its {METADATA_SUFFIX}")
+    return input_size
+
+
+def is_mmap_model(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, WEIGHTS_MANIFEST))
+
+
+def load_keras_model(path):
+    """Load any TensorFlow-served format: flat weights dir, .keras, SavedModel or .h5"""
+    if is_mmap_model(path):
+        return load_mmap_model(path)
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
+
+
+class InferenceBackend:
+    """Common interface: infer(batch) -> probs, plus warm-up bookkeeping"""
+
+    name = 'base'
+
+    def __init__(self, input_size=DEFAULT_INPUT_SIZE):
+        self.input_size = input_size
+        self.warmup_timings = {}
+
+    def infer(self, batch):
+        """Run a (N, H, W, 3) batch and return (N, num_classes) probabilities"""
+        raise NotImplementedError
+
+    def warmup(self, batch_sizes=(1, 2, 4, 8, 16)):
+        """Run each batch size once so the first request doesn't pay for graph setup.
+
+        Returns {batch_size: seconds} for each warm-up call.
+        """
+        for n in batch_sizes:
+            dummy = np.zeros((n, self.input_size, self.input_size, 3), dtype=np.float32)
+            start = time.perf_counter()
+            self.infer(dummy)
+            self.warmup_timings[n] = time.perf_counter() - start
+        return dict(self.warmup_timings)
+
+
+class TensorFlowBackend(InferenceBackend):
+    """Keras model traced into a tf.function with a fixed (None, H, W, 3) float32 signature.
+
+    `model.predict()` sets up a data adapter and runs the full Keras predict
+    loop on every call; the traced function reuses one graph for every
+    batch size.
+    """
+
+    name = 'tensorflow'
+
+    def __init__(self, model, input_size=None, num_threads=None, inter_op_threads=None):
+        import tensorflow as tf
+        self._tf = tf
+        configure_tensorflow_threads(num_threads, inter_op_threads)
+
+        if isinstance(model, str):
+            model = load_keras_model(model)
+        self.model = model
+        input_size = check_input_size(input_size, model.input_shape[1])
+        super().__init__(input_size)
+
+        self._forward = tf.function(
+            self._call_model,
+            input_signature=[tf.TensorSpec([None, input_size, input_size, 3], tf.float32)]
+        )
+
+    def _call_model(self, images):
+        return self.model(images, training=False)
+
+    def infer(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self._forward(self._tf.convert_to_tensor(batch)).numpy()
+
+
+def configure_tensorflow_threads(intra_op=None, inter_op=None):
+    """Pin TensorFlow's thread pools; only possible before the runtime is initialised"""
+    import tensorflow as tf
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        print(f"⚠️  Warning: could not set TensorFlow thread counts: {str(e)}")
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite flatbuffer run through tflite_runtime (or tf.lite as a fallback)"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, input_size=None, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        super().__init__(check_input_size(input_size, int(input_details['shape'][1])))
+        self._input_index = input_details['index']
+        self._output_index = output_details['index']
+        self._batch_size = None
+
+        # Full-integer models (quantize_model.py) take and return uint8/int8
+        # tensors; (scale, zero_point) map them to and from float32
+        self._input_dtype = input_details['dtype']
+        self._input_quant = input_details['quantization']
+        self._output_dtype = output_details['dtype']
+        self._output_quant = output_details['quantization']
+        self.quantized = self._input_dtype != np.float32
+
+    def _resize(self, n):
+        """The interpreter has static shapes; reallocate only when the batch size changes"""
+        if n != self._batch_size:
+            self.interpreter.resize_tensor_input(
+                self._input_index, [n, self.input_size, self.input_size, 3]
+            )
+            self.interpreter.allocate_tensors()
+            self._batch_size = n
+
+    def infer(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if self._input_dtype != np.float32:
+            scale, zero_point = self._input_quant
+            info = np.iinfo(self._input_dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self._input_dtype)
+
+        self._resize(len(batch))
+        self.interpreter.set_tensor(self._input_index, batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output_index)
+
+        if self._output_dtype != np.float32:
+            scale, zero_point = self._output_quant
+            return (output.astype(np.float32) - zero_point) * scale
+        return output.copy()
+
+
+class ONNXBackend(InferenceBackend):
+    """ONNX graph run on the ONNX Runtime CPU execution provider"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, input_size=None, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        model_input = self.session.get_inputs()[0]
+        super().__init__(check_input_size(input_size, model_input.shape[1]))
+        self._input_name = model_input.name
+
+    def infer(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+BACKENDS = {
+    'tensorflow': TensorFlowBackend,
+    'tflite': TFLiteBackend,
+    'onnx': ONNXBackend,
+}
+
+
+def model_path(models_dir, fmt, stem='crop_disease_model'):
+    """Path of one exported model format"""
+    return os.path.join(models_dir, stem + MODEL_FORMATS[fmt][1])
+
+
+def backend_for_path(path):
+    """Backend that serves the model artifact at `path`, judged by its suffix"""
+    for backend, suffix in MODEL_FORMATS.values():
+        if path.rstrip(os.sep).endswith(suffix):
+            return backend
+    raise ValueError(f"Can't tell the model format of '{path}'")
+
+
+def default_model_path(models_dir, backend, stem='crop_disease_model'):
+    """Fastest-loading model artifact present for `backend` (the last candidate if none exist)"""
+    if backend not in BACKEND_FORMATS:
+        raise ValueError(f"Unknown inference backend '{backend}' (choose from {', '.join(BACKEND_FORMATS)})")
+    candidates = [model_path(models_dir, fmt, stem) for fmt in BACKEND_FORMATS[backend]]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return candidates[-1]
+
+
+def load_backend(backend, model_path, input_size=None, num_threads=None, inter_op_threads=None):
+    """Create the named backend ('tensorflow', 'tflite' or 'onnx') for `model_path`.
+
+    `input_size` defaults to the model's own. `num_threads` caps the runtime's intra-op threads; `inter_op_threads`
+    only applies to TensorFlow.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (choose from {', '.join(BACKENDS)})")
+    if backend == 'tensorflow':
+        return TensorFlowBackend(model_path, input_size=input_size, num_threads=num_threads,
+                                 inter_op_threads=inter_op_threads)
+    return BACKENDS[backend](model_path, input_size=input_size, num_threads=num_threads)
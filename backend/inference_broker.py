@@ -0,0 +1,233 @@
+"""Shared-memory inference broker.
+
+One or two broker processes own the model; any number of lightweight HTTP
+workers hand them preprocessed images through a ring of slots in
+multiprocessing.shared_memory:
+
+    HTTP worker                          broker process
+    -----------                          --------------
+    claim a free slot
+    write 224x224x3 float32 into it
+    put the slot index on `ready`  --->  collect slot indices for up to the
+                                         batching window / max batch size
+                                         run one forward pass
+    wait on the slot's semaphore   <---  write probabilities into the slot
+    read probabilities, free slot
+
+A request claims all the slots of a chunk at once, so requests never hold
+part of the ring while waiting for the rest. A request that times out
+marks its outstanding slots abandoned, and the broker frees them when it
+gets to them instead of signalling a waiter that has gone.
+
+Only small integers (slot indices) cross process boundaries through a
+queue; image tensors and probabilities stay in shared memory and are never
+pickled. All primitives are created in the serve.py master before it forks,
+so brokers and workers inherit them.
+"""
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Slot states
+FREE = 0
+CLAIMED = 1
+ABANDONED = 2
+
+# Slot status after the broker is done with it
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+class SharedRing:
+    """Input/output slots in one shared memory block, plus the primitives guarding them"""
+
+    def __init__(self, num_slots, num_classes, input_size=224, ctx=None):
+        ctx = ctx or multiprocessing.get_context('fork')
+        self.num_slots = num_slots
+        self.num_classes = num_classes
+        self.input_size = input_size
+
+        input_shape = (num_slots, input_size, input_size, 3)
+        output_shape = (num_slots, num_classes)
+        input_bytes = int(np.prod(input_shape)) * 4
+        output_bytes = int(np.prod(output_shape)) * 4
+        # inputs | outputs | counters (batches, rows) | slot state | slot status
+        counters_offset = -(-(input_bytes + output_bytes) // 8) * 8
+        state_offset = counters_offset + 16
+        self.shm = shared_memory.SharedMemory(create=True, size=state_offset + 2 * num_slots)
+
+        buf = self.shm.buf
+        self.inputs = np.ndarray(input_shape, dtype=np.float32, buffer=buf, offset=0)
+        self.outputs = np.ndarray(output_shape, dtype=np.float32, buffer=buf, offset=input_bytes)
+        self.counters = np.ndarray((2,), dtype=np.int64, buffer=buf, offset=counters_offset)
+        self.state = np.ndarray((num_slots,), dtype=np.uint8, buffer=buf, offset=state_offset)
+        self.status = np.ndarray((num_slots,), dtype=np.uint8, buffer=buf, offset=state_offset + num_slots)
+        self.counters[:] = 0
+        self.state[:] = FREE
+
+        self.available = ctx.Semaphore(num_slots)
+        self.lock = ctx.Lock()
+        # Serialises multi-slot claims, so two requests never each hold half of what they need
+        self.claim_lock = ctx.Lock()
+        self.ready = ctx.Queue()
+        self.done = [ctx.Semaphore(0) for _ in range(num_slots)]
+
+    @property
+    def size_mb(self):
+        return self.shm.size / (1024 * 1024)
+
+    def close(self, unlink=False):
+        # Drop the numpy views first; the buffer can't be released while they exist
+        self.inputs = self.outputs = self.counters = self.state = self.status = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class BrokerClient:
+    """InferenceBackend-compatible client used by HTTP workers instead of a local model.
+
+    Thread-safe: every Flask thread can call infer() directly, and batching
+    across all workers happens in the broker.
+    """
+
+    name = 'broker'
+    thread_safe = True
+
+    def __init__(self, ring, timeout=60.0):
+        self.ring = ring
+        self.input_size = ring.input_size
+        self.timeout = timeout
+        self.warmup_timings = {}
+        # Never claim more than a quarter of the ring at once, so large batches from
+        # one request can't starve the other workers
+        self.max_claim = max(1, ring.num_slots // 4)
+
+    def warmup(self, batch_sizes=()):
+        """The broker warms up the model itself; nothing to do on the worker side"""
+        return {}
+
+    def stats(self):
+        """Ring occupancy and broker-side batching counters for /health"""
+        with self.ring.lock:
+            in_use = int(np.count_nonzero(self.ring.state != FREE))
+            batches, rows = (int(v) for v in self.ring.counters)
+        return {
+            'slots': self.ring.num_slots,
+            'slots_in_use': in_use,
+            'broker_batches': batches,
+            'broker_avg_batch_size': round(rows / batches, 2) if batches else 0.0,
+        }
+
+    def _claim(self, count):
+        """Claim `count` free slots at once, or none of them"""
+        deadline = time.monotonic() + self.timeout
+        if not self.ring.claim_lock.acquire(timeout=self.timeout):
+            raise TimeoutError('No free inference slot (broker overloaded)')
+        acquired = 0
+        try:
+            while acquired < count:
+                if not self.ring.available.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                    raise TimeoutError('No free inference slot (broker overloaded)')
+                acquired += 1
+        except TimeoutError:
+            for _ in range(acquired):
+                self.ring.available.release()
+            raise
+        finally:
+            self.ring.claim_lock.release()
+        with self.ring.lock:
+            slots = [int(slot) for slot in np.flatnonzero(self.ring.state == FREE)[:count]]
+            self.ring.state[slots] = CLAIMED
+        return slots
+
+    def _release(self, slot):
+        with self.ring.lock:
+            self.ring.state[slot] = FREE
+        self.ring.available.release()
+
+    def _abandon(self, slot):
+        """Give back a slot the broker has not answered yet; the broker frees it when it does"""
+        with self.ring.lock:
+            if not self.ring.done[slot].acquire(False):
+                self.ring.state[slot] = ABANDONED
+                return
+        # Answered in the meantime
+        self._release(slot)
+
+    def infer(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        probs = np.empty((len(batch), self.ring.num_classes), dtype=np.float32)
+        for start in range(0, len(batch), self.max_claim):
+            self._infer_chunk(batch[start:start + self.max_claim], probs[start:start + self.max_claim])
+        return probs
+
+    def _infer_chunk(self, chunk, out):
+        slots = self._claim(len(chunk))
+        submitted = 0
+        finished = set()
+        try:
+            for slot, row in zip(slots, chunk):
+                self.ring.inputs[slot] = row
+                self.ring.ready.put(slot)
+                submitted += 1
+
+            deadline = time.monotonic() + self.timeout
+            for i, slot in enumerate(slots):
+                if not self.ring.done[slot].acquire(timeout=max(deadline - time.monotonic(), 0)):
+                    raise TimeoutError('Inference broker did not answer in time')
+                finished.add(slot)
+                if self.ring.status[slot] != STATUS_OK:
+                    raise RuntimeError('Inference broker failed to run this batch')
+                out[i] = self.ring.outputs[slot]
+        finally:
+            for i, slot in enumerate(slots):
+                if i < submitted and slot not in finished:
+                    self._abandon(slot)
+                else:
+                    self._release(slot)
+
+
+def run_broker(ring, backend, window_ms, max_batch_size):
+    """Broker loop: gather ready slots into batches and run them through `backend`.
+
+    Never returns; the process is terminated by serve.py.
+    """
+    window = window_ms / 1000.0
+    while True:
+        slots = [ring.ready.get()]
+        deadline = time.perf_counter() + window
+        while len(slots) < max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                slots.append(ring.ready.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            probs = backend.infer(ring.inputs[slots])
+            ring.outputs[slots] = probs
+            ring.status[slots] = STATUS_OK
+        except Exception as e:
+            print(f"❌ Broker error: {str(e)}")
+            ring.status[slots] = STATUS_ERROR
+
+        with ring.lock:
+            ring.counters[0] += 1
+            ring.counters[1] += len(slots)
+
+        # Slots whose request timed out are freed here; the others are handed back
+        for slot in slots:
+            with ring.lock:
+                abandoned = ring.state[slot] == ABANDONED
+                if abandoned:
+                    ring.state[slot] = FREE
+                else:
+                    ring.done[slot].release()
+            if abandoned:
+                ring.available.release()
@@ -0,0 +1,105 @@
+"""Bounded LRU cache of model outputs keyed by image content.
+
+Re-submitted photos (retries on flaky connections, the same picture shared
+by several farmers) skip preprocessing and inference entirely. The cache
+stores the probability vector rather than a rendered response, so a hit
+can be served in any language.
+
+Keys are built from the model version plus either
+  - 'exact': SHA-256 of the raw upload bytes, or
+  - 'perceptual': a 64-bit difference hash (dHash) of the decoded image,
+    which also matches re-encoded or resized copies of the same photo.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+CACHE_MODES = ('exact', 'perceptual')
+
+
+def perceptual_hash(image_bytes, hash_size=8):
+    """64-bit dHash: compares neighbouring pixels of a 9x8 grayscale thumbnail"""
+    img = Image.open(io.BytesIO(image_bytes))
+    # JPEG draft mode decodes at 1/8 scale, which is plenty for a 9x8 thumbnail
+    img.draft('L', (hash_size * 8, hash_size * 8))
+    img = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(img, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return '%016x' % int(''.join('1' if b else '0' for b in bits), 2)
+
+
+class PredictionCache:
+    """Thread-safe LRU map from image key to a probability vector"""
+
+    def __init__(self, max_entries=4096, mode='exact', model_version=''):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}' (choose from {', '.join(CACHE_MODES)})")
+        self.max_entries = max_entries
+        self.mode = mode
+        self.model_version = model_version
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key_for(self, image_bytes):
+        """Cache key for an upload; raises ValueError if perceptual hashing can't decode it"""
+        if self.mode == 'perceptual':
+            try:
+                digest = perceptual_hash(image_bytes)
+            except Exception as e:
+                raise ValueError(f"Error processing image: {str(e)}")
+        else:
+            digest = hashlib.sha256(image_bytes).hexdigest()
+        return f'{self.model_version}:{self.mode}:{digest}'
+
+    def get(self, key):
+        """Return the cached probabilities for `key`, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            probs = self._entries.get(key)
+            if probs is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return probs
+
+    def put(self, key, probs):
+        if not self.enabled:
+            return
+        probs = np.array(probs, dtype=np.float32)
+        probs.setflags(write=False)
+        with self._lock:
+            self._entries[key] = probs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Return a snapshot of cache counters for /health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'mode': self.mode,
+                'model_version': self.model_version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
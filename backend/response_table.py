@@ -0,0 +1,116 @@
+"""Precompiled /predict responses.
+
+At startup disease_info.json and class_indices.json are compiled into a
+dense table indexed by (class_idx, language). Each cell holds the static
+part of a /predict response, already serialized to JSON, so handling a
+request only has to format the confidence numbers around it.
+"""
+import hashlib
+import json
+
+import numpy as np
+
+
+def display_name(class_key):
+    """'Tomato___Late_blight' -> 'Tomato - Late blight'"""
+    return class_key.replace('___', ' - ').replace('_', ' ')
+
+
+def resolve_disease_data(class_key, language, disease_info):
+    """Translated disease details for one class, with the English and generic fallbacks"""
+    if class_key in disease_info:
+        disease_translations = disease_info[class_key]
+        if language in disease_translations:
+            return disease_translations[language]
+        # Fallback to English if translation not available
+        return disease_translations.get('en', {
+            'name': display_name(class_key),
+            'treatment': 'Translation not available. Consult agricultural expert.',
+            'prevention': 'Standard practices recommended.',
+            'severity': 'unknown'
+        })
+    # Default response if disease info not found
+    return {
+        'name': display_name(class_key),
+        'treatment': 'Consult an agricultural expert for specific treatment recommendations.',
+        'prevention': 'Follow standard crop management practices and monitor plants regularly.',
+        'severity': 'unknown'
+    }
+
+
+def to_json(payload):
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def etag_for(body):
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+class ResponseTable:
+    """Dense (class_idx, language) -> response fragment table"""
+
+    def __init__(self, class_indices, disease_info, languages):
+        self.languages = list(languages)
+        self.language_index = {lang: i for i, lang in enumerate(self.languages)}
+        self.num_classes = len(class_indices)
+
+        self.class_keys = [None] * self.num_classes
+        for key, idx in class_indices.items():
+            self.class_keys[idx] = key
+
+        self.display_names = [display_name(key) for key in self.class_keys]
+        # JSON string literals of each display name, for the alternatives list
+        self.display_name_json = [to_json(name) for name in self.display_names]
+
+        self.fragments = []
+        self.fragment_json = []
+        for key in self.class_keys:
+            row, row_json = [], []
+            for language in self.languages:
+                disease_data = resolve_disease_data(key, language, disease_info)
+                fragment = {
+                    'disease': disease_data['name'],
+                    'severity': disease_data.get('severity', 'unknown'),
+                    'treatment': disease_data['treatment'],
+                    'prevention': disease_data['prevention'],
+                    'organic_treatment': disease_data.get('organic_treatment', 'Not available'),
+                    'recommended_insecticide_pesticide': disease_data.get('recommended_insecticide_pesticide', 'Not available'),
+                }
+                row.append(fragment)
+                # Without the surrounding braces, ready to splice into a response
+                row_json.append(to_json(fragment)[1:-1])
+            self.fragments.append(row)
+            self.fragment_json.append(row_json)
+
+    def top_classes(self, prediction, k=3):
+        """Indices of the k most likely classes, best first"""
+        k = min(k, len(prediction))
+        top = np.argpartition(prediction, -k)[-k:]
+        return top[np.argsort(prediction[top])[::-1]]
+
+    def render_json(self, prediction, language, extra=None):
+        """Serialized /predict response for one row of model output.
+
+        `extra` is an optional dict of additional top-level fields.
+        """
+        top = self.top_classes(prediction)
+        class_idx = int(top[0])
+        confidence = float(prediction[class_idx])
+
+        alternatives = ', '.join(
+            '{"disease": %s, "confidence": "%.1f%%"}' % (self.display_name_json[i], float(prediction[i]) * 100)
+            for i in top[1:]
+        )
+        extra_json = to_json(extra)[1:-1] + ', ' if extra else ''
+        lang_idx = self.language_index.get(language, self.language_index['en'])
+
+        return '{"success": true, "confidence": "%.2f%%", "confidence_score": %s, %s"alternative_predictions": [%s], %s}' % (
+            confidence * 100,
+            json.dumps(confidence),
+            extra_json,
+            alternatives,
+            self.fragment_json[class_idx][lang_idx],
+        )
+
+    def class_key(self, prediction):
+        return self.class_keys[int(np.argmax(prediction))]
@@ -0,0 +1,249 @@
+"""Pre-fork production server for the crop disease API.
+
+The master process runs the fork-safe part of startup once: file checks,
+class indices, disease info, the compiled response table and, for the flat
+`weights` format, the memory-mapped weights. It then opens the listening
+socket and forks N workers, which inherit all of that copy-on-write.
+
+Each worker then creates its own inference runtime with pinned intra/inter-op
+thread counts (so N workers don't oversubscribe the cores), warms it up and
+starts accepting from the shared socket. The runtime is deliberately created
+after the fork: TensorFlow, TFLite and ONNX Runtime all start thread pools
+that do not survive fork().
+
+With --brokers K the model is instead loaded by K inference broker
+processes (see inference_broker.py). The HTTP workers then hold no model or
+inference runtime at all: they decode and preprocess uploads, write the
+tensors into a shared-memory ring and read the probabilities back, while the
+brokers batch requests from every worker together. This lets many cheap
+HTTP workers sit in front of one or two large batched model processes.
+
+Usage:
+    python backend/serve.py [--workers 4] [--intra-op-threads 2] [--port 5000]
+    python backend/serve.py --workers 8 --brokers 1 [--broker-slots 64]
+
+Environment equivalents: SERVE_WORKERS, SERVE_BROKERS, BROKER_SLOTS,
+INFERENCE_THREADS, INTER_OP_THREADS, PORT.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+# Worker exit status when the model can't be loaded; such workers are not restarted
+LOAD_FAILED = 3
+
+# How long the master waits for the brokers to load and warm up the model
+BROKER_START_TIMEOUT = 600
+
+
+def parse_args():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVE_WORKERS', str(cpus))))
+    parser.add_argument('--brokers', type=int, default=int(os.getenv('SERVE_BROKERS', '0')),
+                        help='inference broker processes owning the model (default 0: every worker loads it)')
+    parser.add_argument('--broker-slots', type=int, default=int(os.getenv('BROKER_SLOTS', '64')),
+                        help='images the shared-memory ring can hold in flight (default 64)')
+    parser.add_argument('--intra-op-threads', type=int, default=int(os.getenv('INFERENCE_THREADS', '0')),
+                        help='threads per model process for one op (default: cores / model processes)')
+    parser.add_argument('--inter-op-threads', type=int, default=int(os.getenv('INTER_OP_THREADS', '1')),
+                        help='ops run in parallel per model process (default 1)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5000')))
+    parser.add_argument('--backlog', type=int, default=256)
+    args = parser.parse_args()
+
+    args.workers = max(1, args.workers)
+    args.brokers = max(0, args.brokers)
+    if not args.intra_op_threads:
+        args.intra_op_threads = max(1, cpus // (args.brokers or args.workers))
+    return args
+
+
+def open_listener(host, port, backlog):
+    """One listening socket shared by every worker; the kernel spreads accepts between them"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_broker(index, ring, started, args, cnn_app):
+    """Child process: load the model once and serve inference out of the shared ring"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    import inference_broker
+
+    print(f"[broker {index}] pid {os.getpid()}: loading model "
+          f"({args.intra_op_threads} intra-op / {args.inter_op_threads} inter-op threads)")
+    try:
+        loaded = cnn_app.load_model_backend()
+        cnn_app.warm_up(loaded)
+    except Exception as e:
+        print(f"❌ [broker {index}] could not load the model: {str(e)}")
+        os._exit(LOAD_FAILED)
+
+    print(f"[broker {index}] ready")
+    started.release()
+    inference_broker.run_broker(ring, loaded, cnn_app.BATCH_WINDOW_MS, cnn_app.BATCH_MAX_SIZE)
+
+
+def run_worker(index, sock, args, cnn_app, ring=None):
+    """Child process: build the inference runtime (or broker client), then serve until terminated"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    from werkzeug.serving import make_server
+
+    if ring is not None:
+        import inference_broker
+        cnn_app.broker_client = inference_broker.BrokerClient(ring)
+        print(f"[worker {index}] pid {os.getpid()}: using the inference broker")
+    else:
+        print(f"[worker {index}] pid {os.getpid()}: loading model "
+              f"({args.intra_op_threads} intra-op / {args.inter_op_threads} inter-op threads)")
+    if not cnn_app.load_resources():
+        os._exit(LOAD_FAILED)
+
+    server = make_server(args.host, args.port, cnn_app.app, threaded=True, fd=sock.fileno())
+    print(f"[worker {index}] ready")
+    server.serve_forever()
+
+
+def main():
+    args = parse_args()
+
+    # Must be set before cnn_app is imported: it reads them at import time
+    os.environ['MODEL_LOAD_MODE'] = 'manual'
+    os.environ['INFERENCE_THREADS'] = str(args.intra_op_threads)
+    os.environ['INTER_OP_THREADS'] = str(args.inter_op_threads)
+    os.environ.setdefault('OMP_NUM_THREADS', str(args.intra_op_threads))
+
+    import cnn_app
+
+    print("\n" + "="*60)
+    print(f"KrishiMitra pre-fork server: {args.workers} workers on {args.host}:{args.port}")
+    if args.brokers:
+        print(f"Inference brokers: {args.brokers} ({args.broker_slots} shared-memory slots)")
+    print("="*60)
+    try:
+        cnn_app.preload()
+    except Exception as e:
+        print(f"❌ Preload failed: {str(e)}")
+        sys.exit(1)
+
+    ring = None
+    if args.brokers:
+        import multiprocessing
+        from inference_broker import SharedRing
+        from inference import DEFAULT_INPUT_SIZE, metadata_path
+        if cnn_app.MODEL_INPUT_SIZE is None:
+            # The ring is sized before any process loads the model; the brokers
+            # check the model against it and refuse to start if it differs
+            print(f"⚠️  No {metadata_path(cnn_app.MODEL_PATH)}: assuming {DEFAULT_INPUT_SIZE}x{DEFAULT_INPUT_SIZE} inputs")
+            cnn_app.MODEL_INPUT_SIZE = DEFAULT_INPUT_SIZE
+        ring = SharedRing(args.broker_slots, len(cnn_app.class_indices), cnn_app.MODEL_INPUT_SIZE)
+        print(f"✓ Shared-memory ring: {ring.size_mb:.1f} MB")
+
+    sock = open_listener(args.host, args.port, args.backlog)
+    children = {}
+    brokers = {}
+    stopping = False
+    failed = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(index, sock, args, cnn_app, ring)
+            finally:
+                os._exit(0)
+        children[pid] = index
+
+    def spawn_broker(index, started):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                sock.close()
+                run_broker(index, ring, started, args, cnn_app)
+            finally:
+                os._exit(0)
+        brokers[pid] = index
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children) + list(brokers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    if ring is not None:
+        # Brokers must be serving before any worker reports ready
+        started = multiprocessing.get_context('fork').Semaphore(0)
+        for index in range(args.brokers):
+            spawn_broker(index, started)
+        waiting = args.brokers
+        deadline = time.time() + BROKER_START_TIMEOUT
+        while waiting and not stopping and time.time() < deadline:
+            if started.acquire(timeout=0.5):
+                waiting -= 1
+                continue
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                print(f"❌ Broker {brokers.pop(pid, '?')} exited during startup (status {status})")
+                break
+        if waiting:
+            shutdown(None, None)
+            for pid in list(brokers):
+                os.waitpid(pid, 0)
+            ring.close(unlink=True)
+            sys.exit(1)
+
+    for index in range(args.workers):
+        spawn(index)
+
+    while children or brokers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid in brokers:
+            index = brokers.pop(pid)
+            if not stopping:
+                # In-flight slots of a dead broker can't be recovered; restart the whole server
+                print(f"❌ Broker {index} (pid {pid}) exited with status {status}; shutting down")
+                failed = True
+                shutdown(None, None)
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == LOAD_FAILED:
+            print(f"❌ Worker {index} could not load the model; not restarting")
+            failed = True
+            continue
+        print(f"⚠️  Worker {index} (pid {pid}) exited with status {status}; restarting")
+        time.sleep(1)
+        spawn(index)
+
+    sock.close()
+    if ring is not None:
+        ring.close(unlink=True)
+    if failed:
+        sys.exit(1)
+    print("✓ All workers stopped")
+
+
+if __name__ == '__main__':
+    main()
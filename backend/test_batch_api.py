@@ -0,0 +1,124 @@
+"""Tests for /predict/batch, served by a fake model through the real app.
+
+Run with: python -m pytest backend/test_batch_api.py
+"""
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# The model is installed by the fixture below, never loaded from disk
+os.environ['MODEL_LOAD_MODE'] = 'manual'
+
+import cnn_app  # noqa: E402
+from response_table import ResponseTable  # noqa: E402
+
+NUM_CLASSES = 5
+INPUT_SIZE = 32
+NUM_IMAGES = cnn_app.BULK_STREAM_THRESHOLD + 8
+
+
+class FakeBackend:
+    """Predicts the class encoded in each image's red channel"""
+    name = 'fake'
+    input_size = INPUT_SIZE
+
+    def infer(self, batch):
+        probs = np.full((len(batch), NUM_CLASSES), 0.01, dtype=np.float32)
+        probs[np.arange(len(batch)), np.rint(batch[:, 0, 0, 0] * 10).astype(int) % NUM_CLASSES] = 0.96
+        return probs
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    model_path = tmp_path / 'model.h5'
+    model_path.write_bytes(b'fake')
+    monkeypatch.setattr(cnn_app, 'MODEL_PATH', str(model_path))
+    monkeypatch.setattr(cnn_app, 'class_indices', {f'Crop___Disease_{i}': i for i in range(NUM_CLASSES)})
+    monkeypatch.setattr(cnn_app, 'response_table',
+                        ResponseTable(cnn_app.class_indices, {}, cnn_app.SUPPORTED_LANGUAGES))
+    monkeypatch.setattr(cnn_app, 'PREDICTION_CACHE_SIZE', 0)
+    monkeypatch.setitem(cnn_app.startup, 'status', 'ready')
+    cnn_app.start_serving(FakeBackend())
+    return cnn_app.app.test_client()
+
+
+def png(i):
+    pixels = np.zeros((48, 48, 3), dtype=np.uint8)
+    pixels[..., 0] = (i % NUM_CLASSES) * 25.5
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def images():
+    return [(f'leaf_{i:03d}.png', png(i)) for i in range(NUM_IMAGES)]
+
+
+def zip_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in images():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def tar_archive():
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in images():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def check_results(results):
+    assert [r['filename'] for r in results] == [name for name, _ in images()]
+    assert all(r['success'] for r in results), [r.get('error') for r in results if not r['success']]
+    assert [r['disease'] for r in results] == [f'Crop - Disease {i % NUM_CLASSES}' for i in range(NUM_IMAGES)]
+
+
+def post(client, data, query=''):
+    return client.post('/predict/batch' + query, data=data, content_type='multipart/form-data')
+
+
+def streamed_lines(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_multipart_upload_is_streamed(client):
+    response = post(client, {'images': [(io.BytesIO(data), name) for name, data in images()]})
+    check_results(streamed_lines(response))
+
+
+@pytest.mark.parametrize('name, archive', [('leaves.zip', zip_archive), ('leaves.tar.gz', tar_archive)])
+def test_archive_upload_is_streamed(client, name, archive):
+    response = post(client, {'archive': (io.BytesIO(archive()), name)})
+    check_results(streamed_lines(response))
+
+
+def test_unstreamed_batch_runs_chunk_by_chunk(client, monkeypatch):
+    batch_sizes = []
+    infer = cnn_app.engine.infer
+    monkeypatch.setattr(cnn_app.batcher, 'predict_fn', lambda batch: batch_sizes.append(len(batch)) or infer(batch))
+
+    response = post(client, {'archive': (io.BytesIO(zip_archive()), 'leaves.zip')}, query='?stream=0')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == NUM_IMAGES
+    check_results(body['results'])
+    assert max(batch_sizes) <= cnn_app.BATCH_MAX_SIZE
+
+
+def test_unsupported_archive_is_rejected(client):
+    response = post(client, {'archive': (io.BytesIO(b'data'), 'leaves.rar')})
+    assert response.status_code == 400
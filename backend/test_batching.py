@@ -0,0 +1,139 @@
+"""Tests for the /predict micro-batching scheduler.
+
+Run with: python -m pytest backend/test_batching.py
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batching import MicroBatcher, QueueFullError
+
+
+class RecordingModel:
+    """Returns each row's first value as its prediction and remembers the batch sizes it saw"""
+
+    def __init__(self, gate=None):
+        self.batch_sizes = []
+        self.gate = gate
+
+    def __call__(self, inputs):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batch_sizes.append(len(inputs))
+        return inputs[:, :1] * 10
+
+
+def rows(*values):
+    return np.array(values, dtype=np.float32).reshape(-1, 1)
+
+
+def submit_together(batcher, requests):
+    """Submit every request from its own thread at once; returns the (predictions, info) results in order"""
+    start = threading.Barrier(len(requests))
+
+    def submit(inputs):
+        start.wait()
+        return batcher.submit(inputs)
+
+    with ThreadPoolExecutor(len(requests)) as pool:
+        return list(pool.map(submit, requests))
+
+
+def test_full_batch_flushes_before_the_window():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, window_ms=10000, max_batch_size=4)
+
+    started = time.perf_counter()
+    results = submit_together(batcher, [rows(i) for i in range(4)])
+
+    assert time.perf_counter() - started < 5
+    assert model.batch_sizes == [4]
+    for i, (predictions, info) in enumerate(results):
+        np.testing.assert_allclose(predictions, rows(i * 10))
+        assert info['batch_size'] == 4
+
+
+def test_window_flushes_a_partial_batch():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, window_ms=50, max_batch_size=16)
+
+    started = time.perf_counter()
+    predictions, info = batcher.submit(rows(1, 2))
+
+    assert time.perf_counter() - started >= 0.045
+    np.testing.assert_allclose(predictions, rows(10, 20))
+    assert info['batch_size'] == 2
+    assert info['queue_wait_ms'] >= 45
+    assert model.batch_sizes == [2]
+
+
+def test_requests_within_one_window_share_a_batch():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, window_ms=500, max_batch_size=16)
+
+    results = submit_together(batcher, [rows(1), rows(2, 3), rows(4)])
+
+    assert model.batch_sizes == [4]
+    expected = [rows(10), rows(20, 30), rows(40)]
+    for (predictions, _), want in zip(results, expected):
+        np.testing.assert_allclose(predictions, want)
+
+
+def test_request_that_does_not_fit_opens_the_next_batch():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, window_ms=200, max_batch_size=4)
+
+    results = submit_together(batcher, [rows(1, 2, 3), rows(4, 5, 6)])
+
+    assert model.batch_sizes == [3, 3]
+    np.testing.assert_allclose(np.concatenate([p for p, _ in results]), rows(10, 20, 30, 40, 50, 60))
+    assert batcher.stats()['batches'] == 2
+
+
+def test_model_error_reaches_every_caller_in_the_batch():
+    def failing(inputs):
+        raise RuntimeError('model exploded')
+
+    batcher = MicroBatcher(failing, window_ms=200, max_batch_size=4)
+    start = threading.Barrier(2)
+
+    def submit(inputs):
+        start.wait()
+        try:
+            batcher.submit(inputs)
+        except RuntimeError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(2) as pool:
+        errors = list(pool.map(submit, [rows(1), rows(2)]))
+    assert errors == ['model exploded', 'model exploded']
+
+    # The scheduler survives and keeps serving
+    batcher.predict_fn = RecordingModel()
+    predictions, _ = batcher.submit(rows(3))
+    np.testing.assert_allclose(predictions, rows(30))
+
+
+def test_full_queue_rejects_requests():
+    gate = threading.Event()
+    batcher = MicroBatcher(RecordingModel(gate), window_ms=0, max_batch_size=1, max_queue_depth=2)
+
+    with ThreadPoolExecutor(4) as pool:
+        # One request blocks the scheduler inside the model, two fill the queue
+        pending = [pool.submit(batcher.submit, rows(i)) for i in range(3)]
+        deadline = time.time() + 5
+        while batcher.stats()['queue_depth'] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        try:
+            batcher.submit(rows(9))
+            raise AssertionError('expected a QueueFullError')
+        except QueueFullError:
+            pass
+        gate.set()
+        for i, future in enumerate(pending):
+            np.testing.assert_allclose(future.result()[0], rows(i * 10))
+
+    assert batcher.stats()['rejected'] == 1
@@ -0,0 +1,120 @@
+"""Tests for two-stage cascade routing.
+
+Run with: python -m pytest backend/test_cascade.py
+"""
+import json
+
+import numpy as np
+
+from cascade import DEFAULT_CONFIG, Cascade, confidence_and_margin, escalation_mask, load_cascade_config
+
+
+class FakeBatcher:
+    """MicroBatcher stand-in: looks up fixed probabilities by each row's id in column 0"""
+
+    def __init__(self, probs_by_id):
+        self.probs_by_id = probs_by_id
+        self.calls = []
+
+    def submit(self, inputs):
+        self.calls.append(inputs[:, 0].astype(int).tolist())
+        probs = np.array([self.probs_by_id[int(i)] for i in inputs[:, 0]], dtype=np.float32)
+        return probs, {'batch_size': len(inputs)}
+
+    def stats(self):
+        return {'requests': len(self.calls)}
+
+
+def inputs(*ids):
+    return np.array(ids, dtype=np.float32).reshape(-1, 1)
+
+
+SMALL = {
+    0: [0.95, 0.03, 0.02],  # confident
+    1: [0.50, 0.45, 0.05],  # unsure: low confidence
+    2: [0.91, 0.09, 0.00],  # confident
+    3: [0.40, 0.30, 0.30],  # unsure
+}
+FULL = {i: [0.0, 0.0, 1.0] for i in SMALL}
+
+
+def test_confidence_and_margin():
+    confidence, margin = confidence_and_margin(np.array([[0.1, 0.7, 0.2], [0.5, 0.5, 0.0]]))
+    np.testing.assert_allclose(confidence, [0.7, 0.5])
+    np.testing.assert_allclose(margin, [0.5, 0.0])
+
+
+def test_escalation_on_confidence_or_margin():
+    probs = np.array([[0.95, 0.05], [0.8, 0.2], [0.55, 0.45]], dtype=np.float32)
+    np.testing.assert_array_equal(escalation_mask(probs, 0.9, 0.0), [False, True, True])
+    np.testing.assert_array_equal(escalation_mask(probs, 0.5, 0.2), [False, False, True])
+
+
+def test_only_unsure_rows_go_to_the_full_model():
+    small, full = FakeBatcher(SMALL), FakeBatcher(FULL)
+    cascade = Cascade(small, full, min_confidence=0.9, min_margin=0.0)
+
+    predictions, stages, info = cascade.submit(inputs(0, 1, 2, 3))
+
+    assert full.calls == [[1, 3]]
+    assert stages == ['small', 'full', 'small', 'full']
+    assert info['escalated'] == 2
+    np.testing.assert_allclose(predictions[[0, 2]], [SMALL[0], SMALL[2]])
+    np.testing.assert_allclose(predictions[[1, 3]], [FULL[1], FULL[3]])
+
+
+def test_confident_batch_never_reaches_the_full_model():
+    small, full = FakeBatcher(SMALL), FakeBatcher(FULL)
+    cascade = Cascade(small, full, min_confidence=0.9, min_margin=0.0)
+
+    predictions, stages, info = cascade.submit(inputs(0, 2))
+
+    assert full.calls == []
+    assert stages == ['small', 'small']
+    assert info['escalated'] == 0
+    np.testing.assert_allclose(predictions, [SMALL[0], SMALL[2]])
+
+
+def test_fully_escalated_batch_runs_the_full_model_once():
+    small, full = FakeBatcher(SMALL), FakeBatcher(FULL)
+    cascade = Cascade(small, full, min_confidence=0.99, min_margin=0.0)
+
+    predictions, stages, _ = cascade.submit(inputs(0, 1, 2, 3))
+
+    assert full.calls == [[0, 1, 2, 3]]
+    assert stages == ['full'] * 4
+    np.testing.assert_allclose(predictions, [FULL[i] for i in range(4)])
+
+
+def test_small_model_output_is_not_modified():
+    small_out = np.array([SMALL[0], SMALL[1]], dtype=np.float32)
+
+    class SharedOutputBatcher(FakeBatcher):
+        def submit(self, inputs):
+            return small_out, {}
+
+    cascade = Cascade(SharedOutputBatcher(SMALL), FakeBatcher(FULL), min_confidence=0.9, min_margin=0.0)
+    cascade.submit(inputs(0, 1))
+
+    np.testing.assert_allclose(small_out, [SMALL[0], SMALL[1]])
+
+
+def test_stats_report_escalation_rate_and_compute_saved():
+    cascade = Cascade(FakeBatcher(SMALL), FakeBatcher(FULL), min_confidence=0.9, min_margin=0.0,
+                      relative_cost=0.25)
+    cascade.submit(inputs(0, 1, 2, 3))
+    cascade.submit(inputs(0, 2))
+
+    stats = cascade.stats()
+    assert (stats['images'], stats['escalated'], stats['answered_small']) == (6, 2, 4)
+    assert stats['escalation_rate'] == round(2 / 6, 4)
+    assert stats['estimated_compute_saved'] == round(1 - 0.25 - 2 / 6, 4)
+
+
+def test_config_falls_back_to_defaults(tmp_path):
+    assert load_cascade_config(str(tmp_path / 'missing.json')) == DEFAULT_CONFIG
+
+    path = tmp_path / 'cascade_config.json'
+    path.write_text(json.dumps({'min_confidence': 0.8, 'relative_cost': 0.3}))
+    config = load_cascade_config(str(path))
+    assert config == dict(DEFAULT_CONFIG, min_confidence=0.8, relative_cost=0.3)
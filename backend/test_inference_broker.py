@@ -0,0 +1,117 @@
+"""Concurrency tests for the shared-memory inference broker.
+
+Run with: python -m pytest backend/test_inference_broker.py
+"""
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from inference_broker import BrokerClient, SharedRing, run_broker
+
+NUM_CLASSES = 4
+INPUT_SIZE = 8
+
+
+class FakeBackend:
+    """Echoes every image's first pixel back as its probabilities, optionally slowly"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def infer(self, batch):
+        time.sleep(self.delay)
+        probs = np.zeros((len(batch), NUM_CLASSES), dtype=np.float32)
+        probs[:, 0] = batch[:, 0, 0, 0]
+        return probs
+
+
+@contextmanager
+def shared_ring(num_slots=8):
+    ring = SharedRing(num_slots, NUM_CLASSES, INPUT_SIZE)
+    try:
+        yield ring
+    finally:
+        ring.close(unlink=True)
+
+
+@contextmanager
+def broker(ring, backend, window_ms=2, max_batch_size=8):
+    """A forked broker process, as serve.py runs it"""
+    process = multiprocessing.get_context('fork').Process(
+        target=run_broker, args=(ring, backend, window_ms, max_batch_size), daemon=True)
+    process.start()
+    try:
+        yield process
+    finally:
+        process.terminate()
+        process.join()
+
+
+def images(values):
+    batch = np.zeros((len(values), INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)
+    batch[:, 0, 0, 0] = values
+    return batch
+
+
+def wait_for_free_slots(client, seconds=5.0):
+    deadline = time.time() + seconds
+    while client.stats()['slots_in_use'] and time.time() < deadline:
+        time.sleep(0.01)
+    return client.stats()['slots_in_use']
+
+
+def test_concurrent_multi_image_requests_complete():
+    # 12 concurrent 2-image requests on an 8-slot ring used to wedge every slot
+    with shared_ring() as ring, broker(ring, FakeBackend(delay=0.005)):
+        client = BrokerClient(ring, timeout=10.0)
+
+        def request(i):
+            values = [i, i + 0.5]
+            return values, client.infer(images(values))
+
+        with ThreadPoolExecutor(12) as pool:
+            results = list(pool.map(request, range(48)))
+
+        for values, probs in results:
+            np.testing.assert_allclose(probs[:, 0], values)
+        assert wait_for_free_slots(client) == 0
+
+
+def test_requests_larger_than_a_claim_are_chunked():
+    with shared_ring() as ring, broker(ring, FakeBackend()):
+        client = BrokerClient(ring, timeout=10.0)
+
+        values = np.arange(11, dtype=np.float32)
+        probs = client.infer(images(values))
+
+        np.testing.assert_allclose(probs[:, 0], values)
+        assert wait_for_free_slots(client) == 0
+
+
+def test_timed_out_slots_are_freed_by_the_broker():
+    with shared_ring() as ring:
+        client = BrokerClient(ring, timeout=0.2)
+
+        # No broker yet: the request times out with its slots still queued
+        try:
+            client.infer(images([1.0, 2.0]))
+            raise AssertionError('expected a TimeoutError')
+        except TimeoutError:
+            pass
+        assert client.stats()['slots_in_use'] == 2
+
+        # Once the broker runs those slots it frees them instead of signalling
+        with broker(ring, FakeBackend()):
+            assert wait_for_free_slots(client) == 0
+
+            # ...and the whole ring is usable again
+            client.timeout = 10.0
+            values = np.arange(8, dtype=np.float32)
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(lambda v: client.infer(images([v, v])), values))
+            for v, probs in zip(values, results):
+                np.testing.assert_allclose(probs[:, 0], [v, v])
+            assert wait_for_free_slots(client) == 0
@@ -0,0 +1,138 @@
+"""Tests for the content-hash prediction cache.
+
+Run with: python -m pytest backend/test_prediction_cache.py
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+from prediction_cache import PredictionCache, perceptual_hash
+
+
+def encode(pixels, fmt='JPEG', **kwargs):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def photo(seed=0, size=(240, 320)):
+    """Smooth random image: a few large blobs, so downscaled copies keep its structure"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    return np.asarray(Image.fromarray(coarse).resize(size[::-1], Image.BICUBIC))
+
+
+def probs(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', probs(1, 0))
+    cache.put('b', probs(0, 1))
+    assert cache.get('a') is not None  # 'b' is now the oldest
+
+    cache.put('c', probs(0.5, 0.5))
+
+    assert cache.get('b') is None
+    np.testing.assert_array_equal(cache.get('a'), probs(1, 0))
+    np.testing.assert_array_equal(cache.get('c'), probs(0.5, 0.5))
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert (stats['hits'], stats['misses']) == (3, 1)
+
+
+def test_put_refreshes_an_existing_entry():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', probs(1, 0))
+    cache.put('b', probs(0, 1))
+    cache.put('a', probs(0.9, 0.1))
+    cache.put('c', probs(0, 1))
+
+    assert cache.get('b') is None
+    np.testing.assert_array_equal(cache.get('a'), probs(0.9, 0.1))
+
+
+def test_cached_probabilities_are_read_only_copies():
+    cache = PredictionCache(max_entries=4)
+    original = probs(0.2, 0.8)
+    cache.put('a', original)
+    original[0] = 1.0
+
+    cached = cache.get('a')
+    np.testing.assert_array_equal(cached, probs(0.2, 0.8))
+    assert not cached.flags.writeable
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(max_entries=0)
+    cache.put('a', probs(1, 0))
+    assert not cache.enabled
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_exact_keys_differ_for_any_byte_change():
+    cache = PredictionCache(mode='exact', model_version='v1')
+    upload = encode(photo(), quality=90)
+    reencoded = encode(photo(), quality=70)
+
+    assert cache.key_for(upload) == cache.key_for(bytes(upload))
+    assert cache.key_for(upload) != cache.key_for(reencoded)
+
+
+def test_perceptual_key_matches_reencoded_and_resized_copies():
+    pixels = photo(seed=1)
+    original = encode(pixels, quality=95)
+    reencoded = encode(pixels, quality=60)
+    resized = encode(np.asarray(Image.fromarray(pixels).resize((160, 120), Image.BILINEAR)), fmt='PNG')
+
+    assert perceptual_hash(original) == perceptual_hash(reencoded) == perceptual_hash(resized)
+
+    cache = PredictionCache(mode='perceptual')
+    cache.put(cache.key_for(original), probs(0, 1))
+    np.testing.assert_array_equal(cache.get(cache.key_for(resized)), probs(0, 1))
+
+
+def test_perceptual_keys_differ_for_different_photos():
+    hashes = {perceptual_hash(encode(photo(seed))) for seed in range(20)}
+    assert len(hashes) == 20
+
+
+def test_perceptual_hash_ignores_brightness_but_not_mirroring():
+    # dHash only compares neighbouring pixels: a uniformly brighter copy collides
+    # on purpose, a mirrored one must not
+    pixels = photo(seed=2).astype(np.int16)
+    brighter = np.clip(pixels + 20, 0, 255).astype(np.uint8)
+    mirrored = pixels[:, ::-1].astype(np.uint8)
+
+    base = perceptual_hash(encode(pixels.astype(np.uint8), fmt='PNG'))
+    assert perceptual_hash(encode(brighter, fmt='PNG')) == base
+    assert perceptual_hash(encode(mirrored, fmt='PNG')) != base
+
+
+def test_keys_include_the_model_version():
+    upload = encode(photo())
+    for mode in ('exact', 'perceptual'):
+        old = PredictionCache(mode=mode, model_version='v1').key_for(upload)
+        new = PredictionCache(mode=mode, model_version='v2').key_for(upload)
+        assert old != new
+
+
+def test_perceptual_key_rejects_undecodable_uploads():
+    cache = PredictionCache(mode='perceptual')
+    try:
+        cache.key_for(b'not an image')
+        raise AssertionError('expected a ValueError')
+    except ValueError as e:
+        assert 'Error processing image' in str(e)
+
+
+def test_unknown_mode_is_rejected():
+    try:
+        PredictionCache(mode='fuzzy')
+        raise AssertionError('expected a ValueError')
+    except ValueError:
+        pass
@@ -0,0 +1,98 @@
+"""Tests for tiled inference: tile placement, cutting and aggregation.
+
+Run with: python -m pytest backend/test_tiling.py
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+from tiling import aggregate, cut_tiles, load_working_image, tile_grid, tile_map, tile_positions
+
+
+def test_positions_include_a_tile_flush_with_the_far_edge():
+    np.testing.assert_array_equal(tile_positions(500, 224, 168), [0, 168, 276])
+    # Already flush: no duplicate last tile
+    np.testing.assert_array_equal(tile_positions(560, 224, 168), [0, 168, 336])
+    np.testing.assert_array_equal(tile_positions(224, 224, 168), [0])
+
+
+def test_grid_counts_the_tiles_cut_tiles_produces():
+    pixels = np.zeros((300, 500, 3), dtype=np.uint8)
+    ys, xs = tile_grid(300, 500, tile_size=100, stride=60)
+    tiles, cut_ys, cut_xs = cut_tiles(pixels, tile_size=100, stride=60)
+
+    assert len(tiles) == len(ys) * len(xs)
+    np.testing.assert_array_equal(ys, cut_ys)
+    np.testing.assert_array_equal(xs, cut_xs)
+
+
+def test_tiles_are_row_major_crops_scaled_to_unit_range():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(130, 170, 3), dtype=np.uint8)
+    tiles, ys, xs = cut_tiles(pixels, tile_size=64, stride=50)
+
+    assert tiles.dtype == np.float32
+    for i, (y, x) in enumerate((y, x) for y in ys for x in xs):
+        np.testing.assert_allclose(tiles[i], pixels[y:y + 64, x:x + 64] / np.float32(255.0), rtol=1e-6)
+
+
+def test_max_aggregation_lets_one_clear_tile_win():
+    probs = np.array([
+        [0.6, 0.4, 0.0],
+        [0.6, 0.4, 0.0],
+        [0.6, 0.4, 0.0],
+        [0.05, 0.0, 0.95],
+    ], dtype=np.float32)
+
+    result = aggregate(probs, 'max')
+
+    assert np.argmax(result) == 2
+    np.testing.assert_allclose(result.sum(), 1.0, rtol=1e-6)
+    assert np.argmax(aggregate(probs, 'mean')) == 0
+
+
+def test_mean_and_vote_aggregation():
+    probs = np.array([
+        [0.7, 0.3],
+        [0.6, 0.4],
+        [0.1, 0.9],
+    ], dtype=np.float32)
+
+    np.testing.assert_allclose(aggregate(probs, 'mean'), [1.4 / 3, 1.6 / 3], rtol=1e-6)
+    np.testing.assert_allclose(aggregate(probs, 'vote'), [2 / 3, 1 / 3], rtol=1e-6)
+
+
+def test_unknown_aggregation_is_rejected():
+    try:
+        aggregate(np.ones((2, 2), dtype=np.float32), 'median')
+        raise AssertionError('expected a ValueError')
+    except ValueError:
+        pass
+
+
+def test_tile_map_is_shaped_like_the_grid():
+    probs = np.array([
+        [0.9, 0.1], [0.2, 0.8], [0.3, 0.7],
+        [0.6, 0.4], [0.5, 0.5], [0.0, 1.0],
+    ], dtype=np.float32)
+
+    classes, confidence = tile_map(probs, rows=2, cols=3)
+
+    np.testing.assert_array_equal(classes, [[0, 1, 1], [0, 0, 1]])
+    np.testing.assert_allclose(confidence, [[0.9, 0.8, 0.7], [0.6, 0.5, 1.0]])
+
+
+def test_working_image_is_capped_but_never_smaller_than_a_tile():
+    def jpeg(width, height):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (120, 160, 40)).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    pixels, scale = load_working_image(jpeg(4000, 3000), max_side=1120, tile_size=224)
+    assert pixels.shape == (840, 1120, 3)
+    np.testing.assert_allclose(scale, 4000 / 1120, rtol=1e-3)
+
+    # A long strip keeps its short side at one tile
+    pixels, _ = load_working_image(jpeg(3000, 200), max_side=1120, tile_size=224)
+    assert pixels.shape[0] == 224
@@ -0,0 +1,102 @@
+"""Tiled inference for high-resolution field and drone images.
+
+A single 224x224 downscale of a 12 MP canopy shot averages lesions away.
+In tiled mode the image is instead:
+
+    1. decoded (JPEG draft mode) and scaled so its long side is at most
+       `max_side` pixels, the working resolution
+    2. cut into overlapping tile_size x tile_size tiles every `stride`
+       pixels, always including tiles flush with the right and bottom
+       edges; tiles are gathered from a sliding_window_view of the pixel
+       array, with no Python loop over tiles
+    3. classified in one batched forward pass
+    4. aggregated into one image-level probability vector:
+         max   per-class maximum over tiles, renormalised; a disease that
+               is clear on any tile wins
+         mean  average over tiles
+         vote  fraction of tiles whose top-1 is each class
+"""
+import io
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from preprocessing import ORIENTATION_TRANSPOSE, RESAMPLE_FILTERS, EXIF_ORIENTATION
+
+TILE_AGGREGATIONS = ('max', 'mean', 'vote')
+
+
+def load_working_image(image_bytes, max_side=1120, tile_size=224, resample='bicubic', draft=True):
+    """Decode to an upright uint8 (H, W, 3) array at the working resolution.
+
+    Returns (pixels, scale) where scale maps working pixels back to the
+    original image.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    width, height = img.size
+
+    # Long side down to max_side, but never let the short side drop below one tile
+    scale = min(1.0, max_side / max(width, height))
+    scale = max(scale, tile_size / min(width, height))
+    target = (max(tile_size, round(width * scale)), max(tile_size, round(height * scale)))
+
+    if draft and img.format == 'JPEG':
+        img.draft('RGB', target)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if img.size != target:
+        img = img.resize(target, RESAMPLE_FILTERS[resample])
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        img = img.transpose(transpose)
+    return np.asarray(img, dtype=np.uint8), 1.0 / scale
+
+
+def tile_positions(length, tile_size, stride):
+    """Tile offsets along one axis: every `stride` pixels, plus one flush with the far edge"""
+    positions = np.arange(0, length - tile_size + 1, stride)
+    if positions[-1] != length - tile_size:
+        positions = np.append(positions, length - tile_size)
+    return positions
+
+
+def tile_grid(height, width, tile_size=224, stride=168):
+    """(ys, xs) tile offsets for an image of this size; nothing is allocated per tile"""
+    return tile_positions(height, tile_size, stride), tile_positions(width, tile_size, stride)
+
+
+def cut_tiles(pixels, tile_size=224, stride=168):
+    """Cut overlapping tiles out of a uint8 (H, W, 3) array.
+
+    Returns (tiles, ys, xs): float32 tiles of shape (len(ys) * len(xs),
+    tile_size, tile_size, 3) in [0, 1], row-major, and the tile offsets.
+    """
+    ys, xs = tile_grid(pixels.shape[0], pixels.shape[1], tile_size, stride)
+
+    # (H - T + 1, W - T + 1, T, T, 3) view; no pixels are copied until the gather
+    windows = sliding_window_view(pixels, (tile_size, tile_size, 3))[:, :, 0]
+    tiles = np.empty((len(ys), len(xs), tile_size, tile_size, 3), dtype=np.float32)
+    np.divide(windows[ys[:, None], xs[None, :]], np.float32(255.0), out=tiles)
+    return tiles.reshape(-1, tile_size, tile_size, 3), ys, xs
+
+
+def aggregate(probs, method='max'):
+    """Combine per-tile probabilities (N, C) into one image-level vector (C,)"""
+    if method == 'mean':
+        return probs.mean(axis=0)
+    if method == 'vote':
+        votes = np.bincount(np.argmax(probs, axis=1), minlength=probs.shape[1])
+        return (votes / len(probs)).astype(np.float32)
+    if method == 'max':
+        peak = probs.max(axis=0)
+        return peak / peak.sum()
+    raise ValueError(f"Unknown aggregation '{method}'; choose one of: {', '.join(TILE_AGGREGATIONS)}")
+
+
+def tile_map(probs, rows, cols):
+    """Per-tile top-1 class indices and confidences, each shaped (rows, cols)"""
+    top = np.argmax(probs, axis=1)
+    confidence = probs[np.arange(len(probs)), top]
+    return top.reshape(rows, cols), confidence.reshape(rows, cols)
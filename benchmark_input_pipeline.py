@@ -0,0 +1,110 @@
+"""Compare the ImageDataGenerator and tf.data training input pipelines.
+
+Every variant is iterated over the full dataset/train training subset, with
+the same batch size and augmentation parameters as train_model.py, for
+--epochs epochs. The tf.data variants cover both augmentation paths:
+per-image random_transform ('+pyaug') and the batched in-graph transform,
+per image or shared per batch ('/batch').
+Epoch time and images/sec are reported per epoch; with a cache the first
+epoch fills it and later epochs read from it.
+
+With --with-model one epoch of the real frozen-backbone model is also fitted
+per variant, to show how much of the epoch the input pipeline accounts for.
+
+Usage:
+    python benchmark_input_pipeline.py [--epochs 2] [--max-batches 200] [--with-model]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import tensorflow as tf
+
+from train_model import BATCH_SIZE, build_model, create_inputs
+
+
+def iterate(data, max_batches):
+    """Pull batches as fast as possible; returns (images, seconds)"""
+    images = 0
+    start = time.perf_counter()
+    for i, (batch, _) in enumerate(data):
+        images += len(batch)
+        if max_batches and i + 1 >= max_batches:
+            break
+        # A Keras iterator never stops by itself
+        if hasattr(data, '__len__') and i + 1 >= len(data):
+            break
+    return images, time.perf_counter() - start
+
+
+def fit_one_epoch(train_data, num_classes, max_batches):
+    model = build_model(num_classes)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+                  loss='categorical_crossentropy', metrics=['accuracy'])
+    start = time.perf_counter()
+    model.fit(train_data, epochs=1, steps_per_epoch=max_batches or None, verbose=0)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, default=0, help='stop each epoch after N batches (0 = full epoch)')
+    parser.add_argument('--with-model', action='store_true', help='also time one training epoch per variant')
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='pipeline_cache_')
+    variants = [
+        ('generator', dict(pipeline='generator')),
+        ('tfdata+pyaug', dict(pipeline='tfdata', augment='generator')),
+        ('tfdata', dict(pipeline='tfdata')),
+        ('tfdata/batch', dict(pipeline='tfdata', per_batch=True)),
+        ('tfdata+ram', dict(pipeline='tfdata', cache='memory')),
+        ('tfdata+disk', dict(pipeline='tfdata', cache=os.path.join(cache_dir, 'cache'))),
+    ]
+
+    results = []
+    try:
+        for name, kwargs in variants:
+            print(f"\n=== {name} ===")
+            train_data, _, _, info = create_inputs(batch_size=args.batch_size, **kwargs)
+            epochs = []
+            for epoch in range(args.epochs):
+                images, seconds = iterate(train_data, args.max_batches)
+                epochs.append((images, seconds))
+                print(f"  epoch {epoch + 1}: {seconds:.1f}s ({images / seconds:.0f} images/s)")
+            fit_seconds = (fit_one_epoch(train_data, len(info['class_indices']), args.max_batches)
+                           if args.with_model else None)
+            results.append((name, epochs, fit_seconds))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"Input Pipeline Benchmark (batch {args.batch_size}, {os.cpu_count()} CPUs)")
+    print("=" * 60)
+    header = f"{'Pipeline':<14}{'Epoch 1':>10}{'Later':>10}{'Images/s':>11}{'Speedup':>10}"
+    if args.with_model:
+        header += f"{'Train epoch':>13}"
+    print(header)
+    print("-" * len(header))
+
+    baseline = None
+    for name, epochs, fit_seconds in results:
+        first = epochs[0][1]
+        later = epochs[1:] or epochs
+        later_seconds = sum(s for _, s in later) / len(later)
+        throughput = sum(n for n, _ in later) / sum(s for _, s in later)
+        baseline = baseline or throughput
+        line = f"{name:<14}{first:>9.1f}s{later_seconds:>9.1f}s{throughput:>11.0f}{throughput / baseline:>9.1f}x"
+        if fit_seconds is not None:
+            line += f"{fit_seconds:>12.1f}s"
+        print(line)
+
+    print("\n✓ Benchmark Complete!")
+
+
+if __name__ == '__main__':
+    main()
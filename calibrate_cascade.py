@@ -0,0 +1,187 @@
+"""Pick the cascade thresholds for the API from dataset/test.
+
+Runs the small (distilled) model and the full model on every test image,
+then searches confidence / margin thresholds for the one that escalates the
+fewest images to the full model while keeping cascade top-1 accuracy within
+--budget of the full model's. The relative per-image cost of the small
+model is measured too, so /health can report the compute saved.
+
+The result is written to models/cascade_config.json, which cnn_app.py reads
+when started with CASCADE=1.
+
+Usage:
+    python calibrate_cascade.py [--small-model models/crop_disease_model_small.tflite] [--budget 0.005]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from cascade import confidence_and_margin  # noqa: E402
+from inference import backend_for_path, default_model_path, load_backend  # noqa: E402
+from preprocessing import preprocess_image  # noqa: E402
+
+MODELS_DIR = 'models'
+TEST_DIR = 'dataset/test'
+CLASS_INDICES_PATH = 'models/class_indices.json'
+OUTPUT_PATH = 'models/cascade_config.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+CONFIDENCE_GRID = np.round(np.arange(0.0, 1.0001, 0.01), 2)
+MARGIN_GRID = np.round(np.arange(0.0, 1.0001, 0.02), 2)
+
+
+def list_test_set(test_dir, class_indices, limit=None):
+    """Test image paths and their label indices"""
+    files, labels = [], []
+    for class_name in sorted(class_indices):
+        class_dir = os.path.join(test_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for fname in sorted(os.listdir(class_dir)):
+            if fname.lower().endswith(IMAGE_EXTENSIONS):
+                files.append(os.path.join(class_dir, fname))
+                labels.append(class_indices[class_name])
+
+    if limit:
+        step = max(len(files) // limit, 1)
+        files, labels = files[::step][:limit], labels[::step][:limit]
+    return files, np.array(labels)
+
+
+def test_batches(files, size=224, batch_size=32):
+    """Batches of `files` preprocessed as the API sees them; only one batch is held in memory at a time"""
+    for start in range(0, len(files), batch_size):
+        chunk = files[start:start + batch_size]
+        images = np.empty((len(chunk), size, size, 3), dtype=np.float32)
+        for i, path in enumerate(chunk):
+            with open(path, 'rb') as f:
+                preprocess_image(f.read(), size=size, out=images[i:i + 1])
+        yield images
+
+
+def per_image_latency(backend, images, batch_size=16, repeat=5):
+    """Median seconds per image at a serving-sized batch"""
+    batch = images[:batch_size]
+    backend.infer(batch)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.infer(batch)
+        timings.append((time.perf_counter() - start) / len(batch))
+    return float(np.median(timings))
+
+
+def search_thresholds(small_probs, full_probs, labels, budget):
+    """Grid-search (min_confidence, min_margin) for the lowest escalation rate within budget.
+
+    Returns (best, full_accuracy, small_accuracy).
+    """
+    small_correct = np.argmax(small_probs, axis=1) == labels
+    full_correct = np.argmax(full_probs, axis=1) == labels
+    full_accuracy = float(full_correct.mean())
+    confidence, margin = confidence_and_margin(small_probs)
+
+    # (confidence thresholds, margin thresholds, images) escalation masks, all at once
+    escalate = ((confidence[None, None, :] < CONFIDENCE_GRID[:, None, None]) |
+                (margin[None, None, :] < MARGIN_GRID[None, :, None]))
+    accuracy = np.where(escalate, full_correct, small_correct).mean(axis=2)
+    rate = escalate.mean(axis=2)
+
+    feasible = accuracy >= full_accuracy - budget
+    if not feasible.any():
+        # Only possible when the small model is confidently wrong at probability 1.0;
+        # a margin threshold above 1 escalates every image
+        return {'min_confidence': 1.0, 'min_margin': 1.01, 'accuracy': full_accuracy,
+                'escalation_rate': 1.0}, full_accuracy, float(small_correct.mean())
+
+    # Lowest escalation rate first, then highest accuracy
+    score = np.where(feasible, rate - accuracy * 1e-6, np.inf)
+    ci, mi = np.unravel_index(np.argmin(score), score.shape)
+    best = {
+        'min_confidence': float(CONFIDENCE_GRID[ci]),
+        'min_margin': float(MARGIN_GRID[mi]),
+        'accuracy': float(accuracy[ci, mi]),
+        'escalation_rate': float(rate[ci, mi]),
+    }
+    return best, full_accuracy, float(small_correct.mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--small-model', default=None,
+                        help='first-stage model (default: fastest crop_disease_model_small artifact)')
+    parser.add_argument('--full-model', default=None,
+                        help='second-stage model (default: fastest crop_disease_model artifact)')
+    parser.add_argument('--backend', default='tensorflow',
+                        help='backend used to find default model artifacts (default tensorflow)')
+    parser.add_argument('--budget', type=float, default=0.005,
+                        help='allowed top-1 accuracy drop vs the full model (default 0.005)')
+    parser.add_argument('--limit', type=int, default=None, help='calibrate on at most N test images')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    small_path = args.small_model or default_model_path(MODELS_DIR, args.backend, stem='crop_disease_model_small')
+    full_path = args.full_model or default_model_path(MODELS_DIR, args.backend)
+    for path in (small_path, full_path):
+        if not os.path.exists(path):
+            print(f"❌ Model not found: {path}")
+            sys.exit(1)
+
+    with open(CLASS_INDICES_PATH, 'r') as f:
+        class_indices = json.load(f)
+
+    print("=== Loading Models ===")
+    small = load_backend(backend_for_path(small_path), small_path)
+    full = load_backend(backend_for_path(full_path), full_path)
+    print(f"✓ {small_path} -> {full_path}")
+
+    files, labels = list_test_set(TEST_DIR, class_indices, args.limit)
+
+    print(f"\n=== Running Models on {len(files)} Test Images ===")
+    small_probs, full_probs = [], []
+    latency_batch = None
+    for images in test_batches(files, full.input_size):
+        latency_batch = images if latency_batch is None else latency_batch
+        small_probs.append(small.infer(images))
+        full_probs.append(full.infer(images))
+    small_probs = np.concatenate(small_probs, axis=0)
+    full_probs = np.concatenate(full_probs, axis=0)
+    relative_cost = per_image_latency(small, latency_batch) / per_image_latency(full, latency_batch)
+    print(f"✓ Small model costs {relative_cost:.2f}x the full model per image")
+
+    print("\n=== Searching Thresholds ===")
+    best, full_accuracy, small_accuracy = search_thresholds(small_probs, full_probs, labels, args.budget)
+    print(f"Full model accuracy:  {full_accuracy * 100:.2f}%")
+    print(f"Small model accuracy: {small_accuracy * 100:.2f}%")
+    print(f"Cascade accuracy:     {best['accuracy'] * 100:.2f}% (budget {args.budget * 100:.2f} points)")
+    print(f"Thresholds:           confidence < {best['min_confidence']:g} or margin < {best['min_margin']:g}")
+    print(f"Escalation rate:      {best['escalation_rate'] * 100:.1f}%")
+    print(f"Compute saved:        {(1 - relative_cost - best['escalation_rate']) * 100:.1f}% (estimated)")
+
+    config = {
+        'min_confidence': best['min_confidence'],
+        'min_margin': best['min_margin'],
+        'relative_cost': round(relative_cost, 4),
+        'calibration': {
+            'small_model': os.path.basename(small_path.rstrip(os.sep)),
+            'full_model': os.path.basename(full_path.rstrip(os.sep)),
+            'images': int(len(files)),
+            'budget': args.budget,
+            'full_accuracy': full_accuracy,
+            'small_accuracy': small_accuracy,
+            'cascade_accuracy': best['accuracy'],
+            'escalation_rate': best['escalation_rate'],
+        },
+    }
+    with open(args.output, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"\n✓ Cascade config saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
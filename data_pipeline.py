@@ -0,0 +1,422 @@
+"""tf.data input pipeline for training and evaluation.
+
+ImageDataGenerator.flow_from_directory loads, decodes and augments one image
+at a time in Python. This pipeline is built from the same directory listing
+but decodes and resizes in parallel inside tf.data:
+
+    list files  -> shuffle (seeded, reshuffled every epoch)
+                -> read + decode + resize on AUTOTUNE threads
+                -> optional .cache() to RAM or disk
+                -> batch -> augment the whole batch in-graph -> prefetch
+
+list_directory() reproduces flow_from_directory exactly: classes are the
+sorted sub-directories, files are listed in the same order, and
+validation_split takes the first fraction of every class as 'validation' and
+the rest as 'training'. The class mapping is therefore the one written to
+models/class_indices.json, and a model trained on either pipeline serves
+unchanged.
+
+When the decoded images are cached, the file-level shuffle happens only once
+(the cache stores that order), so a seeded shuffle buffer of decoded images
+is used on top of it instead.
+
+Datasets packed by pack_dataset.py can be read instead of the image files
+(shard_dir=...): whole shards are read sequentially, interleaved and
+shuffled in a buffer, and nothing is decoded during training.
+
+Augmentation defaults to augmentation.BatchAugmentation, which applies the
+ImageDataGenerator transforms to each batch as one tensor op; the original
+per-image random_transform is still available with augment_mode='generator'.
+"""
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+from numpy.lib.format import open_memmap
+
+from augmentation import BatchAugmentation
+
+IMG_SIZE = (224, 224)
+# Extensions flow_from_directory accepts
+WHITE_LIST_FORMATS = ('.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.tif', '.tiff')
+# Those tf.io.decode_image can't read; they are decoded with PIL, as flow_from_directory does
+PIL_ONLY_FORMATS = ('.ppm', '.tif', '.tiff')
+# Decoded-image shuffle buffer when the cache is on (~150 KB per 224px image)
+CACHED_SHUFFLE_BUFFER = 4096
+# Shards read concurrently when shuffling packed data
+SHARD_CYCLE_LENGTH = 4
+
+
+def subset_slice(count, subset=None, validation_split=0.0):
+    """Slice of one class's `count` files in a flow_from_directory subset"""
+    if subset == 'validation':
+        return slice(0, int(validation_split * count))
+    if subset == 'training':
+        return slice(int(validation_split * count), count)
+    return slice(0, count)
+
+
+def list_directory(directory, subset=None, validation_split=0.0):
+    """(paths, labels, class_indices) in flow_from_directory order.
+
+    `subset` is None, 'training' or 'validation'.
+    """
+    classes = sorted(d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d)))
+    class_indices = dict(zip(classes, range(len(classes))))
+
+    paths, labels = [], []
+    for class_name in classes:
+        class_dir = os.path.join(directory, class_name)
+        files = []
+        for root, _, names in sorted(os.walk(class_dir), key=lambda x: x[0]):
+            files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(WHITE_LIST_FORMATS))
+        files = files[subset_slice(len(files), subset, validation_split)]
+        paths.extend(files)
+        labels.extend([class_indices[class_name]] * len(files))
+    return paths, np.array(labels, dtype=np.int32), class_indices
+
+
+def pil_decode(path):
+    """uint8 (H, W, 3) pixels of an image file, via PIL"""
+    from PIL import Image
+
+    with Image.open(path.decode() if isinstance(path, bytes) else path) as img:
+        return np.asarray(img.convert('RGB'), dtype=np.uint8)
+
+
+def decode_file(path):
+    """Image file -> uint8 (H, W, 3), with PIL_ONLY_FORMATS going through PIL"""
+    pattern = '.*\\.(' + '|'.join(ext[1:] for ext in PIL_ONLY_FORMATS) + ')'
+    image = tf.cond(
+        tf.strings.regex_full_match(tf.strings.lower(path), pattern),
+        lambda: tf.numpy_function(pil_decode, [path], tf.uint8),
+        lambda: tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False))
+    image.set_shape([None, None, 3])
+    return image
+
+
+def decode_and_resize(path, img_size=IMG_SIZE, method='nearest'):
+    """File -> uint8 (H, W, 3); nearest matches flow_from_directory's default interpolation"""
+    image = tf.image.resize(decode_file(path), img_size, method=method)
+    if image.dtype != tf.uint8:
+        # Every method except nearest returns float32
+        image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    return image
+
+
+def generator_augmentation(params):
+    """Per-image ImageDataGenerator.random_transform with `params`, run on the tf.data map threads"""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    datagen = ImageDataGenerator(**params)
+
+    def augment(image, label):
+        out = tf.numpy_function(lambda x: datagen.random_transform(x).astype(np.float32), [image], tf.float32)
+        out.set_shape(image.shape)
+        return out, label
+    return augment
+
+
+def epoch_seed(seed, epoch=None):
+    """Shuffle/augmentation seed of one epoch; None keeps `seed` and reshuffles every iteration"""
+    return seed if epoch is None else (seed * 1000003 + epoch) % 2 ** 31
+
+
+def make_epoch_datasets(paths, labels, num_classes, batch_size=32, img_size=IMG_SIZE, shuffle=False,
+                        seed=42, cache=None, augment=None, batch_augment=None, resize_method='nearest',
+                        samples_per_epoch=None):
+    """make_dataset() as a function of the epoch: returns for_epoch(epoch=None, skip_batches=0).
+
+    for_epoch(None) reshuffles on every iteration. for_epoch(e) has a fixed
+    order and augmentation for (seed, e) and drops its first `skip_batches`
+    batches, which is how training_state resumes mid-epoch. All of them
+    share one decode cache. `samples_per_epoch` truncates every epoch, so
+    that distributed workers run the same number of steps.
+    """
+    source = tf.data.Dataset.from_tensor_slices((paths, labels))
+    decode = lambda path, label: (decode_and_resize(path, img_size, resize_method), label)
+    if cache is not None:
+        # uint8 pixels are cached, before any per-epoch randomness
+        source = source.map(decode, num_parallel_calls=tf.data.AUTOTUNE).cache('' if cache == 'memory' else cache)
+
+    def for_epoch(epoch=None, skip_batches=0):
+        ds = source
+        if shuffle:
+            buffer = len(paths) if cache is None else min(len(paths), CACHED_SHUFFLE_BUFFER)
+            ds = ds.shuffle(buffer, seed=epoch_seed(seed, epoch), reshuffle_each_iteration=epoch is None)
+        if samples_per_epoch is not None:
+            ds = ds.take(samples_per_epoch)
+        # Skipped before decoding when there is no cache, so it costs nothing
+        ds = ds.skip(skip_batches * batch_size)
+        if cache is None:
+            ds = ds.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+        return finish_dataset(ds, num_classes, batch_size, seed, augment, batch_augment, epoch, skip_batches)
+    return for_epoch
+
+
+def make_dataset(paths, labels, num_classes, batch_size=32, img_size=IMG_SIZE, shuffle=False,
+                 seed=42, cache=None, augment=None, batch_augment=None, resize_method='nearest'):
+    """Batched dataset of (float32 images in [0, 1], one-hot labels).
+
+    `cache` is None, 'memory' or a file path prefix for an on-disk cache;
+    `augment` maps (image, label) -> (image, label) on single images and
+    `batch_augment` maps (images, labels, seed) -> (images, labels) on batches.
+    """
+    return make_epoch_datasets(paths, labels, num_classes, batch_size, img_size, shuffle, seed, cache,
+                               augment, batch_augment, resize_method)()
+
+
+def finish_dataset(ds, num_classes, batch_size=32, seed=42, augment=None, batch_augment=None, epoch=None,
+                   skip_batches=0):
+    """uint8 (image, label) pairs -> augmented batches of (float32 images in [0, 1], one-hot labels)"""
+    ds = ds.map(
+        lambda image, label: (tf.cast(image, tf.float32) / 255.0, tf.one_hot(label, num_classes)),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    if augment is not None:
+        ds = ds.map(augment, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.batch(batch_size)
+    if batch_augment is not None:
+        # One stateless seed per batch, different every epoch but fixed by `seed`
+        seeds = tf.data.Dataset.random(seed=epoch_seed(seed, epoch), rerandomize_each_iteration=epoch is None)
+        seeds = seeds.batch(2).skip(skip_batches)
+        ds = tf.data.Dataset.zip((ds, seeds)).map(
+            lambda batch, batch_seed: batch_augment(*batch, batch_seed),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def cache_iterator(iterator, cache='memory'):
+    """Decode a non-augmented, unshuffled Keras directory iterator once.
+
+    The rescaled batches are stored as uint8 pixels, in RAM ('memory') or in
+    an on-disk .npy memmap at `cache`, and replayed as a dataset of the same
+    batches every epoch.
+    """
+    shape = (iterator.samples, *iterator.image_shape)
+    if cache == 'memory':
+        pixels = np.empty(shape, dtype=np.uint8)
+    else:
+        pixels = open_memmap(cache if cache.endswith('.npy') else cache + '.npy', mode='w+',
+                             dtype=np.uint8, shape=shape)
+    labels = np.asarray(iterator.classes, dtype=np.int32)
+    offset = 0
+    for i in range(len(iterator)):
+        images, _ = iterator[i]
+        # Exact: rescaled pixels are uint8 / 255 in float32
+        pixels[offset:offset + len(images)] = np.round(images * 255)
+        offset += len(images)
+
+    batch_size = iterator.batch_size
+    num_classes = len(iterator.class_indices)
+
+    def read_batch(index):
+        batch = slice(index * batch_size, (index + 1) * batch_size)
+        return np.asarray(pixels[batch]), labels[batch]
+
+    def load(index):
+        images, batch_labels = tf.numpy_function(read_batch, [index], (tf.uint8, tf.int32))
+        images.set_shape([None, *shape[1:]])
+        batch_labels.set_shape([None])
+        return tf.cast(images, tf.float32) / 255.0, tf.one_hot(batch_labels, num_classes)
+
+    return tf.data.Dataset.range(len(iterator)).map(load).prefetch(tf.data.AUTOTUNE)
+
+
+def read_manifest(split_dir):
+    manifest_path = os.path.join(split_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No packed dataset at {split_dir} (run pack_dataset.py)")
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def list_shards(split_dir, subset=None, validation_split=0.0, img_size=IMG_SIZE):
+    """(groups, labels, class_indices) for a split packed by pack_dataset.py.
+
+    `groups` is a list of (shard path, sorted row indices, row labels), one
+    per shard, holding the images of `subset` (chosen per class exactly as
+    list_directory does). `labels` are those rows' labels in shard order,
+    which is the order an unshuffled shard dataset yields them in.
+    """
+    manifest = read_manifest(split_dir)
+    if tuple(manifest['img_size']) != tuple(img_size):
+        raise ValueError(f"{split_dir} is packed at {manifest['img_size']}, expected {list(img_size)}")
+    class_indices = manifest['class_indices']
+
+    # Manifest entries are in list_directory order: [path, size, mtime_ns, label, shard, row]
+    by_class = {}
+    for entry in manifest['images']:
+        by_class.setdefault(entry[3], []).append(entry)
+    selected = []
+    for entries in by_class.values():
+        selected.extend(entries[subset_slice(len(entries), subset, validation_split)])
+
+    rows = {}
+    for _, _, _, label, shard, row in selected:
+        rows.setdefault(shard, []).append((row, label))
+    groups, labels = [], []
+    for shard in sorted(rows):
+        shard_rows = sorted(rows[shard])
+        row_labels = np.array([label for _, label in shard_rows], dtype=np.int32)
+        groups.append((os.path.join(split_dir, shard), np.array([r for r, _ in shard_rows]), row_labels))
+        labels.append(row_labels)
+    labels = np.concatenate(labels) if labels else np.zeros(0, dtype=np.int32)
+    return groups, labels, class_indices
+
+
+def worker_groups(groups, num_workers, worker_index):
+    """This worker's rows of list_shards() groups: every num_workers-th row across all shards"""
+    selected, offset = [], 0
+    for shard_path, rows, row_labels in groups:
+        first = (worker_index - offset) % num_workers
+        if first < len(rows):
+            selected.append((shard_path, rows[first::num_workers], row_labels[first::num_workers]))
+        offset += len(rows)
+    return selected
+
+
+def make_shard_epoch_datasets(groups, num_classes, batch_size=32, img_size=IMG_SIZE, shuffle=False, seed=42,
+                             augment=None, batch_augment=None, samples_per_epoch=None):
+    """make_shard_dataset() as a function of the epoch, like make_epoch_datasets()"""
+    def read_group(index):
+        shard_path, rows, row_labels = groups[index]
+        pixels = np.load(shard_path, mmap_mode='r')
+        if len(rows) == len(pixels):
+            return np.asarray(pixels), row_labels
+        return pixels[rows], row_labels
+
+    def load(index):
+        images, labels = tf.numpy_function(read_group, [index], (tf.uint8, tf.int32))
+        images.set_shape([None, *img_size, 3])
+        labels.set_shape([None])
+        return tf.data.Dataset.from_tensor_slices((images, labels))
+
+    def for_epoch(epoch=None, skip_batches=0):
+        ds = tf.data.Dataset.range(len(groups))
+        if shuffle:
+            reshuffle = epoch is None
+            ds = ds.shuffle(len(groups), seed=epoch_seed(seed, epoch), reshuffle_each_iteration=reshuffle)
+            ds = ds.interleave(load, cycle_length=SHARD_CYCLE_LENGTH, num_parallel_calls=tf.data.AUTOTUNE,
+                               deterministic=True)
+            ds = ds.shuffle(CACHED_SHUFFLE_BUFFER, seed=epoch_seed(seed, epoch), reshuffle_each_iteration=reshuffle)
+        else:
+            # In shard order, matching list_shards()' labels
+            ds = ds.flat_map(load)
+        if samples_per_epoch is not None:
+            ds = ds.take(samples_per_epoch)
+        ds = ds.skip(skip_batches * batch_size)
+        return finish_dataset(ds, num_classes, batch_size, seed, augment, batch_augment, epoch, skip_batches)
+    return for_epoch
+
+
+def make_shard_dataset(groups, num_classes, batch_size=32, img_size=IMG_SIZE, shuffle=False, seed=42,
+                       augment=None, batch_augment=None):
+    """Batched dataset like make_dataset(), read from list_shards() groups.
+
+    Each shard's rows are read in one sequential pass. When shuffling, the
+    shard order is shuffled every epoch, SHARD_CYCLE_LENGTH shards are
+    interleaved and a buffer of decoded images is shuffled on top.
+    """
+    return make_shard_epoch_datasets(groups, num_classes, batch_size, img_size, shuffle, seed, augment,
+                                     batch_augment)()
+
+
+def create_datasets(batch_size=32, validation_split=0.2, augmentation=None, cache=None, seed=42,
+                    augment_mode='graph', per_batch=False, train_dir='dataset/train', test_dir='dataset/test',
+                    shard_dir=None, validation_cache='memory', num_workers=1, worker_index=0, img_size=IMG_SIZE):
+    """Training, validation and test datasets equivalent to train_model.create_generators().
+
+    `augment_mode` is 'graph' (batched BatchAugmentation; `per_batch` shares
+    one transform per batch) or 'generator' (per-image random_transform).
+    With `shard_dir` the splits are read from pack_dataset.py's shards under
+    it instead of the image directories (`cache` is then ignored). The
+    validation subset is decoded once and cached in `validation_cache` ('memory',
+    a file path prefix, or None) unless `cache` already covers it.
+    With `num_workers` > 1 the training data is this worker's share of the
+    training subset (every num_workers-th image from `worker_index`), cut to
+    the same number of images on every worker. Images are resized to
+    `img_size`.
+    Validation and test batches are never augmented. Returns (train, validation,
+    test, info) where info holds class_indices, the sample counts, the test
+    labels in dataset order and 'train_epoch', make_epoch_datasets()'
+    for_epoch for the training data.
+    """
+    augment = batch_augment = None
+    if augmentation and augment_mode == 'generator':
+        augment = generator_augmentation(augmentation)
+    elif augmentation:
+        batch_augment = BatchAugmentation(**augmentation, per_batch=per_batch)
+
+    if shard_dir:
+        return create_shard_datasets(shard_dir, batch_size, validation_split, seed, augment, batch_augment,
+                                     num_workers, worker_index, img_size)
+
+    train_paths, train_labels, class_indices = list_directory(train_dir, 'training', validation_split)
+    val_paths, val_labels, _ = list_directory(train_dir, 'validation', validation_split)
+    test_paths, test_labels, _ = list_directory(test_dir)
+    num_classes = len(class_indices)
+
+    def cache_for(split, cache=cache):
+        # 'memory' stays in RAM; a path prefix gets one cache file per split
+        return cache if cache in (None, 'memory') else f'{cache}_{split}'
+
+    worker_samples = len(train_paths) // num_workers
+    train_epoch = make_epoch_datasets(train_paths[worker_index::num_workers], train_labels[worker_index::num_workers],
+                                      num_classes, batch_size, img_size, shuffle=True, seed=seed, cache=cache_for('train'),
+                                      augment=augment, batch_augment=batch_augment,
+                                      samples_per_epoch=worker_samples if num_workers > 1 else None)
+    train_ds = train_epoch()
+    val_ds = make_dataset(val_paths, val_labels, num_classes, batch_size, img_size,
+                          cache=cache_for('validation', cache or validation_cache))
+    test_ds = make_dataset(test_paths, test_labels, num_classes, batch_size, img_size)
+
+    info = {
+        'class_indices': class_indices,
+        'train_samples': len(train_paths),
+        'worker_samples': worker_samples,
+        'validation_samples': len(val_paths),
+        'test_samples': len(test_paths),
+        'test_labels': test_labels,
+        'train_epoch': train_epoch,
+    }
+    print(f"Found {len(train_paths)} training, {len(val_paths)} validation and "
+          f"{len(test_paths)} test images belonging to {num_classes} classes.")
+    return train_ds, val_ds, test_ds, info
+
+
+def create_shard_datasets(shard_dir, batch_size=32, validation_split=0.2, seed=42, augment=None, batch_augment=None,
+                          num_workers=1, worker_index=0, img_size=IMG_SIZE):
+    """create_datasets() over <shard_dir>/train and <shard_dir>/test, which must be packed at `img_size`"""
+    train_groups, train_labels, class_indices = list_shards(os.path.join(shard_dir, 'train'), 'training',
+                                                            validation_split, img_size)
+    val_groups, val_labels, _ = list_shards(os.path.join(shard_dir, 'train'), 'validation', validation_split, img_size)
+    test_groups, test_labels, test_classes = list_shards(os.path.join(shard_dir, 'test'), img_size=img_size)
+    if test_classes != class_indices:
+        raise ValueError(f"{shard_dir}/train and {shard_dir}/test have different classes")
+    num_classes = len(class_indices)
+
+    worker_samples = len(train_labels) // num_workers
+    if num_workers > 1:
+        train_groups = worker_groups(train_groups, num_workers, worker_index)
+    train_epoch = make_shard_epoch_datasets(train_groups, num_classes, batch_size, img_size, shuffle=True, seed=seed,
+                                            augment=augment, batch_augment=batch_augment,
+                                            samples_per_epoch=worker_samples if num_workers > 1 else None)
+    train_ds = train_epoch()
+    val_ds = make_shard_dataset(val_groups, num_classes, batch_size, img_size)
+    test_ds = make_shard_dataset(test_groups, num_classes, batch_size, img_size)
+
+    info = {
+        'class_indices': class_indices,
+        'train_samples': len(train_labels),
+        'worker_samples': worker_samples,
+        'validation_samples': len(val_labels),
+        'test_samples': len(test_labels),
+        'test_labels': test_labels,
+        'train_epoch': train_epoch,
+    }
+    print(f"Found {len(train_labels)} training, {len(val_labels)} validation and "
+          f"{len(test_labels)} test images belonging to {num_classes} classes (packed in {shard_dir}).")
+    return train_ds, val_ds, test_ds, info
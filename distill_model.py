@@ -0,0 +1,295 @@
+"""Distil models/crop_disease_model.h5 into a compact student model.
+
+The student is trained on a mix of the hard labels and the teacher's soft
+targets at temperature T (Hinton et al.): the teacher's near-miss classes
+carry most of what a small network needs to learn from it.
+
+Students:
+    mobilenetv2_035   MobileNetV2, width 0.35
+    mobilenetv2_050   MobileNetV2, width 0.5
+    mobilenetv3small  MobileNetV3-Small
+
+--resolution runs the student backbone at a lower input size. The resize
+happens inside the model, so the saved student still takes the 224x224
+[0, 1] input cnn_app.py sends and can be served (or used as the CASCADE=1
+first stage) directly.
+
+Parameters, FLOPs, CPU latency and test accuracy are reported for teacher and
+student side by side, plus how often the two agree on top-1, and written to
+models/distillation_report.txt.
+
+Usage:
+    python distill_model.py [--student mobilenetv2_035] [--resolution 160] [--temperature 4] [--alpha 0.1]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers, models
+from tensorflow.keras.applications import MobileNetV2, MobileNetV3Small
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.models import load_model
+
+from evaluate_model import compute_metrics, load_test_generator
+from train_model import BATCH_SIZE, EPOCHS, IMG_SIZE, build_head, create_generators
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from inference import TensorFlowBackend  # noqa: E402
+
+TEACHER_PATH = 'models/crop_disease_model.h5'
+OUTPUT_PATH = 'models/crop_disease_model_small.h5'
+REPORT_PATH = 'models/distillation_report.txt'
+
+STUDENTS = ('mobilenetv2_035', 'mobilenetv2_050', 'mobilenetv3small')
+
+
+def build_student(name, num_classes, resolution=224, train_base=False):
+    """Student taking the served (224, 224, 3) [0, 1] input; the last Dense layer is named 'logits'"""
+    inputs = layers.Input(shape=IMG_SIZE + (3,))
+    x = inputs
+    if resolution != IMG_SIZE[0]:
+        x = layers.Resizing(resolution, resolution)(x)
+
+    if name.startswith('mobilenetv2'):
+        # Keras MobileNetV2 expects [-1, 1]
+        x = layers.Rescaling(2.0, offset=-1.0)(x)
+        base_model = MobileNetV2(
+            input_shape=(resolution, resolution, 3),
+            alpha=0.35 if name == 'mobilenetv2_035' else 0.5,
+            include_top=False,
+            weights='imagenet'
+        )
+    elif name == 'mobilenetv3small':
+        # MobileNetV3 rescales [0, 255] itself
+        x = layers.Rescaling(255.0)(x)
+        base_model = MobileNetV3Small(
+            input_shape=(resolution, resolution, 3),
+            include_top=False,
+            weights='imagenet'
+        )
+    else:
+        raise ValueError(f"Unknown student '{name}' (choose from {', '.join(STUDENTS)})")
+
+    base_model.trainable = train_base
+    x = base_model(x, training=False)
+
+    # Same head as the teacher, but with the logits exposed for distillation
+    for layer in build_head(num_classes)[:-1]:
+        x = layer(x)
+    logits = layers.Dense(num_classes, name='logits')(x)
+    outputs = layers.Activation('softmax', name='probabilities')(logits)
+    return models.Model(inputs, outputs, name=f'student_{name}_{resolution}')
+
+
+class Distiller(tf.keras.Model):
+    """Trains `student` on alpha * hard-label loss + (1 - alpha) * T^2 * soft-target loss"""
+
+    def __init__(self, student, teacher, temperature=4.0, alpha=0.1):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.student_logits = models.Model(student.input, student.get_layer('logits').output)
+        self.temperature = temperature
+        self.alpha = alpha
+
+        self.loss_tracker = tf.keras.metrics.Mean(name='loss')
+        self.distill_tracker = tf.keras.metrics.Mean(name='distillation_loss')
+        self.accuracy_tracker = tf.keras.metrics.CategoricalAccuracy(name='accuracy')
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.distill_tracker, self.accuracy_tracker]
+
+    def soft_targets(self, images):
+        # The teacher ends in softmax; log-probabilities are its logits up to a constant
+        teacher_probs = self.teacher(images, training=False)
+        return tf.nn.softmax(tf.math.log(teacher_probs + 1e-8) / self.temperature)
+
+    def compute_losses(self, images, labels, training):
+        logits = self.student_logits(images, training=training)
+        hard_loss = tf.keras.losses.categorical_crossentropy(labels, logits, from_logits=True)
+        soft_loss = tf.keras.losses.categorical_crossentropy(
+            self.soft_targets(images), logits / self.temperature, from_logits=True
+        ) * self.temperature ** 2
+        loss = tf.reduce_mean(self.alpha * hard_loss + (1.0 - self.alpha) * soft_loss)
+        return logits, loss, tf.reduce_mean(soft_loss)
+
+    def update_metrics(self, labels, logits, loss, soft_loss):
+        self.loss_tracker.update_state(loss)
+        self.distill_tracker.update_state(soft_loss)
+        self.accuracy_tracker.update_state(labels, tf.nn.softmax(logits))
+        return {m.name: m.result() for m in self.metrics}
+
+    def train_step(self, data):
+        images, labels = data
+        with tf.GradientTape() as tape:
+            logits, loss, soft_loss = self.compute_losses(images, labels, training=True)
+        variables = self.student.trainable_variables
+        self.optimizer.apply_gradients(zip(tape.gradient(loss, variables), variables))
+        return self.update_metrics(labels, logits, loss, soft_loss)
+
+    def test_step(self, data):
+        images, labels = data
+        logits, loss, soft_loss = self.compute_losses(images, labels, training=False)
+        return self.update_metrics(labels, logits, loss, soft_loss)
+
+    def call(self, images, training=False):
+        return self.student(images, training=training)
+
+
+def count_flops(model, input_size=IMG_SIZE[0]):
+    """Floating point operations for one image (multiply and add counted separately)"""
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    forward = tf.function(lambda x: model(x, training=False))
+    concrete = forward.get_concrete_function(tf.TensorSpec([1, input_size, input_size, 3], tf.float32))
+    frozen = convert_variables_to_constants_v2(concrete)
+    options = tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()
+    options['output'] = 'none'
+    profile = tf.compat.v1.profiler.profile(
+        graph=frozen.graph, run_meta=tf.compat.v1.RunMetadata(), cmd='op', options=options
+    )
+    return profile.total_float_ops
+
+
+def latency_ms(model, batch_size, runs):
+    """Median per-image CPU latency through the serving TensorFlow backend"""
+    backend = TensorFlowBackend(model)
+    batch = np.random.rand(batch_size, IMG_SIZE[0], IMG_SIZE[1], 3).astype(np.float32)
+    backend.infer(batch)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend.infer(batch)
+        timings.append((time.perf_counter() - start) / batch_size)
+    return float(np.median(timings)) * 1000
+
+
+def evaluate_both(teacher, student):
+    """Top-1 predictions of both models over the same test batches; returns (y_true, teacher, student)"""
+    test_generator = load_test_generator(batch_size=32)
+    teacher_pred, student_pred = [], []
+    for i in range(len(test_generator)):
+        images, _ = test_generator[i]
+        teacher_pred.append(np.argmax(teacher(images, training=False).numpy(), axis=1))
+        student_pred.append(np.argmax(student(images, training=False).numpy(), axis=1))
+    return test_generator.classes, np.concatenate(teacher_pred), np.concatenate(student_pred)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--student', default='mobilenetv2_035', choices=STUDENTS)
+    parser.add_argument('--resolution', type=int, default=IMG_SIZE[0],
+                        help='student backbone input size; the model still takes 224x224 (default 224)')
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.1,
+                        help='weight of the hard-label loss; the rest goes to the soft targets (default 0.1)')
+    parser.add_argument('--train-base', action='store_true',
+                        help='fine-tune the student backbone instead of keeping it frozen')
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--learning-rate', type=float, default=0.001)
+    parser.add_argument('--latency-runs', type=int, default=50)
+    parser.add_argument('--teacher', default=TEACHER_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    print("=== Loading Teacher ===")
+    teacher = load_model(args.teacher)
+    teacher.trainable = False
+
+    print("\n=== Creating Data Generators ===")
+    train_generator, validation_generator, _ = create_generators(args.batch_size)
+    class_indices = train_generator.class_indices
+    num_classes = len(class_indices)
+
+    # The student is served with the same class_indices.json as the teacher
+    class_indices_path = os.path.join(os.path.dirname(args.output) or '.', 'class_indices.json')
+    if os.path.exists(class_indices_path):
+        with open(class_indices_path, 'r') as f:
+            if json.load(f) != class_indices:
+                print(f"❌ {class_indices_path} does not match dataset/train; retrain the teacher first")
+                sys.exit(1)
+
+    print(f"\n=== Building Student ({args.student} @ {args.resolution}px) ===")
+    student = build_student(args.student, num_classes, args.resolution, args.train_base)
+    student.summary()
+
+    distiller = Distiller(student, teacher, args.temperature, args.alpha)
+    distiller.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate))
+
+    print(f"\n=== Distilling (T={args.temperature:g}, alpha={args.alpha:g}) ===")
+    distiller.fit(
+        train_generator,
+        validation_data=validation_generator,
+        epochs=args.epochs,
+        callbacks=[EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True, verbose=1)],
+        verbose=1
+    )
+
+    print("\n=== Saving Student ===")
+    student.save(args.output)
+    with open(class_indices_path, 'w') as f:
+        json.dump(class_indices, f)
+    print(f"✓ Student saved as '{args.output}' (classes in '{class_indices_path}')")
+
+    print("\n=== Evaluating Teacher and Student ===")
+    y_true, teacher_pred, student_pred = evaluate_both(teacher, student)
+    class_names = [name for name, _ in sorted(class_indices.items(), key=lambda item: item[1])]
+    _, _, teacher_class_acc = compute_metrics(y_true, teacher_pred, class_names)
+    student_report, _, student_class_acc = compute_metrics(y_true, student_pred, class_names)
+
+    print("\n=== Measuring Cost ===")
+    rows = []
+    for label, model, pred, path in (('teacher', teacher, teacher_pred, args.teacher),
+                                     ('student', student, student_pred, args.output)):
+        rows.append({
+            'label': label,
+            'params': model.count_params(),
+            'flops': count_flops(model),
+            'size_mb': os.path.getsize(path) / (1024 * 1024),
+            'latency_1': latency_ms(model, 1, args.latency_runs),
+            'latency_16': latency_ms(model, 16, max(args.latency_runs // 5, 3)),
+            'accuracy': float(np.mean(pred == y_true)),
+        })
+    agreement = float(np.mean(teacher_pred == student_pred))
+    teacher_row, student_row = rows
+
+    lines = [
+        f"Student: {args.student} @ {args.resolution}px, T={args.temperature:g}, alpha={args.alpha:g}"
+        f"{', backbone fine-tuned' if args.train_base else ''}",
+        "",
+        f"{'Model':<10}{'Params':>12}{'GFLOPs':>9}{'Size':>11}{'Latency b1':>13}{'b16/img':>11}{'Accuracy':>11}",
+    ]
+    for r in rows:
+        lines.append(f"{r['label']:<10}{r['params']:>12,}{r['flops'] / 1e9:>9.3f}{r['size_mb']:>8.2f} MB"
+                     f"{r['latency_1']:>10.2f} ms{r['latency_16']:>8.2f} ms{r['accuracy'] * 100:>10.2f}%")
+    lines += [
+        "",
+        f"Student / teacher: {student_row['params'] / teacher_row['params']:.2f}x params, "
+        f"{student_row['flops'] / teacher_row['flops']:.2f}x FLOPs, "
+        f"{student_row['latency_1'] / teacher_row['latency_1']:.2f}x latency",
+        f"Accuracy change: {(student_row['accuracy'] - teacher_row['accuracy']) * 100:+.2f} points",
+        f"Top-1 agreement with teacher: {agreement * 100:.2f}%",
+        "",
+        "Per-class accuracy (teacher -> student):",
+    ]
+    for name, t_acc, s_acc in zip(class_names, teacher_class_acc, student_class_acc):
+        lines.append(f"  {name}: {t_acc * 100:.2f}% -> {s_acc * 100:.2f}% ({(s_acc - t_acc) * 100:+.2f})")
+    lines += ["", "Student classification report:", student_report]
+
+    report = "\n".join(lines)
+    print("\n" + report)
+    with open(REPORT_PATH, 'w') as f:
+        f.write(report)
+    print(f"Report saved as '{REPORT_PATH}'")
+
+    print("\n✓ Distillation Complete!")
+
+
+if __name__ == '__main__':
+    main()
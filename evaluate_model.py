@@ -1,3 +1,5 @@
+import argparse
+
 import tensorflow as tf
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
@@ -6,71 +8,114 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import json
+import os
+
+
+def load_test_generator(batch_size=1, img_size=(224, 224)):
+    """Unshuffled, non-augmented iterator over dataset/test"""
+    test_datagen = ImageDataGenerator(rescale=1./255)
+
+    return test_datagen.flow_from_directory(
+        'dataset/test',
+        target_size=img_size,
+        batch_size=batch_size,
+        class_mode='categorical',
+        shuffle=False
+    )
+
+
+def load_test_shards(shard_dir, batch_size=32, img_size=(224, 224)):
+    """(dataset, labels) over dataset/test as packed by pack_dataset.py at `img_size`"""
+    from data_pipeline import list_shards, make_shard_dataset
+
+    groups, labels, class_indices = list_shards(os.path.join(shard_dir, 'test'), img_size=img_size)
+    return make_shard_dataset(groups, len(class_indices), batch_size, img_size), labels
+
+
+def compute_metrics(y_true, y_pred, class_names):
+    """Return (classification report text, confusion matrix, per-class accuracy)"""
+    report = classification_report(
+        y_true,
+        y_pred,
+        target_names=class_names,
+        labels=range(len(class_names)),
+        digits=3
+    )
+    cm = confusion_matrix(y_true, y_pred, labels=range(len(class_names)))
+    class_accuracy = cm.diagonal() / np.maximum(cm.sum(axis=1), 1)
+    return report, cm, class_accuracy
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Evaluate the crop disease classifier on dataset/test.')
+    parser.add_argument('--shards', default=None, metavar='DIR',
+                        help='read the test images packed by pack_dataset.py from DIR')
+    parser.add_argument('--model', default='models/crop_disease_model.h5',
+                        help='model to evaluate (default models/crop_disease_model.h5)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("=== Loading Model ===")
+    model = load_model(args.model)
+    # Test images are resized to whatever the model was trained at
+    img_size = tuple(model.input_shape[1:3])
+    print(f"Input size: {img_size[0]}x{img_size[1]}")
+
+    # Load class indices
+    with open('models/class_indices.json', 'r') as f:
+        class_indices = json.load(f)
+
+    # Reverse mapping: index -> class name
+    idx_to_class = {v: k for k, v in class_indices.items()}
+
+    print("=== Loading Test Data ===")
+    if args.shards:
+        test_data, y_true = load_test_shards(args.shards, img_size=img_size)
+    else:
+        test_data = load_test_generator(img_size=img_size)
+        y_true = test_data.classes
+
+    print("=== Making Predictions ===")
+    predictions = model.predict(test_data, verbose=1)
+    y_pred = np.argmax(predictions, axis=1)
+
+    report, cm, class_accuracy = compute_metrics(y_true, y_pred, list(class_indices.keys()))
+
+    print("\n=== Classification Report ===")
+    print(report)
+
+    # Save report
+    with open('models/classification_report.txt', 'w') as f:
+        f.write(report)
+
+    print("\n=== Creating Confusion Matrix ===")
+    plt.figure(figsize=(12, 10))
+    sns.heatmap(
+        cm,
+        annot=True,
+        fmt='d',
+        cmap='Blues',
+        xticklabels=list(class_indices.keys()),
+        yticklabels=list(class_indices.keys())
+    )
+    plt.title('Confusion Matrix')
+    plt.xlabel('Predicted')
+    plt.ylabel('Actual')
+    plt.xticks(rotation=45, ha='right')
+    plt.yticks(rotation=0)
+    plt.tight_layout()
+    plt.savefig('models/confusion_matrix.png', dpi=300)
+    print("Confusion matrix saved as 'models/confusion_matrix.png'")
+
+    # Calculate per-class accuracy
+    print("\n=== Per-Class Accuracy ===")
+    for class_name, accuracy in zip(class_indices.keys(), class_accuracy):
+        print(f"{class_name}: {accuracy * 100:.2f}%")
+
+    print("\n✓ Evaluation Complete!")
+
 
-print("=== Loading Model ===")
-model = load_model('models/crop_disease_model.h5')
-
-# Load class indices
-with open('models/class_indices.json', 'r') as f:
-    class_indices = json.load(f)
-
-# Reverse mapping: index -> class name
-idx_to_class = {v: k for k, v in class_indices.items()}
-
-print("=== Loading Test Data ===")
-test_datagen = ImageDataGenerator(rescale=1./255)
-
-test_generator = test_datagen.flow_from_directory(
-    'dataset/test',
-    target_size=(224, 224),
-    batch_size=1,
-    class_mode='categorical',
-    shuffle=False
-)
-
-print("=== Making Predictions ===")
-predictions = model.predict(test_generator, verbose=1)
-y_pred = np.argmax(predictions, axis=1)
-y_true = test_generator.classes
-
-print("\n=== Classification Report ===")
-report = classification_report(
-    y_true, 
-    y_pred, 
-    target_names=list(class_indices.keys()),
-    digits=3
-)
-print(report)
-
-# Save report
-with open('models/classification_report.txt', 'w') as f:
-    f.write(report)
-
-print("\n=== Creating Confusion Matrix ===")
-cm = confusion_matrix(y_true, y_pred)
-
-plt.figure(figsize=(12, 10))
-sns.heatmap(
-    cm, 
-    annot=True, 
-    fmt='d', 
-    cmap='Blues',
-    xticklabels=list(class_indices.keys()),
-    yticklabels=list(class_indices.keys())
-)
-plt.title('Confusion Matrix')
-plt.xlabel('Predicted')
-plt.ylabel('Actual')
-plt.xticks(rotation=45, ha='right')
-plt.yticks(rotation=0)
-plt.tight_layout()
-plt.savefig('models/confusion_matrix.png', dpi=300)
-print("Confusion matrix saved as 'models/confusion_matrix.png'")
-
-# Calculate per-class accuracy
-print("\n=== Per-Class Accuracy ===")
-class_accuracy = cm.diagonal() / cm.sum(axis=1)
-for class_name, accuracy in zip(class_indices.keys(), class_accuracy):
-    print(f"{class_name}: {accuracy * 100:.2f}%")
-
-print("\n✓ Evaluation Complete!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Accuracy against CPU latency of the classifier at several input resolutions.
+
+Serving cost grows with the number of input pixels. For every resolution in
+--resolutions the model in <models-dir>/<r>px/ is run on dataset/test, with
+images preprocessed exactly as the API does at that size, through the same
+inference backend the API would use. The report gives top-1 accuracy,
+median batch-1 latency and batch throughput at --threads threads, so a
+resolution can be picked per node type from measured numbers.
+
+With --train, resolutions that have no model yet are trained first, with
+train_model.py --img-size <r> --output-dir <models-dir>/<r>px. Any other
+arguments are passed on to train_model.py. For --backend tflite or onnx,
+export the models first (export_model.py --model <models-dir>/<r>px/crop_disease_model.h5 ...).
+
+Serve one with MODEL_PATH=<models-dir>/<r>px/crop_disease_model.h5; the API
+reads the input size from the model's .meta.json.
+
+Usage:
+    python evaluate_resolutions.py [--resolutions 128,160,192,224] [--train] [--backend tensorflow] [--threads 2]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from data_pipeline import list_directory
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from inference import BACKEND_FORMATS, BACKENDS, configure_tensorflow_threads, load_backend, model_path  # noqa: E402
+from preprocessing import preprocess_image  # noqa: E402
+
+MODELS_DIR = 'models'
+TEST_DIR = 'dataset/test'
+REPORT_PATH = 'models/resolution_report.txt'
+RESOLUTIONS = (128, 160, 192, 224)
+
+
+def resolution_dir(models_dir, resolution):
+    return os.path.join(models_dir, f'{resolution}px')
+
+
+def test_batches(paths, size, batch_size=32):
+    """dataset/test preprocessed like the API at `size`, one batch in memory at a time"""
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        images = np.empty((len(chunk), size, size, 3), dtype=np.float32)
+        for i, path in enumerate(chunk):
+            with open(path, 'rb') as f:
+                preprocess_image(f.read(), size=size, out=images[i:i + 1])
+        yield images
+
+
+def measure(backend, images, runs, batch_size):
+    """(median batch-1 latency in ms, images/sec at `batch_size`) after one untimed call of each"""
+    single = images[:1]
+    backend.infer(single)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend.infer(single)
+        timings.append(time.perf_counter() - start)
+
+    batch = images[:batch_size]
+    backend.infer(batch)
+    start = time.perf_counter()
+    for _ in range(max(1, runs // 10)):
+        backend.infer(batch)
+    throughput = len(batch) * max(1, runs // 10) / (time.perf_counter() - start)
+    return float(np.median(timings)) * 1000, throughput
+
+
+def evaluate(backend, paths, labels, size, batch_size=32):
+    """(top-1 accuracy, first batch of images) over `paths`"""
+    predictions = []
+    first = None
+    for images in test_batches(paths, size, batch_size):
+        first = images if first is None else first
+        predictions.append(np.argmax(backend.infer(images), axis=1))
+    return float(np.mean(np.concatenate(predictions) == labels)), first
+
+
+def artifact_size(path):
+    """Size in bytes of a model file or directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resolutions', default=','.join(map(str, RESOLUTIONS)),
+                        help=f"comma-separated input sizes (default {','.join(map(str, RESOLUTIONS))})")
+    parser.add_argument('--models-dir', default=MODELS_DIR, help='holds one <r>px/ directory per resolution')
+    parser.add_argument('--backend', choices=list(BACKENDS), default='tensorflow',
+                        help='inference backend to time, as INFERENCE_BACKEND in the API (default tensorflow)')
+    parser.add_argument('--threads', type=int, default=None, help='inference threads (default: runtime default)')
+    parser.add_argument('--runs', type=int, default=50, help='timed batch-1 calls per resolution (default 50)')
+    parser.add_argument('--batch-size', type=int, default=16, help='batch size for throughput (default 16)')
+    parser.add_argument('--limit', type=int, default=None, help='evaluate on at most N test images')
+    parser.add_argument('--train', action='store_true', help='train the resolutions that have no model yet')
+    parser.add_argument('--script', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_model.py'),
+                        help='training script used by --train (default train_model.py)')
+    args, train_args = parser.parse_known_args()
+    resolutions = sorted({int(r) for r in args.resolutions.split(',') if r.strip()})
+
+    print("=" * 60)
+    print("KrishiMitra Resolution / Latency Study")
+    print("=" * 60)
+
+    # Keras models at the training path; other backends at their exported path
+    fmt = 'h5' if args.backend == 'tensorflow' else BACKEND_FORMATS[args.backend][0]
+    paths = {r: model_path(resolution_dir(args.models_dir, r), fmt) for r in resolutions}
+    for r in resolutions:
+        keras_path = model_path(resolution_dir(args.models_dir, r), 'h5')
+        if args.train and not os.path.exists(keras_path):
+            print(f"\n=== Training at {r}px ===")
+            command = [sys.executable, args.script, '--img-size', str(r),
+                       '--output-dir', resolution_dir(args.models_dir, r)] + train_args
+            if subprocess.call(command) != 0:
+                print(f"❌ Training at {r}px failed")
+                sys.exit(1)
+    missing = [paths[r] for r in resolutions if not os.path.exists(paths[r])]
+    if missing:
+        for path in missing:
+            print(f"❌ Model not found: {path}")
+        print("Train them with --train" + ("" if args.backend == 'tensorflow' else ", then run export_model.py"))
+        sys.exit(1)
+
+    test_paths, labels, _ = list_directory(TEST_DIR)
+    if args.limit:
+        # Spread the sample over all classes rather than taking the first few
+        step = max(len(test_paths) // args.limit, 1)
+        test_paths, labels = test_paths[::step][:args.limit], labels[::step][:args.limit]
+    if args.backend == 'tensorflow':
+        # Only possible once per process, before the first model is loaded
+        configure_tensorflow_threads(args.threads)
+
+    results = []
+    for r in resolutions:
+        print(f"\n=== {r}px: {paths[r]} ===")
+        backend = load_backend(args.backend, paths[r], num_threads=args.threads)
+        if backend.input_size != r:
+            print(f"❌ {paths[r]} takes {backend.input_size}px inputs, not {r}px")
+            sys.exit(1)
+        # The first batch is also the timing batch
+        accuracy, images = evaluate(backend, test_paths, labels, r, max(32, args.batch_size))
+        latency, throughput = measure(backend, images, args.runs, args.batch_size)
+        print(f"Accuracy {accuracy * 100:.2f}%, {latency:.1f} ms per image, {throughput:.1f} images/s")
+        results.append({
+            'resolution': r,
+            'pixels': r * r,
+            'accuracy': accuracy,
+            'latency_ms': latency,
+            'throughput': throughput,
+            'size_mb': artifact_size(paths[r]) / (1024 * 1024),
+            'model': paths[r],
+        })
+
+    largest = results[-1]
+    lines = []
+    lines.append(f"=== Accuracy vs CPU Latency ({args.backend}, {args.threads or 'default'} threads, "
+                 f"{len(test_paths)} test images) ===")
+    lines.append(f"{'Resolution':<12}{'Pixels':>8}{'Accuracy':>10}{'Latency':>11}{'Images/s':>10}"
+                 f"{'Speedup':>9}{'Acc. delta':>12}{'Size':>10}")
+    for result in results:
+        lines.append(f"{str(result['resolution']) + 'px':<12}{result['pixels'] / largest['pixels']:>7.0%} "
+                     f"{result['accuracy'] * 100:>8.2f}%{result['latency_ms']:>8.1f} ms{result['throughput']:>10.1f}"
+                     f"{largest['latency_ms'] / result['latency_ms']:>8.2f}x"
+                     f"{(result['accuracy'] - largest['accuracy']) * 100:>+10.2f} pt{result['size_mb']:>7.1f} MB")
+    lines.append("")
+    lines.append(f"Latency: median batch-1; images/s: batch {args.batch_size}. "
+                 f"Speedup and accuracy delta are relative to {largest['resolution']}px.")
+    report = "\n".join(lines)
+
+    print("\n" + report)
+    with open(REPORT_PATH, 'w') as f:
+        f.write(report + "\n")
+    with open(os.path.splitext(REPORT_PATH)[0] + '.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Report saved as '{REPORT_PATH}'")
+    print("\n✓ Resolution Study Complete!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Export the trained model to faster-loading and lighter-runtime formats.
+
+Formats:
+    tflite      TFLite flatbuffer (served by INFERENCE_BACKEND=tflite)
+    onnx        ONNX graph (served by INFERENCE_BACKEND=onnx)
+    weights     architecture JSON + one memory-mappable weights blob
+    keras       Keras v3 .keras archive
+    savedmodel  TensorFlow SavedModel directory
+
+The TensorFlow backend picks weights, keras, savedmodel and h5 in that
+order, whichever exists first. Exports are written next to the model, with
+its input size recorded in <stem>.meta.json for the API; several models (for
+example one per training --img-size) can be exported in one run.
+
+Every exported format is run on dataset/test next to the Keras model; the
+export fails if any backend disagrees with Keras on a top-1 label more often
+than --max-mismatch allows, or if probabilities drift by more than
+--max-prob-diff.
+
+Usage:
+    python export_model.py [--formats tflite,onnx,weights] [--no-verify] [--limit 500]
+    python export_model.py --model models/160px/crop_disease_model.h5 models/128px/crop_disease_model.h5
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from inference import (MODEL_FORMATS, load_backend, model_path, read_metadata, save_mmap_model,  # noqa: E402
+                       write_metadata)
+from preprocessing import preprocess_image  # noqa: E402
+
+MODEL_PATH = 'models/crop_disease_model.h5'
+TEST_DIR = 'dataset/test'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def export_tflite(model, output_path):
+    """Float32 TFLite flatbuffer with a dynamic batch dimension"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+
+def export_onnx(model, output_path):
+    """ONNX graph (opset 13) with a dynamic batch dimension"""
+    import tf2onnx
+
+    spec = [tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=output_path)
+
+
+def export_weights(model, output_path):
+    """Flat, memory-mappable weights blob plus architecture JSON"""
+    save_mmap_model(model, output_path)
+
+
+def export_keras(model, output_path):
+    model.save(output_path, save_format='keras')
+
+
+def export_savedmodel(model, output_path):
+    if os.path.exists(output_path):
+        shutil.rmtree(output_path)
+    model.save(output_path, save_format='tf')
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx,
+    'weights': export_weights,
+    'keras': export_keras,
+    'savedmodel': export_savedmodel,
+}
+
+
+def load_test_images(test_dir, limit=None, size=224):
+    """Yield float32 `size`x`size` image arrays preprocessed exactly like the API does"""
+    classes = sorted(d for d in os.listdir(test_dir) if os.path.isdir(os.path.join(test_dir, d)))
+    files = []
+    for class_name in classes:
+        class_dir = os.path.join(test_dir, class_name)
+        for fname in sorted(os.listdir(class_dir)):
+            if fname.lower().endswith(IMAGE_EXTENSIONS):
+                files.append(os.path.join(class_dir, fname))
+
+    if limit:
+        # Spread the sample over all classes rather than taking the first few
+        step = max(len(files) // limit, 1)
+        files = files[::step][:limit]
+
+    for path in files:
+        with open(path, 'rb') as f:
+            yield preprocess_image(f.read(), size=size)[0]
+
+
+def test_batches(test_dir, limit=None, size=224, batch_size=32):
+    """load_test_images() in float32 batches; only one batch is held in memory at a time"""
+    batch = []
+    for image in load_test_images(test_dir, limit, size):
+        batch.append(image)
+        if len(batch) == batch_size:
+            yield np.stack(batch)
+            batch = []
+    if batch:
+        yield np.stack(batch)
+
+
+def verify(source_path, formats, batches, max_mismatch, max_prob_diff):
+    """Compare every exported format against the Keras reference; returns True if all pass.
+
+    All models run on each batch in turn, so only their outputs are kept.
+    """
+    backends = {'reference': load_backend('tensorflow', source_path)}
+    for fmt in formats:
+        backends[fmt] = load_backend(MODEL_FORMATS[fmt][0], output_path(source_path, fmt))
+    outputs = {name: [] for name in backends}
+    print("\nRunning the reference (tensorflow) and exported models on the test set...")
+    for batch in batches:
+        for name, backend in backends.items():
+            outputs[name].append(backend.infer(batch))
+    reference = np.concatenate(outputs.pop('reference'), axis=0)
+    reference_top1 = np.argmax(reference, axis=1)
+    print(f"✓ {len(reference)} test images")
+
+    all_ok = True
+    print(f"\n{'Backend':<12} {'Top-1 mismatches':<20} {'Max prob diff':<15} {'Result':<8}")
+    print("-" * 60)
+    for fmt in formats:
+        probs = np.concatenate(outputs[fmt], axis=0)
+        mismatches = int(np.sum(np.argmax(probs, axis=1) != reference_top1))
+        prob_diff = float(np.abs(probs - reference).max())
+        ok = mismatches / len(reference) <= max_mismatch and prob_diff <= max_prob_diff
+        all_ok = all_ok and ok
+        print(f"{fmt:<12} {mismatches:<20} {prob_diff:<15.2e} {'✓ pass' if ok else '❌ FAIL':<8}")
+    return all_ok
+
+
+def output_path(source_path, fmt):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return model_path(os.path.dirname(source_path), fmt, stem)
+
+
+def artifact_size(path):
+    """Size in bytes of a model file or directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--formats', default='tflite,onnx,weights',
+                        help='comma-separated list of: ' + ', '.join(EXPORTERS))
+    parser.add_argument('--no-verify', action='store_true', help='skip the dataset/test comparison')
+    parser.add_argument('--limit', type=int, default=None, help='verify on at most N test images')
+    parser.add_argument('--max-mismatch', type=float, default=0.0,
+                        help='allowed fraction of top-1 labels that differ from Keras (default 0)')
+    parser.add_argument('--max-prob-diff', type=float, default=1e-3,
+                        help='allowed absolute difference in any probability (default 1e-3)')
+    parser.add_argument('--model', nargs='+', default=[MODEL_PATH], metavar='PATH',
+                        help=f'Keras model(s) to export (default {MODEL_PATH})')
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in EXPORTERS]
+    if unknown:
+        print(f"❌ Unknown format(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    for source_path in args.model:
+        print(f"=== Loading Model: {source_path} ===")
+        model = tf.keras.models.load_model(source_path)
+        input_size = model.input_shape[1]
+        write_metadata(source_path, {**read_metadata(source_path), 'input_size': input_size})
+        print(f"Input size: {input_size}x{input_size}")
+
+        print("\n=== Exporting ===")
+        for fmt in formats:
+            path = output_path(source_path, fmt)
+            EXPORTERS[fmt](model, path)
+            print(f"✓ {fmt}: {path} ({artifact_size(path) / (1024 * 1024):.2f} MB)")
+
+        if args.no_verify:
+            print("\n⚠️  Skipping verification")
+            continue
+
+        print("\n=== Verifying on Test Set ===")
+        batches = test_batches(TEST_DIR, args.limit, input_size)
+        if not verify(source_path, formats, batches, args.max_mismatch, args.max_prob_diff):
+            print("\n❌ Verification failed: exported models do not match the Keras model")
+            sys.exit(1)
+
+    print("\n✓ Export Complete!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Train the classifier head from cached backbone features.
+
+The MobileNetV2 backbone is frozen, so its pooled 1280-d output for a given
+image never changes. Instead of recomputing it every epoch, the backbone is
+run once over the training and validation subsets (or, for the training
+subset, once per augmented variant) and the features are written to
+memory-mapped .npy files:
+
+    <cache_dir>/train_features.npy       (variants * N, 1280) float32
+    <cache_dir>/train_labels.npy         (variants * N,) int32
+    <cache_dir>/validation_features.npy
+    <cache_dir>/validation_labels.npy
+    <cache_dir>/meta.json                what the cache was built from
+
+The head after GlobalAveragePooling is then fitted directly on those rows.
+Its layers are shared with the end-to-end model, so once the head is trained
+the full model is ready to evaluate, save and serve.
+
+The cache is reused on the next run when the image files, the backbone
+weights, the number of variants and the seed are unchanged.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from numpy.lib.format import open_memmap
+from tensorflow.keras import layers, models
+from tensorflow.keras.callbacks import ModelCheckpoint
+
+from augmentation import BatchAugmentation
+from data_pipeline import epoch_seed, list_directory, list_shards, make_dataset, make_shard_dataset
+
+DEFAULT_CACHE_DIR = 'models/feature_cache'
+
+
+class EndToEndCheckpoint(ModelCheckpoint):
+    """ModelCheckpoint that saves `full_model` while only the head is being fitted"""
+
+    def __init__(self, filepath, full_model, **kwargs):
+        super().__init__(filepath, **kwargs)
+        self.full_model = full_model
+
+    def set_model(self, model):
+        super().set_model(self.full_model)
+
+
+def fingerprint(paths, backbone, variants, seed, augmentation):
+    """Hash of everything the cached features depend on"""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f'{path}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+    for weights in backbone.get_weights():
+        digest.update(weights.tobytes())
+    digest.update(json.dumps([variants, seed, augmentation, backbone.input_shape[1:3]], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def extract_features(extractor, dataset, features_path, labels_path, rows, feature_dim):
+    """Run `extractor` over `dataset` and write (features, labels) memmaps of `rows` rows"""
+    features = open_memmap(features_path, mode='w+', dtype=np.float32, shape=(rows, feature_dim))
+    labels = open_memmap(labels_path, mode='w+', dtype=np.int32, shape=(rows,))
+    offset = 0
+    for images, batch_labels in dataset:
+        n = len(images)
+        features[offset:offset + n] = extractor(images, training=False).numpy()
+        labels[offset:offset + n] = np.argmax(batch_labels.numpy(), axis=1)
+        offset += n
+    features.flush()
+    labels.flush()
+    return offset
+
+
+def build_feature_cache(model, cache_dir=DEFAULT_CACHE_DIR, variants=0, augmentation=None, batch_size=32,
+                        seed=42, validation_split=0.2, train_dir='dataset/train', shard_dir=None):
+    """Pooled backbone features for the training and validation subsets.
+
+    `model` is train_model.build_model()'s Sequential. With `variants` = 0 the
+    training images are encoded once, unaugmented; otherwise once per
+    augmented variant. Images are read from `train_dir`, or from
+    pack_dataset.py's shards when `shard_dir` is given. Returns
+    {'train': (features, labels), 'validation': (features, labels)} as
+    read-only memmaps.
+    """
+    backbone, pooling = model.layers[0], model.layers[1]
+    feature_dim = backbone.output_shape[-1]
+    img_size = tuple(backbone.input_shape[1:3])
+
+    if shard_dir:
+        split_dir = os.path.join(shard_dir, 'train')
+        train_groups, train_labels, class_indices = list_shards(split_dir, 'training', validation_split, img_size)
+        val_groups, val_labels, _ = list_shards(split_dir, 'validation', validation_split, img_size)
+        source_files = [os.path.join(split_dir, 'manifest.json')]
+        num_classes = len(class_indices)
+
+        def dataset(split, **kwargs):
+            groups = train_groups if split == 'train' else val_groups
+            return make_shard_dataset(groups, num_classes, batch_size, img_size, **kwargs)
+    else:
+        train_paths, train_labels, class_indices = list_directory(train_dir, 'training', validation_split)
+        val_paths, val_labels, _ = list_directory(train_dir, 'validation', validation_split)
+        source_files = train_paths + val_paths
+        num_classes = len(class_indices)
+
+        def dataset(split, **kwargs):
+            if split == 'train':
+                return make_dataset(train_paths, train_labels, num_classes, batch_size, img_size, **kwargs)
+            return make_dataset(val_paths, val_labels, num_classes, batch_size, img_size, **kwargs)
+
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    key = fingerprint(source_files, backbone, variants, seed, augmentation if variants else None)
+    splits = ('train', 'validation')
+    files = {split: (os.path.join(cache_dir, f'{split}_features.npy'),
+                     os.path.join(cache_dir, f'{split}_labels.npy')) for split in splits}
+
+    cached = False
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            cached = json.load(f).get('fingerprint') == key
+    cached = cached and all(os.path.exists(p) for pair in files.values() for p in pair)
+
+    if cached:
+        print(f"✓ Reusing feature cache in {cache_dir}")
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        extractor = models.Sequential([backbone, pooling])
+        extractor = tf.function(extractor)
+
+        start = time.perf_counter()
+        if variants:
+            passes = [dataset('train', seed=seed + v, batch_augment=BatchAugmentation(**augmentation))
+                      for v in range(variants)]
+        else:
+            passes = [dataset('train')]
+        train_rows = len(train_labels) * len(passes)
+        train_ds = passes[0]
+        for extra in passes[1:]:
+            train_ds = train_ds.concatenate(extra)
+        extract_features(extractor, train_ds, *files['train'], train_rows, feature_dim)
+        extract_features(extractor, dataset('validation'), *files['validation'], len(val_labels), feature_dim)
+        seconds = time.perf_counter() - start
+
+        meta = {
+            'fingerprint': key,
+            'variants': variants,
+            'seed': seed,
+            'feature_dim': int(feature_dim),
+            'train_images': len(train_labels),
+            'train_rows': train_rows,
+            'validation_rows': len(val_labels),
+            'class_indices': class_indices,
+            'extraction_seconds': round(seconds, 1),
+        }
+        # Written last, so an interrupted extraction is never mistaken for a cache
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        print(f"✓ Encoded {train_rows + len(val_labels)} images in {seconds:.1f}s -> {cache_dir}")
+
+    return {split: (np.load(files[split][0], mmap_mode='r'), np.load(files[split][1], mmap_mode='r'))
+            for split in splits}
+
+
+def cached_dataset(features, labels, num_classes, batch_size=32, index=None):
+    """Batches of (features, one-hot labels) gathered from the memmaps.
+
+    `index` is a dataset of row-index batches (default: every row in order).
+    """
+    def gather(index):
+        # Sorted reads are sequential-ish on the memmap; pairs stay aligned
+        index = np.sort(index)
+        return np.asarray(features[index], dtype=np.float32), np.asarray(labels[index], dtype=np.int32)
+
+    def load(index):
+        x, y = tf.numpy_function(gather, [index], (tf.float32, tf.int32))
+        x.set_shape([None, features.shape[1]])
+        y.set_shape([None])
+        return x, tf.one_hot(y, num_classes)
+
+    if index is None:
+        index = tf.data.Dataset.range(len(features)).batch(batch_size)
+    return index.map(load, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+def cached_epoch_datasets(features, labels, num_classes, batch_size=32, seed=42):
+    """Shuffled training batches as a function of the epoch, like data_pipeline.make_epoch_datasets.
+
+    for_epoch(e, skip_batches) draws rows in an order fixed by (seed, e)
+    and drops its first `skip_batches` batches, so training_state can
+    resume mid-epoch. The stream repeats; the caller sets the steps.
+    """
+    def for_epoch(epoch=None, skip_batches=0):
+        index = tf.data.Dataset.range(len(features))
+        index = index.shuffle(len(features), seed=epoch_seed(seed, epoch), reshuffle_each_iteration=True).repeat()
+        # Skipped as indices, before any features are read
+        return cached_dataset(features, labels, num_classes, index=index.batch(batch_size).skip(skip_batches))
+    return for_epoch
+
+
+def head_model(model):
+    """The layers after pooling as a model over 1280-d features, sharing weights with `model`"""
+    feature_dim = model.layers[0].output_shape[-1]
+    return models.Sequential([layers.InputLayer(input_shape=(feature_dim,))] + model.layers[2:])
+
+
+def head_training(model, cache, batch_size=32, seed=42, images_per_epoch=None):
+    """Compile the head like `model` for fitting on the cache with training_state.fit_resumable.
+
+    Returns (head, train_epoch, steps_per_epoch, validation_data). An epoch
+    covers `images_per_epoch` training rows (default: one row per image),
+    drawn at random from all augmented variants.
+    """
+    head = head_model(model)
+    head.compile(
+        optimizer=type(model.optimizer).from_config(model.optimizer.get_config()),
+        loss=model.loss,
+        metrics=['accuracy']
+    )
+
+    train_features, train_labels = cache['train']
+    val_features, val_labels = cache['validation']
+    num_classes = model.output_shape[-1]
+    images_per_epoch = images_per_epoch or len(train_features)
+
+    train_epoch = cached_epoch_datasets(train_features, train_labels, num_classes, batch_size, seed)
+    validation_data = cached_dataset(val_features, val_labels, num_classes, batch_size)
+    return head, train_epoch, -(-images_per_epoch // batch_size), validation_data
@@ -0,0 +1,101 @@
+"""Run data-parallel training with N worker processes on this machine.
+
+Every worker is a train_model.py process in MultiWorkerMirroredStrategy
+mode, told about the others through TF_CONFIG on free localhost ports. The
+cores are split evenly between the workers. Worker 0 (the chief) prints to
+this terminal and writes the models; the others log to models/worker-<i>.log.
+Arguments after the launcher's own are passed on to every worker.
+
+On more than one machine, run train_model.py on each with the same
+--worker-hosts list and its own --worker-index (or a TF_CONFIG).
+
+Usage:
+    python launch_distributed.py --workers 4 [train_model.py arguments...]
+    python launch_distributed.py --workers 2 --shards dataset/packed --seed 7
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+
+def free_ports(count):
+    """`count` distinct ports that are free on localhost right now"""
+    sockets = []
+    for _ in range(count):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('localhost', 0))
+        sockets.append(s)
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes (default 2)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='TensorFlow threads per worker (default: CPU count / workers)')
+    parser.add_argument('--script', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_model.py'),
+                        help='training script to run (default train_model.py)')
+    args, train_args = parser.parse_known_args()
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    hosts = [f'localhost:{port}' for port in free_ports(args.workers)]
+
+    print("=" * 60)
+    print(f"KrishiMitra Distributed Training: {args.workers} workers x {threads} threads")
+    print("=" * 60)
+
+    os.makedirs('models', exist_ok=True)
+    processes, logs = [], []
+    for index in range(args.workers):
+        env = dict(os.environ)
+        env['TF_CONFIG'] = json.dumps({'cluster': {'worker': hosts}, 'task': {'type': 'worker', 'index': index}})
+        env['OMP_NUM_THREADS'] = str(threads)
+        env['TF_NUM_INTEROP_THREADS'] = '2'
+        stdout = None
+        if index > 0:
+            log_path = os.path.join('models', f'worker-{index}.log')
+            stdout = open(log_path, 'w')
+            logs.append(stdout)
+            print(f"Worker {index}: logging to {log_path}")
+        command = [sys.executable, args.script, '--distributed', '--intra-op-threads', str(threads)] + train_args
+        processes.append(subprocess.Popen(command, env=env, stdout=stdout, stderr=subprocess.STDOUT if stdout else None))
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signum)
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    # A worker that dies leaves the others blocked in a collective: stop them too
+    status = 0
+    running = list(processes)
+    while running:
+        for process in list(running):
+            code = process.poll()
+            if code is None:
+                continue
+            running.remove(process)
+            if code != 0:
+                status = status or code
+                print(f"❌ Worker {processes.index(process)} exited with status {code}")
+                forward(signal.SIGTERM, None)
+        time.sleep(0.5)
+    for log in logs:
+        log.close()
+
+    if status == 0:
+        print("\n✓ Distributed Training Complete!")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Pack dataset/train and dataset/test into shards of decoded 224x224 (or --img-size) uint8 images.
+
+Every image is decoded and resized once (nearest-neighbour, exactly as
+flow_from_directory loads it) and written to raw .npy shards that training
+and evaluation read sequentially instead of decoding JPEGs every epoch:
+
+    dataset/packed/<split>/shard-00000.npy   (n, 224, 224, 3) uint8
+    dataset/packed/<split>/manifest.json     class_indices and, per image in
+                                             flow_from_directory order:
+                                             [path, size, mtime_ns, label, shard, row]
+
+Images are assigned to shards in a seeded random order, so every shard is a
+mix of classes and a shuffled epoch can read whole shards. Shards are built in
+a process pool, one shard per task.
+
+Re-running is incremental: images whose path, size and modification time are
+unchanged keep their rows, new or modified images go into new shards, and
+shards with no remaining images are deleted. --rebuild repacks from scratch,
+as does packing at a different --img-size; pack each resolution into its
+own --output to keep them side by side.
+
+Usage:
+    python pack_dataset.py [--output dataset/packed] [--shard-size 1024] [--workers 4] [--rebuild]
+    python pack_dataset.py --img-size 160 --output dataset/packed-160
+    python train_model.py --shards dataset/packed
+    python evaluate_model.py --shards dataset/packed
+"""
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from PIL import Image
+
+from data_pipeline import IMG_SIZE, list_directory
+
+SPLITS = {'train': 'dataset/train', 'test': 'dataset/test'}
+OUTPUT_DIR = 'dataset/packed'
+# ~150 MB of pixels per shard at 224x224
+SHARD_SIZE = 1024
+SEED = 42
+
+
+def load_pixels(path, img_size=IMG_SIZE):
+    """uint8 (H, W, 3) as keras.preprocessing.image.load_img(target_size=...) produces it"""
+    with Image.open(path) as img:
+        img = img.convert('RGB')
+        if img.size != (img_size[1], img_size[0]):
+            img = img.resize((img_size[1], img_size[0]), Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def write_shard(task):
+    """Worker: decode `paths` into shard file `shard_path`; returns (shard name, failed paths)"""
+    shard_path, paths, img_size = task
+    tmp_path = shard_path + '.tmp.npy'
+    pixels = open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(len(paths), *img_size, 3))
+    failed = []
+    for row, path in enumerate(paths):
+        try:
+            pixels[row] = load_pixels(path, img_size)
+        except (OSError, ValueError):
+            # Unreadable image: its row stays black and is never referenced
+            failed.append(path)
+    pixels.flush()
+    del pixels
+    os.replace(tmp_path, shard_path)
+    return os.path.basename(shard_path), failed
+
+
+def pack_split(source_dir, split_dir, shard_size=SHARD_SIZE, workers=None, rebuild=False, seed=SEED,
+               img_size=IMG_SIZE):
+    """Pack (or update) one split; returns a summary dict"""
+    paths, labels, class_indices = list_directory(source_dir)
+    os.makedirs(split_dir, exist_ok=True)
+    manifest_path = os.path.join(split_dir, 'manifest.json')
+
+    previous = {}
+    if os.path.exists(manifest_path) and not rebuild:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if tuple(manifest['img_size']) == tuple(img_size):
+            previous = {entry[0]: entry for entry in manifest['images']}
+
+    # Reuse rows of unchanged images
+    entries, pending = [], []
+    for path, label in zip(paths, labels):
+        rel = os.path.relpath(path, source_dir)
+        stat = os.stat(path)
+        old = previous.get(rel)
+        if old and old[1] == stat.st_size and old[2] == stat.st_mtime_ns:
+            entries.append([rel, stat.st_size, stat.st_mtime_ns, int(label), old[4], old[5]])
+        else:
+            entries.append([rel, stat.st_size, stat.st_mtime_ns, int(label), None, None])
+            pending.append(len(entries) - 1)
+
+    # New images, in a seeded random order, into new shards
+    existing = [f for f in os.listdir(split_dir) if f.startswith('shard-') and f.endswith('.npy')]
+    next_shard = 1 + max((int(f[6:11]) for f in existing if f[6:11].isdigit()), default=-1)
+    order = np.random.default_rng(seed + next_shard).permutation(len(pending))
+    tasks = []
+    for start in range(0, len(order), shard_size):
+        shard = f'shard-{next_shard + start // shard_size:05d}.npy'
+        chunk = [pending[i] for i in order[start:start + shard_size]]
+        for row, index in enumerate(chunk):
+            entries[index][4:] = [shard, row]
+        tasks.append((os.path.join(split_dir, shard), [paths[i] for i in chunk], img_size))
+
+    failed = []
+    if tasks:
+        with Pool(min(workers or os.cpu_count() or 1, len(tasks))) as pool:
+            for done, (shard, shard_failed) in enumerate(pool.imap_unordered(write_shard, tasks), 1):
+                failed.extend(shard_failed)
+                print(f"  [{done}/{len(tasks)}] {shard}")
+    if failed:
+        failed_rel = {os.path.relpath(p, source_dir) for p in failed}
+        entries = [e for e in entries if e[0] not in failed_rel]
+
+    shard_sizes = {}
+    for entry in entries:
+        shard_sizes[entry[4]] = shard_sizes.get(entry[4], 0) + 1
+    manifest = {
+        'img_size': list(img_size),
+        'source': source_dir,
+        'class_indices': class_indices,
+        'shards': {shard: int(np.load(os.path.join(split_dir, shard), mmap_mode='r').shape[0])
+                   for shard in sorted(shard_sizes)},
+        'images': entries,
+    }
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    # Only after the new manifest is in place: drop shards nothing refers to
+    removed = 0
+    for f in os.listdir(split_dir):
+        if f.startswith('shard-') and f.endswith('.npy') and f not in shard_sizes:
+            os.remove(os.path.join(split_dir, f))
+            removed += 1
+
+    total_rows = sum(manifest['shards'].values())
+    return {
+        'images': len(entries),
+        'packed': len(pending) - len(failed),
+        'reused': len(entries) - (len(pending) - len(failed)),
+        'failed': failed,
+        'shards': len(manifest['shards']),
+        'removed_shards': removed,
+        'unused_rows': total_rows - len(entries),
+        'size_mb': total_rows * int(np.prod(img_size)) * 3 / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--splits', nargs='+', choices=list(SPLITS), default=list(SPLITS))
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='images per shard (default 1024)')
+    parser.add_argument('--workers', type=int, default=None, help='packing processes (default: CPU count)')
+    parser.add_argument('--rebuild', action='store_true', help='ignore existing shards and repack everything')
+    parser.add_argument('--seed', type=int, default=SEED, help='shard assignment seed (default 42)')
+    parser.add_argument('--img-size', type=int, default=IMG_SIZE[0],
+                        help=f'square image size to pack at (default {IMG_SIZE[0]})')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("KrishiMitra Dataset Packing")
+    print("=" * 60)
+
+    for split in args.splits:
+        source_dir = SPLITS[split]
+        if not os.path.isdir(source_dir):
+            print(f"\n❌ Error: Source path not found: {source_dir}")
+            exit(1)
+
+        print(f"\n=== Packing {source_dir} ===")
+        start = time.perf_counter()
+        summary = pack_split(source_dir, os.path.join(args.output, split), args.shard_size, args.workers,
+                             args.rebuild, args.seed, (args.img_size, args.img_size))
+        print(f"✓ {summary['images']} images in {summary['shards']} shards ({summary['size_mb']:.0f} MB), "
+              f"{summary['packed']} packed, {summary['reused']} reused, {time.perf_counter() - start:.1f}s")
+        if summary['removed_shards']:
+            print(f"  Removed {summary['removed_shards']} shards with no remaining images")
+        if summary['unused_rows']:
+            print(f"  ⚠️  {summary['unused_rows']} rows belong to changed or deleted images; "
+                  f"--rebuild reclaims the space")
+        for path in summary['failed']:
+            print(f"  ⚠️  Could not read {path}")
+
+    print("\n✓ Packing Complete!")
+
+
+if __name__ == '__main__':
+    main()
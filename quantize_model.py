@@ -0,0 +1,188 @@
+"""Full-integer post-training quantization with an accuracy gate.
+
+Calibrates an int8 TFLite model on a representative sample of dataset/train,
+re-runs the evaluate_model.py metrics on dataset/test for both the float and
+the quantized model, and only writes the int8 model if top-1 accuracy drops
+by no more than --max-accuracy-drop.
+
+Usage:
+    python quantize_model.py [--calibration-samples 300] [--max-accuracy-drop 0.01]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+
+from evaluate_model import compute_metrics, load_test_generator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from inference import TFLiteBackend, metadata_path, read_metadata, write_metadata  # noqa: E402
+
+MODEL_PATH = 'models/crop_disease_model.h5'
+OUTPUT_PATH = 'models/crop_disease_model_int8.tflite'
+REPORT_PATH = 'models/quantization_report.txt'
+TRAIN_DIR = 'dataset/train'
+IMG_SIZE = (224, 224)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def representative_files(train_dir, num_samples, seed=42):
+    """Pick calibration images evenly across classes so no disease is left out of the ranges"""
+    classes = sorted(d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d)))
+    per_class = max(num_samples // len(classes), 1)
+    rng = random.Random(seed)
+
+    files = []
+    for class_name in classes:
+        class_dir = os.path.join(train_dir, class_name)
+        images = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for fname in rng.sample(images, min(per_class, len(images))):
+            files.append(os.path.join(class_dir, fname))
+    return files
+
+
+def representative_dataset(files, img_size=IMG_SIZE):
+    """Calibration generator, preprocessed the same way as training (resize + rescale)"""
+    def generator():
+        for path in files:
+            img = tf.keras.utils.load_img(path, target_size=img_size)
+            array = tf.keras.utils.img_to_array(img) / 255.0
+            yield [np.expand_dims(array, axis=0).astype(np.float32)]
+    return generator
+
+
+def convert_float(model):
+    return tf.lite.TFLiteConverter.from_keras_model(model).convert()
+
+
+def convert_int8(model, calibration_files):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(calibration_files, model.input_shape[1:3])
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+
+def evaluate_both(model, int8_backend):
+    """Run the float and int8 model over the same test batches; returns (y_true, float_pred, int8_pred)"""
+    test_generator = load_test_generator(batch_size=32, img_size=model.input_shape[1:3])
+    float_pred, int8_pred = [], []
+    for i in range(len(test_generator)):
+        images, _ = test_generator[i]
+        float_pred.append(np.argmax(model(images, training=False).numpy(), axis=1))
+        int8_pred.append(np.argmax(int8_backend.infer(images), axis=1))
+    return test_generator.classes, np.concatenate(float_pred), np.concatenate(int8_pred)
+
+
+def median_latency_ms(fn, runs, img_size=IMG_SIZE):
+    """Median single-image latency after one untimed call"""
+    image = np.random.rand(1, img_size[0], img_size[1], 3).astype(np.float32)
+    fn(image)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(image)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calibration-samples', type=int, default=300)
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help='largest allowed top-1 accuracy drop, as a fraction (default 0.01 = 1 point)')
+    parser.add_argument('--latency-runs', type=int, default=50)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    print("=== Loading Model ===")
+    model = load_model(MODEL_PATH)
+    class_names = sorted(os.listdir(TRAIN_DIR))
+    class_names = [c for c in class_names if os.path.isdir(os.path.join(TRAIN_DIR, c))]
+
+    print(f"\n=== Calibrating on {args.calibration_samples} Training Images ===")
+    calibration_files = representative_files(TRAIN_DIR, args.calibration_samples)
+    int8_model = convert_int8(model, calibration_files)
+    float_tflite = convert_float(model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        int8_path = os.path.join(tmp, 'int8.tflite')
+        float_path = os.path.join(tmp, 'float.tflite')
+        with open(int8_path, 'wb') as f:
+            f.write(int8_model)
+        with open(float_path, 'wb') as f:
+            f.write(float_tflite)
+
+        int8_backend = TFLiteBackend(int8_path)
+        float_backend = TFLiteBackend(float_path)
+
+        print("\n=== Evaluating Float and Int8 Models ===")
+        y_true, float_pred, int8_pred = evaluate_both(model, int8_backend)
+
+        print("\n=== Measuring Latency ===")
+        img_size = model.input_shape[1:3]
+        keras_latency = median_latency_ms(lambda x: model(x, training=False), args.latency_runs, img_size)
+        float_latency = median_latency_ms(float_backend.infer, args.latency_runs, img_size)
+        int8_latency = median_latency_ms(int8_backend.infer, args.latency_runs, img_size)
+
+    float_report, _, float_class_acc = compute_metrics(y_true, float_pred, class_names)
+    int8_report, _, int8_class_acc = compute_metrics(y_true, int8_pred, class_names)
+    float_acc = float(np.mean(float_pred == y_true))
+    int8_acc = float(np.mean(int8_pred == y_true))
+    drop = float_acc - int8_acc
+
+    lines = []
+    lines.append("=== Size ===")
+    lines.append(f"Keras float32 (.h5):   {os.path.getsize(MODEL_PATH) / (1024 * 1024):8.2f} MB")
+    lines.append(f"TFLite float32:        {len(float_tflite) / (1024 * 1024):8.2f} MB")
+    lines.append(f"TFLite int8:           {len(int8_model) / (1024 * 1024):8.2f} MB")
+    lines.append("")
+    lines.append("=== Latency (batch 1, median) ===")
+    lines.append(f"Keras float32:         {keras_latency:8.2f} ms")
+    lines.append(f"TFLite float32:        {float_latency:8.2f} ms")
+    lines.append(f"TFLite int8:           {int8_latency:8.2f} ms")
+    lines.append("")
+    lines.append("=== Top-1 Accuracy ===")
+    lines.append(f"Float32: {float_acc * 100:.2f}%")
+    lines.append(f"Int8:    {int8_acc * 100:.2f}%")
+    lines.append(f"Drop:    {drop * 100:.2f} points (limit {args.max_accuracy_drop * 100:.2f})")
+    lines.append("")
+    lines.append("=== Per-Class Accuracy ===")
+    lines.append(f"{'Class Name':<50} {'Float':>8} {'Int8':>8} {'Delta':>8}")
+    for name, f_acc, q_acc in zip(class_names, float_class_acc, int8_class_acc):
+        lines.append(f"{name:<50} {f_acc * 100:>7.2f}% {q_acc * 100:>7.2f}% {(q_acc - f_acc) * 100:>+7.2f}")
+    lines.append("")
+    lines.append("=== Int8 Classification Report ===")
+    lines.append(int8_report)
+    lines.append("=== Float32 Classification Report ===")
+    lines.append(float_report)
+    report = "\n".join(lines)
+
+    print("\n" + report)
+    with open(REPORT_PATH, 'w') as f:
+        f.write(report)
+    print(f"Report saved as '{REPORT_PATH}'")
+
+    if drop > args.max_accuracy_drop:
+        print(f"\n❌ Refusing to export: accuracy dropped {drop * 100:.2f} points "
+              f"(limit {args.max_accuracy_drop * 100:.2f})")
+        sys.exit(1)
+
+    with open(args.output, 'wb') as f:
+        f.write(int8_model)
+    write_metadata(args.output, {**read_metadata(MODEL_PATH), 'input_size': model.input_shape[1],
+                                 'test_accuracy': int8_acc, 'quantization': 'int8'})
+    print(f"\n✓ Int8 model saved as '{args.output}' (metadata in '{metadata_path(args.output)}')")
+    print("Serve it with INFERENCE_BACKEND=tflite MODEL_PATH=" + args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""Hyperparameter sweep of train_model.py with successive halving.
+
+Trials are drawn from a search space, either the full grid or --trials
+random samples, and run as train_model.py processes, --parallel at a
+time, with the CPU threads split evenly between them. Each trial writes
+to its own <sweep dir>/trial-NNN/.
+
+Successive halving: all trials first train for --min-epochs epochs. Only
+the best 1/--eta by validation accuracy are resumed (train_model.py
+--resume) for --eta times as many epochs, and so on up to --epochs. Trials
+that early-stop are not trained further but keep competing with their
+result.
+
+The search space is JSON, mapping train_model.py options (without the
+dashes) to a list of values, or for random search to a range:
+
+    {"learning_rate": {"min": 0.0001, "max": 0.01, "log": true},
+     "dense_units": [[256, 128], [512, 256], [256]],
+     "dropout": [0.2, 0.3, 0.5],
+     "batch_size": [32, 64]}
+
+A single dropout rate is used before every Dense layer. Every rung updates
+<sweep dir>/leaderboard.csv, ranked by rung reached and then validation
+accuracy, with test accuracy, model size and inference latency. Arguments
+after the sweep's own are passed on to every trial. Re-running an
+interrupted sweep with the same options resumes its trials.
+
+Usage:
+    python sweep.py [--space space.json] [--mode random --trials 12] [--parallel 2] [--min-epochs 2] [--eta 3]
+    python sweep.py --mode grid --shards dataset/packed
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from train_model import EPOCHS, SEED
+
+SWEEP_DIR = 'models/sweep'
+SPACE = {
+    'learning_rate': [0.0003, 0.001, 0.003],
+    'dense_units': [[256, 128], [512, 256], [256]],
+    'dropout': [0.2, 0.3, 0.5],
+    'batch_size': [32, 64],
+}
+LEADERBOARD_METRICS = ['best_val_accuracy', 'test_accuracy', 'params', 'model_size_mb', 'latency_ms']
+
+
+def grid(space):
+    """Every combination of the listed values"""
+    keys = sorted(space)
+    for values in space.values():
+        if not isinstance(values, list):
+            raise ValueError('grid search needs a list of values for every option')
+    return [dict(zip(keys, combination)) for combination in itertools.product(*(space[k] for k in keys))]
+
+
+def sample(space, trials, seed=SEED):
+    """`trials` random draws; a {'min', 'max', 'log'} range is sampled uniformly (in log space if 'log')"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(trials):
+        params = {}
+        for key in sorted(space):
+            values = space[key]
+            if isinstance(values, list):
+                params[key] = rng.choice(values)
+            elif values.get('log'):
+                params[key] = math.exp(rng.uniform(math.log(values['min']), math.log(values['max'])))
+            else:
+                params[key] = rng.uniform(values['min'], values['max'])
+            if isinstance(values, dict) and isinstance(values['min'], int) and isinstance(values['max'], int):
+                params[key] = round(params[key])
+        samples.append(params)
+    return samples
+
+
+def trial_args(params):
+    """train_model.py options for a trial's hyperparameters"""
+    args = []
+    for key, value in sorted(params.items()):
+        if key == 'dropout' and not isinstance(value, list):
+            # One rate before every Dense layer
+            value = [value] * (len(params.get('dense_units', [0, 0])) + 1)
+        if isinstance(value, list):
+            value = ','.join(str(v) for v in value)
+        args += [f"--{key.replace('_', '-')}", f'{value:g}' if isinstance(value, float) else str(value)]
+    return args
+
+
+def rungs(min_epochs, max_epochs, eta):
+    """Epoch budgets of the successive-halving rungs"""
+    epochs = [min(min_epochs, max_epochs)]
+    while epochs[-1] < max_epochs:
+        epochs.append(min(epochs[-1] * eta, max_epochs))
+    return epochs
+
+
+def run_trial(trial, epochs, script, threads, seed, extra_args):
+    """Train (or resume) `trial` up to `epochs` epochs; updates and returns it"""
+    directory = trial['dir']
+    metrics_path = os.path.join(directory, 'metrics.json')
+    command = [sys.executable, script, '--output-dir', directory, '--resume', '--epochs', str(epochs),
+               '--metrics-out', metrics_path, '--seed', str(seed), '--intra-op-threads', str(threads)]
+    command += trial_args(trial['params']) + extra_args
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+
+    start = time.perf_counter()
+    with open(os.path.join(directory, 'train.log'), 'a') as log:
+        code = subprocess.call(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    trial['seconds'] += time.perf_counter() - start
+    trial['rung_epochs'] = epochs
+    if code != 0 or not os.path.exists(metrics_path):
+        trial['status'] = f'failed ({code})'
+        return trial
+    with open(metrics_path, 'r') as f:
+        trial['metrics'] = json.load(f)
+    os.remove(metrics_path)
+    if trial['metrics']['stopped_early']:
+        trial['status'] = 'stopped early'
+    return trial
+
+
+def write_leaderboard(trials, path):
+    """Trials ranked by rung reached, then validation accuracy; returns them in that order"""
+    def key(trial):
+        return (not trial['status'].startswith('failed'), trial['rung_epochs'],
+                trial['metrics'].get('best_val_accuracy') or 0.0)
+    ranked = sorted(trials, key=key, reverse=True)
+    params = sorted({key for trial in trials for key in trial['params']})
+    with open(path + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'trial', 'status', 'rung_epochs', 'epochs_trained'] + LEADERBOARD_METRICS
+                        + ['seconds'] + params)
+        for rank, trial in enumerate(ranked, 1):
+            metrics = trial['metrics']
+            writer.writerow([rank, trial['name'], trial['status'], trial['rung_epochs'], metrics.get('epochs_trained')]
+                            + [metrics.get(m) for m in LEADERBOARD_METRICS] + [round(trial['seconds'], 1)]
+                            + [json.dumps(trial['params'].get(p)) for p in params])
+    os.replace(path + '.tmp', path)
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--space', default=None, help='search space JSON file (default: the built-in space)')
+    parser.add_argument('--mode', choices=['grid', 'random'], default='random')
+    parser.add_argument('--trials', type=int, default=12, help='random search only: number of trials (default 12)')
+    parser.add_argument('--parallel', type=int, default=2, help='trials trained at the same time (default 2)')
+    parser.add_argument('--min-epochs', type=int, default=2, help='epochs of the first rung (default 2)')
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help=f'epochs of the last rung (default {EPOCHS})')
+    parser.add_argument('--eta', type=int, default=3, help='keep the best 1/eta trials at every rung (default 3)')
+    parser.add_argument('--output', default=SWEEP_DIR, help=f'sweep directory (default {SWEEP_DIR})')
+    parser.add_argument('--seed', type=int, default=SEED, help='trial seed and random search seed (default 42)')
+    parser.add_argument('--script', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_model.py'),
+                        help='training script to run (default train_model.py)')
+    args, extra_args = parser.parse_known_args()
+    if args.eta < 2:
+        parser.error('--eta must be at least 2')
+
+    space = SPACE
+    if args.space:
+        with open(args.space, 'r') as f:
+            space = json.load(f)
+    try:
+        candidates = grid(space) if args.mode == 'grid' else sample(space, args.trials, args.seed)
+    except (ValueError, KeyError) as e:
+        parser.error(f'invalid search space: {e}')
+
+    threads = max(1, (os.cpu_count() or 1) // args.parallel)
+    schedule = rungs(args.min_epochs, args.epochs, args.eta)
+    leaderboard_path = os.path.join(args.output, 'leaderboard.csv')
+
+    print("=" * 60)
+    print(f"KrishiMitra Hyperparameter Sweep: {len(candidates)} trials ({args.mode}), "
+          f"{args.parallel} parallel x {threads} threads")
+    print(f"Rungs (epochs): {schedule}")
+    print("=" * 60)
+
+    trials = []
+    for i, params in enumerate(candidates):
+        name = f'trial-{i:03d}'
+        directory = os.path.join(args.output, name)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'params.json'), 'w') as f:
+            json.dump(params, f, indent=2)
+        trials.append({'name': name, 'dir': directory, 'params': params, 'status': 'running',
+                       'rung_epochs': 0, 'metrics': {}, 'seconds': 0.0})
+
+    active = trials
+    for level, epochs in enumerate(schedule):
+        # Early-stopped trials keep their result without further training
+        to_run = [t for t in active if t['status'] == 'running']
+        for trial in active:
+            trial['rung_epochs'] = epochs
+        print(f"\n=== Rung {level + 1}/{len(schedule)}: {len(active)} trials, {epochs} epochs ===")
+        with ThreadPoolExecutor(args.parallel) as pool:
+            futures = [pool.submit(run_trial, t, epochs, args.script, threads, args.seed, extra_args) for t in to_run]
+            for future in futures:
+                trial = future.result()
+                accuracy = trial['metrics'].get('best_val_accuracy')
+                result = f"val_accuracy {accuracy:.4f}" if accuracy is not None else trial['status']
+                print(f"  {trial['name']} {json.dumps(trial['params'])}: {result} ({trial['seconds']:.0f}s)")
+        ranked = write_leaderboard(trials, leaderboard_path)
+
+        survivors = [t for t in ranked if t in active and not t['status'].startswith('failed')]
+        if level + 1 < len(schedule):
+            keep = max(1, math.ceil(len(survivors) / args.eta))
+            for trial in survivors[keep:]:
+                trial['status'] = f'halted after {epochs} epochs'
+            active = survivors[:keep]
+
+    for trial in active:
+        if trial['status'] == 'running':
+            trial['status'] = 'finished'
+    ranked = write_leaderboard(trials, leaderboard_path)
+
+    print("\n" + "=" * 60)
+    print("Leaderboard")
+    print("=" * 60)
+    header = f"{'Trial':<11}{'Epochs':>7}{'Val acc':>9}{'Test acc':>9}{'Size MB':>9}{'Latency':>10}  Status"
+    print(header)
+    print("-" * len(header))
+    for trial in ranked[:10]:
+        m = trial['metrics']
+        if not m:
+            print(f"{trial['name']:<11}{'':>44}  {trial['status']}")
+            continue
+        print(f"{trial['name']:<11}{m['epochs_trained']:>7}{m['best_val_accuracy']:>9.4f}{m['test_accuracy']:>9.4f}"
+              f"{m['model_size_mb']:>9.1f}{m['latency_ms']:>8.1f}ms  {trial['status']}")
+    best = ranked[0]
+    print(f"\nBest: {best['name']} {json.dumps(best['params'])}")
+    print(f"Leaderboard written to {leaderboard_path}")
+    print("\n✓ Sweep Complete!")
+
+
+if __name__ == '__main__':
+    main()
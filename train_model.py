@@ -1,178 +1,587 @@
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
 import tensorflow as tf
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras import layers, models
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
+from tensorflow.keras.callbacks import Callback, ModelCheckpoint
 import matplotlib.pyplot as plt
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from inference import write_metadata  # noqa: E402
+
+from training_state import ResumableEarlyStopping, TrainingPreempted, TrainingState, fit_resumable
+
 # Configuration
 IMG_SIZE = (224, 224)
+# Input sizes MobileNetV2 has ImageNet weights for
+IMG_SIZES = (96, 128, 160, 192, 224)
 BATCH_SIZE = 32
 EPOCHS = 20
+LEARNING_RATE = 0.001
+# Classifier head: hidden Dense sizes, and the dropout before each Dense layer
+DENSE_UNITS = (256, 128)
+DROPOUT = (0.3, 0.3, 0.2)
+VALIDATION_SPLIT = 0.2
+SEED = 42
 
-print("TensorFlow version:", tf.__version__)
-print("GPU available:", tf.config.list_physical_devices('GPU'))
-
-# Step 1: Create Data Generators
-print("\n=== Step 1: Creating Data Generators ===")
-
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
+# Training-time augmentation (ImageDataGenerator arguments)
+TRAIN_AUGMENTATION = dict(
     rotation_range=20,
     width_shift_range=0.2,
     height_shift_range=0.2,
     shear_range=0.2,
     zoom_range=0.2,
     horizontal_flip=True,
-    fill_mode='nearest',
-    validation_split=0.2  # 20% for validation
+    fill_mode='nearest'
 )
 
-test_datagen = ImageDataGenerator(rescale=1./255)
 
-# Load training data
-train_generator = train_datagen.flow_from_directory(
-    'dataset/train',
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='training'
-)
+def create_generators(batch_size=BATCH_SIZE, img_size=IMG_SIZE):
+    """Augmented training generator and unaugmented, unshuffled validation/test generators"""
+    train_datagen = ImageDataGenerator(
+        rescale=1./255,
+        validation_split=VALIDATION_SPLIT,  # 20% for validation
+        **TRAIN_AUGMENTATION
+    )
 
-# Load validation data
-validation_generator = train_datagen.flow_from_directory(
-    'dataset/train',
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    subset='validation'
-)
+    # Same validation_split subset, without augmentation
+    val_datagen = ImageDataGenerator(
+        rescale=1./255,
+        validation_split=VALIDATION_SPLIT
+    )
 
-# Load test data
-test_generator = test_datagen.flow_from_directory(
-    'dataset/test',
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical',
-    shuffle=False
-)
+    test_datagen = ImageDataGenerator(rescale=1./255)
 
-num_classes = len(train_generator.class_indices)
-print(f"\nNumber of disease classes: {num_classes}")
-print(f"Class labels: {list(train_generator.class_indices.keys())}")
-print(f"Training samples: {train_generator.samples}")
-print(f"Validation samples: {validation_generator.samples}")
-print(f"Test samples: {test_generator.samples}")
-
-# Save class indices for later use
-with open('models/class_indices.json', 'w') as f:
-    json.dump(train_generator.class_indices, f)
-
-# Step 2: Build the Model
-print("\n=== Step 2: Building Model ===")
-
-# Load pre-trained MobileNetV2 (without top layers)
-base_model = MobileNetV2(
-    input_shape=(224, 224, 3),
-    include_top=False,
-    weights='imagenet'
-)
+    # Load training data
+    train_generator = train_datagen.flow_from_directory(
+        'dataset/train',
+        target_size=img_size,
+        batch_size=batch_size,
+        class_mode='categorical',
+        subset='training'
+    )
 
-# Freeze the base model
-base_model.trainable = False
-
-# Build complete model
-model = models.Sequential([
-    base_model,
-    layers.GlobalAveragePooling2D(),
-    layers.BatchNormalization(),
-    layers.Dropout(0.3),
-    layers.Dense(256, activation='relu'),
-    layers.BatchNormalization(),
-    layers.Dropout(0.3),
-    layers.Dense(128, activation='relu'),
-    layers.Dropout(0.2),
-    layers.Dense(num_classes, activation='softmax')
-])
-
-# Compile model
-model.compile(
-    optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-    loss='categorical_crossentropy',
-    metrics=['accuracy']
-)
+    # Load validation data
+    validation_generator = val_datagen.flow_from_directory(
+        'dataset/train',
+        target_size=img_size,
+        batch_size=batch_size,
+        class_mode='categorical',
+        subset='validation',
+        shuffle=False
+    )
 
-print("\nModel Summary:")
-model.summary()
+    # Load test data
+    test_generator = test_datagen.flow_from_directory(
+        'dataset/test',
+        target_size=img_size,
+        batch_size=batch_size,
+        class_mode='categorical',
+        shuffle=False
+    )
 
-# Step 3: Train the Model
-print("\n=== Step 3: Training Model ===")
+    return train_generator, validation_generator, test_generator
 
-# Callbacks
-early_stop = EarlyStopping(
-    monitor='val_loss',
-    patience=5,
-    restore_best_weights=True,
-    verbose=1
-)
 
-checkpoint = ModelCheckpoint(
-    'models/best_model.h5',
-    save_best_only=True,
-    monitor='val_accuracy',
-    mode='max',
-    verbose=1
-)
+def build_head(num_classes, dense_units=DENSE_UNITS, dropout=DROPOUT):
+    """Classifier layers on top of the pooled backbone features.
+
+    `dropout` has one rate more than `dense_units`: one before every Dense layer.
+    """
+    head = [
+        layers.GlobalAveragePooling2D(),
+        layers.BatchNormalization(),
+        layers.Dropout(dropout[0])
+    ]
+    for i, units in enumerate(dense_units):
+        head.append(layers.Dense(units, activation='relu'))
+        if i < len(dense_units) - 1:
+            head.append(layers.BatchNormalization())
+        head.append(layers.Dropout(dropout[i + 1]))
+    head.append(layers.Dense(num_classes, activation='softmax'))
+    return head
+
+
+def build_model(num_classes, dense_units=DENSE_UNITS, dropout=DROPOUT, img_size=IMG_SIZE):
+    """Frozen ImageNet MobileNetV2 with the classifier head, taking `img_size` inputs"""
+    # Load pre-trained MobileNetV2 (without top layers)
+    base_model = MobileNetV2(
+        input_shape=(*img_size, 3),
+        include_top=False,
+        weights='imagenet'
+    )
+
+    # Freeze the base model
+    base_model.trainable = False
+
+    # Build complete model
+    return models.Sequential([base_model] + build_head(num_classes, dense_units, dropout))
+
+
+def plot_history(history, path='models/training_history.png'):
+    """Accuracy and loss curves for training and validation"""
+    plt.figure(figsize=(12, 4))
+
+    # Accuracy plot
+    plt.subplot(1, 2, 1)
+    plt.plot(history.history['accuracy'], label='Training Accuracy')
+    plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
+    plt.title('Model Accuracy Over Time')
+    plt.xlabel('Epoch')
+    plt.ylabel('Accuracy')
+    plt.legend()
+    plt.grid(True)
+
+    # Loss plot
+    plt.subplot(1, 2, 2)
+    plt.plot(history.history['loss'], label='Training Loss')
+    plt.plot(history.history['val_loss'], label='Validation Loss')
+    plt.title('Model Loss Over Time')
+    plt.xlabel('Epoch')
+    plt.ylabel('Loss')
+    plt.legend()
+    plt.grid(True)
+
+    plt.tight_layout()
+    plt.savefig(path)
+
+
+def create_inputs(pipeline='tfdata', batch_size=BATCH_SIZE, cache=None, seed=SEED, augment='graph',
+                  per_batch=False, shard_dir=None, validation_cache='memory', num_workers=1, worker_index=0,
+                  img_size=IMG_SIZE):
+    """Training, validation and test inputs from either pipeline.
+
+    The validation subset is decoded once and kept in `validation_cache`
+    ('memory', a file path prefix, or None to re-decode every epoch).
+    With `num_workers` > 1 (tfdata only) the training data is the share of
+    worker `worker_index`, in per-worker batches of `batch_size`.
+    Returns (train, validation, test, info) where info holds class_indices
+    and the sample counts.
+    """
+    if pipeline == 'generator':
+        train_generator, validation_generator, test_generator = create_generators(batch_size, img_size)
+        info = {
+            'class_indices': train_generator.class_indices,
+            'train_samples': train_generator.samples,
+            'validation_samples': validation_generator.samples,
+            'test_samples': test_generator.samples,
+            # The iterator's order is not seeded per epoch: only whole epochs can be resumed
+            'train_epoch': lambda epoch=None, skip_batches=0: train_generator,
+        }
+        validation_data = validation_generator
+        if validation_cache:
+            from data_pipeline import cache_iterator
+            start = time.perf_counter()
+            validation_data = cache_iterator(validation_generator, validation_cache)
+            print(f"Decoded {validation_generator.samples} validation images once in "
+                  f"{time.perf_counter() - start:.1f}s")
+        return train_generator, validation_data, test_generator, info
+
+    from data_pipeline import create_datasets
+    return create_datasets(
+        batch_size=batch_size,
+        validation_split=VALIDATION_SPLIT,
+        augmentation=TRAIN_AUGMENTATION,
+        cache=cache,
+        seed=seed,
+        augment_mode=augment,
+        per_batch=per_batch,
+        shard_dir=shard_dir,
+        validation_cache=validation_cache,
+        num_workers=num_workers,
+        worker_index=worker_index,
+        img_size=img_size
+    )
+
+
+def create_strategy(worker_hosts=None, worker_index=0):
+    """MultiWorkerMirroredStrategy over the cluster in TF_CONFIG, or over `worker_hosts` ('host:port,...').
+
+    Must run before any other TensorFlow op. Returns (strategy, number of
+    workers, this worker's index); worker 0 is the chief.
+    """
+    if worker_hosts:
+        os.environ['TF_CONFIG'] = json.dumps({
+            'cluster': {'worker': worker_hosts.split(',')},
+            'task': {'type': 'worker', 'index': worker_index}
+        })
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    resolver = strategy.cluster_resolver
+    return strategy, resolver.cluster_spec().num_tasks('worker'), resolver.task_id
+
+
+def shard_by_data(dataset):
+    """Let every worker evaluate its share of the batches of `dataset`"""
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    return dataset.with_options(options)
+
+
+def inference_latency_ms(model, runs=50):
+    """Median single-image predict latency after one untimed call"""
+    image = tf.random.uniform((1, *model.input_shape[1:]))
+    model(image, training=False)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model(image, training=False)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+class ThroughputLogger(Callback):
+    """Training images/sec of every epoch, across all workers and excluding validation; logged as images_per_sec"""
+
+    def __init__(self, global_batch_size):
+        super().__init__()
+        self.global_batch_size = global_batch_size
+        self.start = None
+        self.end = None
+        self.steps = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+        self.steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps += 1
+        self.end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self.steps:
+            return
+        rate = self.steps * self.global_batch_size / (self.end - self.start)
+        if logs is not None:
+            logs['images_per_sec'] = rate
+        print(f"Epoch {epoch + 1}: {rate:.1f} training images/s")
+
+
+class ValidationTimer(Callback):
+    """Times the validation pass of every epoch; logged as val_time"""
+
+    def __init__(self):
+        super().__init__()
+        self.start = None
+        self.seconds = None
+
+    def on_test_begin(self, logs=None):
+        self.start = time.perf_counter()
+
+    def on_test_end(self, logs=None):
+        self.seconds = time.perf_counter() - self.start
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.seconds is None:
+            return
+        if logs is not None:
+            logs['val_time'] = self.seconds
+        print(f"Epoch {epoch + 1}: validation took {self.seconds:.2f}s")
+        self.seconds = None
+
+
+def int_list(text):
+    return tuple(int(value) for value in text.split(','))
+
+
+def float_list(text):
+    return tuple(float(value) for value in text.split(','))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the crop disease classifier.')
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help=f'(default {EPOCHS})')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'per worker (default {BATCH_SIZE})')
+    parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE,
+                        help=f'Adam learning rate, per worker (default {LEARNING_RATE:g})')
+    parser.add_argument('--dense-units', type=int_list, default=DENSE_UNITS, metavar='N,N,...',
+                        help=f"hidden Dense layer sizes of the head (default {','.join(map(str, DENSE_UNITS))})")
+    parser.add_argument('--dropout', type=float_list, default=DROPOUT, metavar='R,R,...',
+                        help=f"dropout before each Dense layer, one more than --dense-units "
+                             f"(default {','.join(map(str, DROPOUT))})")
+    parser.add_argument('--img-size', type=int, choices=IMG_SIZES, default=IMG_SIZE[0],
+                        help=f'square input resolution; with --shards, pack at the same size (default {IMG_SIZE[0]})')
+    parser.add_argument('--output-dir', default='models',
+                        help='where the models, class_indices.json and plots are written (default models)')
+    parser.add_argument('--metrics-out', default=None, metavar='PATH',
+                        help='write the final accuracy, model size and inference latency to PATH (JSON)')
+    parser.add_argument('--pipeline', choices=['tfdata', 'generator'], default='tfdata',
+                        help='tf.data input pipeline or the original ImageDataGenerator (default tfdata)')
+    parser.add_argument('--cache', default=None,
+                        help="tfdata only: cache decoded images in 'memory' or at this file path prefix")
+    parser.add_argument('--seed', type=int, default=SEED, help='shuffle and augmentation seed (default 42)')
+    parser.add_argument('--augment', choices=['graph', 'generator'], default='graph',
+                        help='tfdata only: batched in-graph augmentation or per-image random_transform (default graph)')
+    parser.add_argument('--augment-per-batch', action='store_true',
+                        help='graph augmentation only: one random transform per batch instead of per image')
+    parser.add_argument('--val-cache', default='memory',
+                        help="keep the decoded validation images in 'memory', at this file path prefix, "
+                             "or 'none' to decode them every epoch (default memory)")
+    parser.add_argument('--shards', default=None, metavar='DIR',
+                        help='tfdata only: read images packed by pack_dataset.py from DIR instead of dataset/')
+    parser.add_argument('--feature-cache', nargs='?', const='models/feature_cache', default=None, metavar='DIR',
+                        help='encode images with the frozen backbone once and train the head from the cached '
+                             'features (default DIR models/feature_cache)')
+    parser.add_argument('--cache-variants', type=int, default=0, metavar='K',
+                        help='feature cache only: encode K augmented variants of each training image '
+                             '(default 0: one unaugmented pass)')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='where resumable training checkpoints are written (default <output-dir>/training_state)')
+    parser.add_argument('--checkpoint-every', type=int, default=None, metavar='N',
+                        help='also checkpoint every N training steps, not just at epoch ends '
+                             '(default 200 with tfdata, 0 = off)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the last checkpoint in --checkpoint-dir')
+    parser.add_argument('--distributed', action='store_true',
+                        help='data-parallel training with MultiWorkerMirroredStrategy over the cluster in '
+                             'TF_CONFIG or --worker-hosts (implied by either; see launch_distributed.py)')
+    parser.add_argument('--worker-hosts', default=None, metavar='HOST:PORT,...',
+                        help='distributed only: addresses of all workers, instead of TF_CONFIG')
+    parser.add_argument('--worker-index', type=int, default=0,
+                        help='distributed only: this worker\'s position in --worker-hosts (0 is the chief)')
+    parser.add_argument('--intra-op-threads', type=int, default=0, metavar='N',
+                        help='threads per TensorFlow op (default 0: all cores)')
+    parser.add_argument('--profile', nargs='?', const='models/profile.jsonl', default=None, metavar='PATH',
+                        help='log per-step input wait / compute time and resource usage to PATH (JSONL) and '
+                             'print whether each epoch is input- or compute-bound (default PATH models/profile.jsonl)')
+    parser.add_argument('--profile-trace', default=None, metavar='FIRST:LAST',
+                        help='also write a TensorBoard profiler trace of global steps FIRST..LAST '
+                             'to models/profile_trace')
+    args = parser.parse_args()
+    if args.shards and args.pipeline != 'tfdata':
+        parser.error('--shards requires --pipeline tfdata')
+    if len(args.dropout) != len(args.dense_units) + 1:
+        parser.error('--dropout needs one rate more than --dense-units')
+    args.checkpoint_dir = args.checkpoint_dir or os.path.join(args.output_dir, 'training_state')
+    if args.profile_trace:
+        try:
+            args.profile_trace = tuple(int(step) for step in args.profile_trace.split(':'))
+        except ValueError:
+            args.profile_trace = ()
+        if len(args.profile_trace) != 2 or not 0 <= args.profile_trace[0] <= args.profile_trace[1]:
+            parser.error('--profile-trace expects FIRST:LAST steps, e.g. 10:20')
+        args.profile = args.profile or 'models/profile.jsonl'
+    args.distributed = args.distributed or bool(args.worker_hosts) or 'TF_CONFIG' in os.environ
+    if args.distributed and args.pipeline != 'tfdata':
+        parser.error('--distributed requires --pipeline tfdata')
+    if args.distributed and args.feature_cache:
+        parser.error('--feature-cache cannot be combined with --distributed')
+    if args.pipeline == 'generator':
+        if args.checkpoint_every:
+            print("⚠️  The generator pipeline can only resume at epoch boundaries; checkpointing at epoch ends only")
+        args.checkpoint_every = 0
+    elif args.checkpoint_every is None:
+        args.checkpoint_every = 200
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(args.intra_op_threads)
+    strategy, num_workers, worker_index = tf.distribute.get_strategy(), 1, 0
+    if args.distributed:
+        strategy, num_workers, worker_index = create_strategy(args.worker_hosts, args.worker_index)
+    chief = worker_index == 0
+    tf.keras.utils.set_random_seed(args.seed)
+    print("TensorFlow version:", tf.__version__)
+    print("GPU available:", tf.config.list_physical_devices('GPU'))
+    if args.distributed:
+        print(f"Distributed: worker {worker_index} of {num_workers}" + (" (chief)" if chief else ""))
+
+    # Every worker trains on batches of --batch-size, so the effective batch and
+    # the learning rate grow with the number of workers
+    batch_size = args.batch_size
+    global_batch_size = batch_size * num_workers
+    learning_rate = args.learning_rate * num_workers
+    img_size = (args.img_size, args.img_size)
+    output_path = lambda name: os.path.join(args.output_dir, name)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Step 1: Create Data Pipelines
+    print(f"\n=== Step 1: Creating Data Pipelines ({args.pipeline}) ===")
+    _, validation_data, test_data, info = create_inputs(
+        args.pipeline,
+        batch_size=batch_size,
+        cache=args.cache,
+        seed=args.seed,
+        augment=args.augment,
+        per_batch=args.augment_per_batch,
+        shard_dir=args.shards,
+        validation_cache=None if args.val_cache == 'none' else args.val_cache,
+        num_workers=num_workers,
+        worker_index=worker_index,
+        img_size=img_size
+    )
+    class_indices = info['class_indices']
+    worker_samples = info.get('worker_samples', info['train_samples'])
+    train_epoch = info['train_epoch']
+    if args.distributed:
+        worker_epoch = train_epoch
+        # Each worker already reads only its own share: no auto-sharding or rebatching
+        train_epoch = lambda epoch=None, skip_batches=0: strategy.distribute_datasets_from_function(
+            lambda context: worker_epoch(epoch, skip_batches))
+        validation_data = shard_by_data(validation_data)
+        test_data = shard_by_data(test_data)
+
+    num_classes = len(class_indices)
+    print(f"\nNumber of disease classes: {num_classes}")
+    print(f"Class labels: {list(class_indices.keys())}")
+    print(f"Training samples: {info['train_samples']}")
+    print(f"Validation samples: {info['validation_samples']}")
+    print(f"Test samples: {info['test_samples']}")
+    if args.distributed:
+        print(f"Per worker: {worker_samples} training images, batch {batch_size} "
+              f"(global batch {global_batch_size}, learning rate {learning_rate:g})")
+
+    # Save class indices for later use
+    if chief:
+        with open(output_path('class_indices.json'), 'w') as f:
+            json.dump(class_indices, f)
+
+    # Step 2: Build the Model
+    print("\n=== Step 2: Building Model ===")
+    with strategy.scope():
+        model = build_model(num_classes, args.dense_units, args.dropout, img_size)
+
+        # Compile model
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+
+    print("\nModel Summary:")
+    model.summary()
+
+    # Step 3: Train the Model
+    print("\n=== Step 3: Training Model ===")
+
+    # Callbacks
+    validation_timer = ValidationTimer()
+    profiler = []
+    if args.profile:
+        from training_profiler import TrainingProfiler
+        profile_path = args.profile
+        if not chief:
+            root, ext = os.path.splitext(profile_path)
+            profile_path = f'{root}-worker-{worker_index}{ext}'
+        profiler = [TrainingProfiler(profile_path, trace_steps=args.profile_trace)]
+        print(f"Profiling training steps to {profile_path}")
+
+    early_stop = ResumableEarlyStopping(
+        monitor='val_loss',
+        patience=5,
+        restore_best_weights=True,
+        verbose=1
+    )
+
+    checkpoint_args = dict(
+        save_best_only=True,
+        monitor='val_accuracy',
+        mode='max',
+        verbose=1
+    )
+
+    # Train
+    if args.feature_cache:
+        from feature_cache import EndToEndCheckpoint, build_feature_cache, head_training
+        cache = build_feature_cache(model, args.feature_cache, variants=args.cache_variants,
+                                    augmentation=TRAIN_AUGMENTATION, batch_size=batch_size, seed=args.seed,
+                                    validation_split=VALIDATION_SPLIT, shard_dir=args.shards)
+        checkpoint = EndToEndCheckpoint(output_path('best_model.h5'), model, **checkpoint_args)
+        callbacks = profiler + [validation_timer, early_stop, checkpoint]
+        # Only the head is fitted (and checkpointed); its layers are shared with `model`
+        fit_model, train_epoch, steps_per_epoch, validation_data = head_training(
+            model, cache, batch_size=batch_size, seed=args.seed, images_per_epoch=info['train_samples'])
+    else:
+        checkpoint = ModelCheckpoint(output_path('best_model.h5'), **checkpoint_args)
+        callbacks = profiler + [validation_timer, ThroughputLogger(global_batch_size), early_stop, checkpoint]
+        fit_model, steps_per_epoch = model, math.ceil(worker_samples / batch_size)
+
+    state = TrainingState(args.checkpoint_dir, fit_model, callbacks, checkpoint_every=args.checkpoint_every,
+                          seed=args.seed, chief=chief)
+    start = (0, 0)
+    if args.resume and state.exists():
+        try:
+            start = state.restore()
+        except (ValueError, AssertionError) as e:
+            print(f"❌ Cannot resume: {e} (pass the same --seed and --feature-cache setting)")
+            sys.exit(1)
+        print(f"✓ Resuming from {args.checkpoint_dir} at epoch {start[0] + 1}, step {start[1]}")
+    elif args.resume:
+        print(f"⚠️  No checkpoint in {args.checkpoint_dir}, starting from scratch")
+    if args.distributed:
+        # Workers cannot agree on a step to stop at; a terminated run resumes from
+        # the last periodic or epoch-end checkpoint instead
+        print("SIGTERM stops training without a final checkpoint in distributed mode")
+    else:
+        state.install_signal_handler()
+
+    try:
+        history = fit_resumable(fit_model, train_epoch, steps_per_epoch,
+                                validation_data, args.epochs, callbacks, state, start)
+    except TrainingPreempted:
+        print(f"Training stopped; continue with --resume --checkpoint-dir {args.checkpoint_dir}")
+        sys.exit(143)
+    finally:
+        # Evaluation, saving and plotting below are not checkpointed; SIGTERM stops them outright
+        state.restore_signal_handler()
+
+    # Step 4: Evaluate on Test Set
+    print("\n=== Step 4: Evaluating Model ===")
+
+    test_loss, test_accuracy = model.evaluate(test_data)
+    print(f"\nTest Accuracy: {test_accuracy * 100:.2f}%")
+    print(f"Test Loss: {test_loss:.4f}")
+
+    # Step 5: Save Final Model
+    print("\n=== Step 5: Saving Model ===")
+    if not chief:
+        # Every worker has to take part in the save; only the chief's copy is kept
+        save_dir = tempfile.mkdtemp(prefix='worker_model_')
+        model.save(os.path.join(save_dir, 'crop_disease_model.h5'))
+        shutil.rmtree(save_dir, ignore_errors=True)
+        print("\n✓ Training Complete! (worker)")
+        return
+    model_path = output_path('crop_disease_model.h5')
+    model.save(model_path)
+    # Read by export_model.py and the API to size their inputs
+    write_metadata(model_path, {'input_size': args.img_size, 'num_classes': num_classes,
+                                'test_accuracy': float(test_accuracy)})
+    print(f"Model saved as '{model_path}' ({args.img_size}x{args.img_size} inputs)")
+
+    # Step 6: Plot Training History
+    print("\n=== Step 6: Creating Visualizations ===")
+    plot_history(history, output_path('training_history.png'))
+    print(f"Training plots saved as '{output_path('training_history.png')}'")
+
+    if args.metrics_out:
+        val_accuracy = history.history.get('val_accuracy', [])
+        metrics = {
+            'test_accuracy': float(test_accuracy),
+            'test_loss': float(test_loss),
+            'best_val_accuracy': max(val_accuracy, default=None),
+            'final_val_accuracy': val_accuracy[-1] if val_accuracy else None,
+            'epochs_trained': len(val_accuracy),
+            'stopped_early': bool(early_stop.stopped_epoch),
+            'params': int(model.count_params()),
+            'model_size_mb': os.path.getsize(model_path) / 1e6,
+            'latency_ms': inference_latency_ms(model),
+        }
+        with open(args.metrics_out, 'w') as f:
+            json.dump(metrics, f, indent=2)
+        print(f"Metrics written to {args.metrics_out}")
+
+    print("\n✓ Training Complete!")
 
-# Train
-history = model.fit(
-    train_generator,
-    validation_data=validation_generator,
-    epochs=EPOCHS,
-    callbacks=[early_stop, checkpoint],
-    verbose=1
-)
 
-# Step 4: Evaluate on Test Set
-print("\n=== Step 4: Evaluating Model ===")
-
-test_loss, test_accuracy = model.evaluate(test_generator)
-print(f"\nTest Accuracy: {test_accuracy * 100:.2f}%")
-print(f"Test Loss: {test_loss:.4f}")
-
-# Step 5: Save Final Model
-print("\n=== Step 5: Saving Model ===")
-model.save('models/crop_disease_model.h5')
-print("Model saved as 'models/crop_disease_model.h5'")
-
-# Step 6: Plot Training History
-print("\n=== Step 6: Creating Visualizations ===")
-
-plt.figure(figsize=(12, 4))
-
-# Accuracy plot
-plt.subplot(1, 2, 1)
-plt.plot(history.history['accuracy'], label='Training Accuracy')
-plt.plot(history.history['val_accuracy'], label='Validation Accuracy')
-plt.title('Model Accuracy Over Time')
-plt.xlabel('Epoch')
-plt.ylabel('Accuracy')
-plt.legend()
-plt.grid(True)
-
-# Loss plot
-plt.subplot(1, 2, 2)
-plt.plot(history.history['loss'], label='Training Loss')
-plt.plot(history.history['val_loss'], label='Validation Loss')
-plt.title('Model Loss Over Time')
-plt.xlabel('Epoch')
-plt.ylabel('Loss')
-plt.legend()
-plt.grid(True)
-
-plt.tight_layout()
-plt.savefig('models/training_history.png')
-print("Training plots saved as 'models/training_history.png'")
-
-print("\n✓ Training Complete!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
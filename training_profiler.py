@@ -0,0 +1,170 @@
+"""Per-step training profile: is an epoch slow because of the input pipeline or the model?
+
+Keras fetches the next batch inside train_function, so from a callback the
+input pipeline and the model look like one opaque step. TrainingProfiler
+wraps the model's train_step to timestamp the moment the batch has arrived,
+which splits every step into
+
+    input_wait   from the start of the step until the batch is available
+                 (decode, augmentation and anything else tf.data still had to do)
+    compute      from then until the step's results are back on the host
+
+Each step is written as one JSON line, together with images/sec, the
+process's resident memory, OS thread count and CPU cores kept busy; every
+epoch adds a summary line and prints a one-line verdict:
+
+    {"type": "step", "epoch": 0, "step": 12, "images": 32, "input_wait": 0.41, "compute": 0.62, ...}
+    {"type": "epoch", "epoch": 0, "input_fraction": 0.4, "verdict": "input-bound", ...}
+
+The first step of every fit() (tracing and pipeline warm-up) is logged but
+left out of the epoch summary. With `trace_steps` = (first, last) a
+TensorBoard profiler trace of those global steps is written to `trace_dir`.
+
+Usage:
+    python train_model.py --profile [models/profile.jsonl] [--profile-trace 10:20]
+    tensorboard --logdir models/profile_trace
+"""
+import json
+import os
+import time
+
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback
+
+# Share of step time spent waiting for input above which an epoch is called input-bound
+INPUT_BOUND = 0.5
+PARTLY_INPUT_BOUND = 0.2
+
+
+def process_status():
+    """(resident memory in MB, OS threads) of this process, or (None, None) without /proc"""
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None, None
+    return int(fields['VmRSS'].split()[0]) / 1024, int(fields['Threads'])
+
+
+def verdict(input_fraction):
+    if input_fraction >= INPUT_BOUND:
+        return 'input-bound'
+    if input_fraction >= PARTLY_INPUT_BOUND:
+        return 'partly input-bound'
+    return 'compute-bound'
+
+
+class TrainingProfiler(Callback):
+    """Writes per-step input wait / compute times and resource usage to `path` (JSONL)"""
+
+    def __init__(self, path='models/profile.jsonl', trace_steps=None, trace_dir='models/profile_trace'):
+        super().__init__()
+        self.path = path
+        self.trace_steps = trace_steps
+        self.trace_dir = trace_dir
+        self.file = None
+        self.wrapped = None
+        self.tracing = False
+        self.global_step = 0
+        # Host time the current batch arrived in train_step, and its size
+        self.arrival = tf.Variable([0.0, 0.0], dtype=tf.float64, trainable=False)
+
+    def set_model(self, model):
+        super().set_model(model)
+        if self.wrapped is model:
+            return
+        train_step = model.train_step
+        arrival = self.arrival
+
+        def timed_train_step(data):
+            # Taken once the batch is there, and before any of the step's own ops
+            with tf.control_dependencies(tf.nest.flatten(data)):
+                images = tf.cast(tf.shape(tf.nest.flatten(data)[0])[0], tf.float64)
+                stamp = arrival.assign(tf.stack([tf.timestamp(), images]))
+            with tf.control_dependencies([stamp]):
+                data = tf.nest.map_structure(tf.identity, data)
+            return train_step(data)
+
+        model.train_step = timed_train_step
+        # A train_function built before the wrap would bypass it
+        model.train_function = None
+        self.wrapped = model
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+    def on_train_begin(self, logs=None):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.file = open(self.path, 'a')
+        self.first_batch = True
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.steps = []
+        self.epoch_start = time.time()
+        self.cpu_start = sum(os.times()[:2])
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.trace_steps and self.global_step == self.trace_steps[0] and not self.tracing:
+            tf.profiler.experimental.start(self.trace_dir)
+            self.tracing = True
+        self.step_start = time.time()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.time()
+        arrived, images = self.arrival.numpy()
+        # Clamped: the host clock and tf.timestamp() can disagree by microseconds
+        wait = min(max(arrived - self.step_start, 0.0), end - self.step_start)
+        step = {'epoch': self.epoch, 'step': batch, 'images': int(images), 'input_wait': wait,
+                'compute': end - self.step_start - wait, 'warmup': self.first_batch}
+        memory_mb, threads = process_status()
+        self.write({'type': 'step', **step, 'images_per_sec': images / (end - self.step_start),
+                    'rss_mb': memory_mb, 'threads': threads, 'time': end})
+        if not self.first_batch:
+            self.steps.append(step)
+        self.first_batch = False
+
+        self.global_step += 1
+        if self.tracing and self.global_step > self.trace_steps[1]:
+            tf.profiler.experimental.stop()
+            self.tracing = False
+            print(f"Profiler trace of steps {self.trace_steps[0]}-{self.trace_steps[1]} written to {self.trace_dir}")
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self.steps:
+            return
+        seconds = time.time() - self.epoch_start
+        wait = sum(s['input_wait'] for s in self.steps)
+        compute = sum(s['compute'] for s in self.steps)
+        images = sum(s['images'] for s in self.steps)
+        input_fraction = wait / (wait + compute)
+        memory_mb, threads = process_status()
+        summary = {
+            'type': 'epoch',
+            'epoch': epoch,
+            'steps': len(self.steps),
+            'input_wait': wait,
+            'compute': compute,
+            'input_fraction': input_fraction,
+            'images_per_sec': images / (wait + compute),
+            # Includes validation and the warm-up step
+            'cores_busy': (sum(os.times()[:2]) - self.cpu_start) / seconds,
+            'rss_mb': memory_mb,
+            'threads': threads,
+            'intra_op_threads': tf.config.threading.get_intra_op_parallelism_threads(),
+            'inter_op_threads': tf.config.threading.get_inter_op_parallelism_threads(),
+            'verdict': verdict(input_fraction),
+        }
+        self.write(summary)
+        self.file.flush()
+        print(f"Epoch {epoch + 1}: {summary['verdict']}, {input_fraction:.0%} of step time waiting for input "
+              f"({wait / len(self.steps) * 1000:.0f} ms wait + {compute / len(self.steps) * 1000:.0f} ms compute "
+              f"per step, {summary['images_per_sec']:.1f} images/s, {summary['cores_busy']:.1f} cores busy)")
+
+    def on_train_end(self, logs=None):
+        if self.tracing:
+            tf.profiler.experimental.stop()
+            self.tracing = False
+        if self.file is not None:
+            self.file.flush()
@@ -0,0 +1,255 @@
+"""Resumable training state for train_model.py.
+
+A checkpoint holds everything needed to continue a run where it stopped:
+
+    <dir>/ckpt-<step>.*          model weights and optimizer slots (tf.train.Checkpoint)
+    <dir>/callbacks-<step>.npz   EarlyStopping's best weights
+    <dir>/state.json             epoch, step within the epoch, seed, history and
+                                 EarlyStopping / ModelCheckpoint state
+
+state.json is written last, with an atomic rename, and is the only file
+read on resume, so a checkpoint interrupted half-way is never used. The
+data order and graph augmentation of every epoch are a function of
+(seed, epoch) (see data_pipeline), so resuming at (epoch, step) replays
+exactly the batches the interrupted run had not yet trained on. Dropout
+masks are not part of the state.
+
+Checkpoints are written every `checkpoint_every` steps, at the end of every
+epoch, and on SIGTERM, after which the run stops with TrainingPreempted.
+
+In a multi-worker run every worker restores from the same directory, but
+only the chief writes to it; the other workers save their (identical)
+replicas into a temporary directory, as MultiWorkerMirroredStrategy
+requires all of them to take part in a save.
+"""
+import atexit
+import json
+import os
+import shutil
+import signal
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback, EarlyStopping, ModelCheckpoint, ProgbarLogger
+
+STATE_FILE = 'state.json'
+
+
+class TrainingPreempted(Exception):
+    """Raised out of fit() after the SIGTERM checkpoint has been written"""
+
+
+class ResumableEarlyStopping(EarlyStopping):
+    """EarlyStopping whose state survives separate fit() calls and restarts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = False
+
+    def on_train_begin(self, logs=None):
+        # fit() is called once per epoch; only the first call starts from scratch
+        if not self.started:
+            super().on_train_begin(logs)
+            self.started = True
+
+    def get_state(self):
+        return {'wait': self.wait, 'stopped_epoch': self.stopped_epoch, 'best': float(self.best),
+                'best_epoch': self.best_epoch}
+
+    def set_state(self, state, best_weights=None):
+        self.started = True
+        self.wait = state['wait']
+        self.stopped_epoch = state['stopped_epoch']
+        self.best = state['best']
+        self.best_epoch = state['best_epoch']
+        self.best_weights = best_weights
+
+
+class RunProgbarLogger(ProgbarLogger):
+    """Progress bar that shows 'Epoch e/<epochs of the run>' although each fit() covers one epoch"""
+
+    def __init__(self, epochs):
+        super().__init__(count_mode='steps')
+        self.run_epochs = epochs
+
+    def set_params(self, params):
+        super().set_params(params)
+        self.epochs = self.run_epochs
+
+
+class TrainingState(Callback):
+    """Writes and restores resumable checkpoints of `model` and its callbacks.
+
+    Must be the last callback, so that epoch-end checkpoints see the
+    EarlyStopping / ModelCheckpoint updates of that epoch.
+    """
+
+    def __init__(self, directory, model, callbacks=(), checkpoint_every=0, seed=42, max_to_keep=2, chief=True):
+        super().__init__()
+        self.directory = directory
+        self.save_directory = directory
+        if not chief:
+            self.save_directory = tempfile.mkdtemp(prefix='training_state_')
+            atexit.register(shutil.rmtree, self.save_directory, ignore_errors=True)
+        self.optimizer = model.optimizer
+        self.trainable_variables = model.trainable_variables
+        self.callbacks = [c for c in callbacks if isinstance(c, (ResumableEarlyStopping, ModelCheckpoint))]
+        self.checkpoint_every = checkpoint_every
+        self.seed = seed
+        self.max_to_keep = max_to_keep
+        self.checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer)
+        self.manager = tf.train.CheckpointManager(self.checkpoint, self.save_directory, max_to_keep=max_to_keep)
+
+        self.epoch = 0
+        self.skip = 0
+        self.global_step = 0
+        self.steps_per_epoch = None
+        self.history = {}
+        self.terminate = False
+        self.previous_handler = None
+
+    def install_signal_handler(self):
+        """Turn SIGTERM into a checkpoint and a stop; undo with restore_signal_handler() once fit returns"""
+        def request_stop(signum, frame):
+            print("\n⚠️  SIGTERM received, checkpointing after the current step")
+            self.terminate = True
+        self.previous_handler = signal.signal(signal.SIGTERM, request_stop)
+
+    def restore_signal_handler(self):
+        """Let SIGTERM stop the process again, e.g. during evaluation and saving after training"""
+        if self.previous_handler is not None:
+            signal.signal(signal.SIGTERM, self.previous_handler)
+            self.previous_handler = None
+
+    def save(self, epoch, step):
+        """Checkpoint: the next step to run is `step` of `epoch`"""
+        os.makedirs(self.save_directory, exist_ok=True)
+        number = self.global_step
+        path = self.manager.save(checkpoint_number=number)
+
+        callbacks = []
+        arrays = {}
+        for i, callback in enumerate(self.callbacks):
+            if isinstance(callback, ResumableEarlyStopping):
+                callbacks.append(callback.get_state())
+                for j, weights in enumerate(callback.best_weights or []):
+                    arrays[f'{i}_{j}'] = weights
+            else:
+                callbacks.append({'best': float(callback.best)})
+        arrays_path = None
+        if arrays:
+            arrays_path = os.path.join(self.save_directory, f'callbacks-{number}.npz')
+            np.savez(arrays_path + '.tmp.npz', **arrays)
+            os.replace(arrays_path + '.tmp.npz', arrays_path)
+
+        state = {
+            'epoch': epoch,
+            'step': step,
+            'global_step': number,
+            'steps_per_epoch': self.steps_per_epoch,
+            'seed': self.seed,
+            'checkpoint': os.path.basename(path),
+            'callback_arrays': os.path.basename(arrays_path) if arrays_path else None,
+            'callbacks': callbacks,
+            'history': self.history,
+        }
+        state_path = os.path.join(self.save_directory, STATE_FILE)
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(state_path + '.tmp', state_path)
+        self.remove_stale_arrays(keep=arrays_path)
+
+    def remove_stale_arrays(self, keep):
+        for name in os.listdir(self.save_directory):
+            path = os.path.join(self.save_directory, name)
+            if name.startswith('callbacks-') and name.endswith('.npz') and path != keep:
+                os.remove(path)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, STATE_FILE))
+
+    def restore(self):
+        """Load the last complete checkpoint; returns (epoch, step) to continue from"""
+        with open(os.path.join(self.directory, STATE_FILE), 'r') as f:
+            state = json.load(f)
+        if state['seed'] != self.seed:
+            # The data order of the remaining epochs depends on it
+            raise ValueError(f"checkpoint was written with seed {state['seed']}, not {self.seed}")
+        # Create the optimizer slots now, so they are restored rather than deferred
+        self.optimizer.build(self.trainable_variables)
+        self.checkpoint.restore(os.path.join(self.directory, state['checkpoint'])).assert_existing_objects_matched()
+
+        arrays = {}
+        if state['callback_arrays']:
+            with np.load(os.path.join(self.directory, state['callback_arrays'])) as data:
+                arrays = dict(data)
+        for i, (callback, saved) in enumerate(zip(self.callbacks, state['callbacks'])):
+            if isinstance(callback, ResumableEarlyStopping):
+                weights = [arrays[f'{i}_{j}'] for j in range(len(arrays)) if f'{i}_{j}' in arrays]
+                callback.set_state(saved, weights or None)
+            else:
+                callback.best = saved['best']
+
+        self.global_step = state['global_step']
+        self.history = state['history']
+        return state['epoch'], state['step']
+
+    def start_epoch(self, epoch, steps_per_epoch, skip=0):
+        """Called before each per-epoch fit(); `skip` steps of it were trained before a resume"""
+        self.epoch = epoch
+        self.steps_per_epoch = steps_per_epoch
+        self.skip = skip
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.global_step += 1
+        step = self.skip + batch + 1
+        if step >= self.steps_per_epoch:
+            # The epoch-end checkpoint follows validation
+            return
+        if self.terminate:
+            self.save(self.epoch, step)
+            print(f"✓ Checkpoint saved at epoch {self.epoch + 1}, step {step}")
+            raise TrainingPreempted()
+        if self.checkpoint_every and self.global_step % self.checkpoint_every == 0:
+            self.save(self.epoch, step)
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        self.save(epoch + 1, 0)
+        if self.terminate:
+            print(f"✓ Checkpoint saved at the end of epoch {epoch + 1}")
+            raise TrainingPreempted()
+
+
+def fit_resumable(model, train_epoch, steps_per_epoch, validation_data, epochs, callbacks, state, start=(0, 0)):
+    """model.fit() one epoch at a time from `start` = (epoch, step), checkpointing with `state`.
+
+    `train_epoch(epoch, skip_batches)` returns that epoch's training data
+    without its first `skip_batches` batches (possibly distributed, hence
+    the explicit step count). Returns a History covering the
+    whole run, including epochs trained before a resume.
+    """
+    early_stopping = [c for c in callbacks if isinstance(c, ResumableEarlyStopping)]
+    progbar = RunProgbarLogger(epochs)
+    epoch, step = start
+    while epoch < epochs and not any(c.stopped_epoch for c in early_stopping):
+        state.start_epoch(epoch, steps_per_epoch, skip=step)
+        model.fit(
+            train_epoch(epoch, step),
+            steps_per_epoch=steps_per_epoch - step,
+            validation_data=validation_data,
+            initial_epoch=epoch,
+            epochs=epoch + 1,
+            callbacks=[progbar] + list(callbacks) + [state],
+            verbose=1
+        )
+        if model.stop_training:
+            break
+        epoch, step = epoch + 1, 0
+
+    history = tf.keras.callbacks.History()
+    history.history = state.history
+    history.epoch = list(range(len(next(iter(state.history.values()), []))))
+    return history